@@ -0,0 +1,17 @@
+-- Migration: Index the authorization scope lookups
+-- Date: 2025-10-18
+-- Description: The Lambdas resolve the caller's scope from users.sub on every cache miss, and
+-- check cached scopes against MAX(audit_id) of the client group membership audit rows on every
+-- request. Both were full table scans. InnoDB appends audit_id (the primary key) to the
+-- table_name index, so MAX(audit_id) for one table_name equality is a single read of the end of
+-- that table's index range. This holds only for one equality: with table_name IN (...) MySQL
+-- range-scans every audit row of the listed tables. lambdas/auth_helper.py therefore takes one
+-- MAX per table and combines them with GREATEST.
+
+CREATE INDEX idx_users_sub ON users (sub);
+
+CREATE INDEX idx_audit_log_table ON audit_log (table_name);
+
+-- Verify the change
+SHOW INDEX FROM users;
+SHOW INDEX FROM audit_log;
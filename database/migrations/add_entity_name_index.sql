@@ -0,0 +1,10 @@
+-- Migration: Index entities by name
+-- Date: 2025-10-18
+-- Description: GET /entities pages through entities ordered by (entity_name, entity_id) with a
+-- keyset cursor. InnoDB appends the primary key to every secondary index, so this index serves
+-- both the ordering and the "after this (name, id)" range without a filesort.
+
+CREATE INDEX idx_entities_name ON entities (entity_name);
+
+-- Verify the change
+SHOW INDEX FROM entities;
@@ -0,0 +1,16 @@
+-- Migration: Index transactions by portfolio and trade/settle date
+-- Date: 2025-10-18
+-- Description: GET /transactions and /transactions/export filter by trade_date and settle_date
+-- ranges, nearly always within one portfolio. (portfolio_entity_id, deleted, <date>) turns
+-- "this portfolio, this week" into one index range scan. The trade date index also serves the
+-- portfolio foreign key, so the single-column fk_party_entity index is dropped.
+-- scripts/check-transaction-indexes.py checks the query plans.
+
+CREATE INDEX idx_transactions_portfolio_trade_date ON transactions (portfolio_entity_id, deleted, trade_date);
+
+CREATE INDEX idx_transactions_portfolio_settle_date ON transactions (portfolio_entity_id, deleted, settle_date);
+
+DROP INDEX fk_party_entity ON transactions;
+
+-- Verify the change
+SHOW INDEX FROM transactions;
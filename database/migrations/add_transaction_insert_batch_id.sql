@@ -0,0 +1,14 @@
+-- Migration: Add insert_batch_id to transactions
+-- Date: 2025-10-18
+-- Description: POST /transactions/batch inserts rows 200 per statement and stamps every row of a
+-- request with the same insert_batch_id, then reads the new transaction_ids back by it in the same
+-- transaction. In interleaved auto-increment lock mode (2, the MySQL 8 default) the ids of one
+-- multi-row INSERT need not be consecutive, so they cannot be worked out from LAST_INSERT_ID().
+-- The read-back is bounded by a primary key range, so the column needs no index.
+-- NULL for transactions created one at a time.
+
+ALTER TABLE transactions
+  ADD COLUMN insert_batch_id char(32) DEFAULT NULL;
+
+-- Verify the change
+SHOW CREATE TABLE transactions;
@@ -0,0 +1,61 @@
+-- Migration: Make the position lookup key unique
+-- Date: 2025-10-18
+-- Description: Replaces the non-unique idx_sandbox_lookup index with a unique key on the same
+-- columns so position rows can be bulk upserted with multi-row INSERT ... ON DUPLICATE KEY UPDATE.
+-- instrument_entity_id is NULL for cash and portfolio-level positions, and a unique key never
+-- treats two NULLs as equal, so the key uses the generated column instrument_lookup_id
+-- (COALESCE(instrument_entity_id, 0)) instead. instrument_entity_id itself stays nullable so its
+-- foreign key to entities still holds.
+-- Rows already duplicated on the lookup key would make ADD UNIQUE KEY fail, so only the newest
+-- row (highest position_sandbox_id, the last one written) of each position is kept.
+-- idx_sandbox_date_type is a prefix of the lookup key and only adds index maintenance on insert,
+-- so it is dropped. Applied to positions too, since the two tables are swapped on promotion.
+
+ALTER TABLE position_sandbox
+  ADD COLUMN instrument_lookup_id int
+    GENERATED ALWAYS AS (COALESCE(instrument_entity_id, 0)) STORED NOT NULL
+    AFTER instrument_entity_id;
+
+DELETE older FROM position_sandbox older
+JOIN position_sandbox newer
+  ON newer.position_date = older.position_date
+  AND newer.position_type_id = older.position_type_id
+  AND newer.portfolio_entity_id = older.portfolio_entity_id
+  AND newer.instrument_lookup_id = older.instrument_lookup_id
+  AND newer.position_sandbox_id > older.position_sandbox_id;
+
+ALTER TABLE position_sandbox
+  DROP INDEX idx_sandbox_lookup,
+  DROP INDEX idx_sandbox_date_type,
+  ADD UNIQUE KEY uq_sandbox_lookup (
+    position_date,
+    position_type_id,
+    portfolio_entity_id,
+    instrument_lookup_id
+  );
+
+ALTER TABLE positions
+  ADD COLUMN instrument_lookup_id int
+    GENERATED ALWAYS AS (COALESCE(instrument_entity_id, 0)) STORED NOT NULL
+    AFTER instrument_entity_id;
+
+DELETE older FROM positions older
+JOIN positions newer
+  ON newer.position_date = older.position_date
+  AND newer.position_type_id = older.position_type_id
+  AND newer.portfolio_entity_id = older.portfolio_entity_id
+  AND newer.instrument_lookup_id = older.instrument_lookup_id
+  AND newer.position_sandbox_id > older.position_sandbox_id;
+
+ALTER TABLE positions
+  DROP INDEX idx_sandbox_lookup,
+  DROP INDEX idx_sandbox_date_type,
+  ADD UNIQUE KEY uq_sandbox_lookup (
+    position_date,
+    position_type_id,
+    portfolio_entity_id,
+    instrument_lookup_id
+  );
+
+-- Verify the change
+SHOW INDEX FROM position_sandbox;
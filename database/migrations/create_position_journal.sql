@@ -0,0 +1,25 @@
+-- Migration: Create position_journal table
+-- Date: 2025-10-18
+-- Description: Append-only journal of every position delta applied by the Position Keeper.
+-- position_sandbox can be rebuilt as of any point in time by summing the journal.
+
+DROP TABLE IF EXISTS `position_journal`;
+
+CREATE TABLE `position_journal` (
+  `position_journal_id` bigint NOT NULL AUTO_INCREMENT,
+  `transaction_id` int NOT NULL,
+  `position_date` date NOT NULL,
+  `position_type_id` int NOT NULL,
+  `portfolio_entity_id` int NOT NULL,
+  `instrument_entity_id` int DEFAULT NULL,
+  `share_delta` decimal(20,8) DEFAULT 0,
+  `market_value_delta` decimal(20,4) DEFAULT 0,
+  `applied_at` datetime(6) NOT NULL,
+  `position_keeper_id` int NOT NULL,
+  PRIMARY KEY (`position_journal_id`),
+  KEY `idx_journal_applied_at` (`applied_at`),
+  KEY `idx_journal_transaction` (`transaction_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- No audit triggers and no foreign keys: the journal is append-only and
+-- written in large batches, so per-row trigger and FK checks are avoided.
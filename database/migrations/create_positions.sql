@@ -0,0 +1,34 @@
+-- Migration: Create positions table
+-- Date: 2025-10-18
+-- Description: Creates the live positions table that readers query. It has exactly the same
+-- structure as position_sandbox so a finished sandbox run can be published by swapping the two
+-- tables with a single atomic RENAME TABLE (see position_keeper/positionsandbox.py).
+-- CREATE TABLE ... LIKE does not copy foreign keys, so the table is spelled out with the same
+-- foreign keys as position_sandbox; every swap then keeps them enforced on both tables.
+-- Constraint names are unique per schema, so they carry a positions_ prefix instead; index
+-- names match position_sandbox so later migrations can alter both tables alike.
+
+CREATE TABLE IF NOT EXISTS `positions` (
+  `position_sandbox_id` int NOT NULL AUTO_INCREMENT,
+  `position_date` date NOT NULL,
+  `position_type_id` int NOT NULL,
+  `portfolio_entity_id` int NOT NULL,
+  `instrument_entity_id` int DEFAULT NULL,
+  `share_amount` decimal(20,8) DEFAULT 0,
+  `market_value` decimal(20,4) DEFAULT 0,
+  `position_keeper_id` int NOT NULL,
+  PRIMARY KEY (`position_sandbox_id`),
+  KEY `idx_sandbox_date_type` (`position_date`, `position_type_id`),
+  KEY `idx_sandbox_portfolio` (`portfolio_entity_id`),
+  KEY `idx_sandbox_instrument` (`instrument_entity_id`),
+  KEY `fk_sandbox_position_type` (`position_type_id`),
+  KEY `fk_sandbox_position_keeper` (`position_keeper_id`),
+  KEY `idx_sandbox_lookup` (`position_date`, `position_type_id`, `portfolio_entity_id`, `instrument_entity_id`),
+  CONSTRAINT `fk_positions_portfolio_entity` FOREIGN KEY (`portfolio_entity_id`) REFERENCES `entities` (`entity_id`),
+  CONSTRAINT `fk_positions_instrument_entity` FOREIGN KEY (`instrument_entity_id`) REFERENCES `entities` (`entity_id`),
+  CONSTRAINT `fk_positions_position_keeper` FOREIGN KEY (`position_keeper_id`) REFERENCES `position_keepers` (`position_keeper_id`),
+  CONSTRAINT `fk_positions_position_type` FOREIGN KEY (`position_type_id`) REFERENCES `position_types` (`position_type_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Verify the change
+SHOW CREATE TABLE positions;
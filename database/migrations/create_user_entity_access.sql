@@ -0,0 +1,30 @@
+-- Migration: Create user_entity_access table
+-- Date: 2025-10-18
+-- Description: Materializes which entities each user reaches through their client groups, so
+-- authorization is one primary key probe instead of a client_group_users x client_group_entities
+-- join on every request. The table is kept current by the access triggers on both membership
+-- tables (scripts/generate-trigger.py --access, output in scripts/triggers.sql). Rows are removed
+-- by the foreign keys when a user, entity or client group is hard deleted, because the cascaded
+-- membership deletes do not fire triggers. Install the access triggers, then run this backfill;
+-- INSERT IGNORE makes it safe to re-run.
+
+CREATE TABLE IF NOT EXISTS `user_entity_access` (
+  `user_id` int NOT NULL,
+  `entity_id` int NOT NULL,
+  `client_group_id` int NOT NULL,
+  PRIMARY KEY (`user_id`, `entity_id`, `client_group_id`),
+  KEY `client_group_user` (`client_group_id`, `user_id`),
+  KEY `client_group_entity` (`client_group_id`, `entity_id`),
+  KEY `entity_id` (`entity_id`),
+  CONSTRAINT `user_entity_access_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`user_id`) ON DELETE CASCADE,
+  CONSTRAINT `user_entity_access_ibfk_2` FOREIGN KEY (`entity_id`) REFERENCES `entities` (`entity_id`) ON DELETE CASCADE,
+  CONSTRAINT `user_entity_access_ibfk_3` FOREIGN KEY (`client_group_id`) REFERENCES `client_groups` (`client_group_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT IGNORE INTO user_entity_access (user_id, entity_id, client_group_id)
+SELECT cgu.user_id, cge.entity_id, cgu.client_group_id
+FROM client_group_users cgu
+JOIN client_group_entities cge ON cge.client_group_id = cgu.client_group_id;
+
+-- Verify the change
+SHOW INDEX FROM user_entity_access;
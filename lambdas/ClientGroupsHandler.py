@@ -1,11 +1,10 @@
 import json
-import boto3
-import pymysql
 import os
 from datetime import datetime
 from botocore.exceptions import ClientError
 from urllib.parse import unquote
 import cors_helper
+import runtime_helper
 # Data consistency functions (inline to avoid import issues)
 
 
@@ -33,34 +32,6 @@ def validate_client_group_deletion(connection, client_group_id):
         return False, [f"Database error: {str(e)}"]
 
 
-def get_db_connection():
-    """Get database connection using secrets manager."""
-    try:
-        # Get secret from AWS Secrets Manager
-        secrets_client = boto3.client(
-            'secretsmanager', region_name='us-east-2')
-        secret_arn = os.environ.get('SECRET_ARN')
-
-        if not secret_arn:
-            raise Exception("SECRET_ARN environment variable not set")
-
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        secret = json.loads(response['SecretString'])
-
-        connection = pymysql.connect(
-            host=secret['DB_HOST'],
-            user=secret['DB_USER'],
-            password=secret['DB_PASS'],
-            database=secret['DATABASE'],
-            connect_timeout=10,
-            read_timeout=10,
-            write_timeout=10
-        )
-        return connection
-    except Exception as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
-
-
 def get_user_id_from_sub(connection, current_user_id):
     """
     Get the user_id from the database based on the sub (Cognito user ID).
@@ -164,17 +135,20 @@ def get_user_id_by_name(connection, user_name):
         return None
 
 
-def get_user_name_by_id(connection, user_id):
-    """Get user email (user_name) from user_id."""
+def get_user_names_by_ids(connection, user_ids):
+    """Get user emails (user_names) for many user_ids with one query. Returns {user_id: email}."""
+    user_ids = list({user_id for user_id in user_ids if user_id})
+    if not user_ids:
+        return {}
     try:
         with connection.cursor() as cursor:
             cursor.execute(
-                "SELECT email FROM users WHERE user_id = %s", (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+                "SELECT user_id, email FROM users WHERE user_id IN ({})".format(
+                    ','.join(['%s'] * len(user_ids))), user_ids)
+            return {row[0]: row[1] for row in cursor.fetchall()}
     except Exception as e:
-        print(f"Error getting user entity_name by ID: {e}")
-        return None
+        print(f"Error getting emails by ID: {e}")
+        return {}
 
 
 def lambda_handler(event, context):
@@ -198,10 +172,9 @@ def lambda_handler(event, context):
     query_parameters = event.get('queryStringParameters') or {}
     body = event.get('body', '{}')
 
-    connection = None
     try:
-        # Get database connection
-        connection = get_db_connection()
+        # Connection is reused across warm invocations
+        connection = runtime_helper.get_db_connection()
 
         # Get current user's client groups for authorization
         current_user_id_db = get_user_id_from_sub(connection, current_user_id)
@@ -217,7 +190,7 @@ def lambda_handler(event, context):
             query_parameters, body, current_user_id, current_user_id_db, user_client_groups
         )
 
-        connection.close()
+        runtime_helper.release_connection()
 
         # Return appropriate status code based on operation
         status_code = 200
@@ -233,12 +206,8 @@ def lambda_handler(event, context):
         }
 
     except Exception as e:
-        # Try to close connection if it exists
-        try:
-            if connection:
-                connection.close()
-        except:
-            pass
+        # Roll back whatever the failed request left open
+        runtime_helper.release_connection()
 
         return {
             "statusCode": 500,
@@ -282,9 +251,11 @@ def handle_get_operations(connection, path, path_parameters, query_parameters, u
 
             with connection.cursor() as cursor:
                 cursor.execute("""
-                    SELECT client_group_id, client_group_name, preferences, update_date, updated_user_id
-                    FROM client_groups
-                    WHERE client_group_id = %s AND deleted = false
+                    SELECT cg.client_group_id, cg.client_group_name, cg.preferences, cg.update_date, cg.updated_user_id,
+                           u.email as updated_by_user_name
+                    FROM client_groups cg
+                    LEFT JOIN users u ON cg.updated_user_id = u.user_id
+                    WHERE cg.client_group_id = %s AND cg.deleted = false
                 """, (client_group_id,))
                 result = cursor.fetchone()
 
@@ -293,15 +264,13 @@ def handle_get_operations(connection, path, path_parameters, query_parameters, u
 
                 # Map database fields to OpenAPI schema
                 preferences = json.loads(result[2]) if result[2] else {}
-                updated_by_user_name = get_user_name_by_id(
-                    connection, result[4]) if result[4] else None
 
                 return {
                     "client_group_id": result[0],
                     "client_group_name": result[1],
                     "preferences": preferences,
                     "update_date": result[3].isoformat() + "Z" if result[3] else None,
-                    "updated_by_user_name": updated_by_user_name
+                    "updated_by_user_name": result[5]
                 }
     else:
         # List all client groups: /client-groups
@@ -344,21 +313,18 @@ def handle_get_client_group_entities(connection, client_group_name, query_parame
             """, (client_group_id))
             entities = cursor.fetchall()
 
-            # Get total count
-            cursor.execute("""
-                SELECT COUNT(DISTINCT e.entity_id)
-                FROM entities e
-                INNER JOIN client_group_entities cge ON e.entity_id = cge.entity_id
-                WHERE cge.client_group_id = %s
-            """, (client_group_id,))
-            count_result = cursor.fetchone()
-            total_count = count_result[0] if count_result else 0
+            # Membership is unique per client group and the list is not
+            # limited, so it is its own count
+            total_count = len(entities)
+
+            # One lookup for the page's editors rather than one per row
+            user_names = get_user_names_by_ids(
+                connection, [entity[5] for entity in entities])
 
             # Format entities
             entity_list = []
             for entity in entities:
-                updated_by_user_name = get_user_name_by_id(
-                    connection, entity[5]) if entity[5] else None
+                updated_by_user_name = user_names.get(entity[5])
                 entity_list.append({
                     "entity_id": entity[0],
                     "entity_name": entity[1],
@@ -409,15 +375,9 @@ def handle_get_client_group_users(connection, client_group_name, query_parameter
             """, (client_group_id))
             users = cursor.fetchall()
 
-            # Get total count
-            cursor.execute("""
-                SELECT COUNT(DISTINCT u.user_id)
-                FROM users u
-                INNER JOIN client_group_users cgu ON u.user_id = cgu.user_id
-                WHERE cgu.client_group_id = %s
-            """, (client_group_id,))
-            count_result = cursor.fetchone()
-            total_count = count_result[0] if count_result else 0
+            # Membership is unique per client group and the list is not
+            # limited, so it is its own count
+            total_count = len(users)
 
             # Format users
             user_list = []
@@ -499,18 +459,18 @@ def handle_list_client_groups(connection, query_parameters, user_client_groups):
         cursor.execute(query, params)
         results = cursor.fetchall()
 
-        # Get total count for pagination
-        count_query = f"SELECT COUNT(*) as count {base_query}"
-        cursor.execute(count_query, params)
-        count_result = cursor.fetchone()
-        total_count = count_result[0] if count_result else 0
+        # The list is not limited, so it is its own count
+        total_count = len(results)
+
+        # One lookup for the page's editors rather than one per row
+        user_names = get_user_names_by_ids(
+            connection, [result[4] for result in results])
 
         data = []
         for result in results:
             # Map database fields to OpenAPI schema
             preferences = json.loads(result[2]) if result[2] else {}
-            updated_by_user_name = get_user_name_by_id(
-                connection, result[4]) if result[4] else None
+            updated_by_user_name = user_names.get(result[4])
 
             data.append({
                 "client_group_id": result[0],
@@ -1,6 +1,4 @@
 import json
-import boto3
-import pymysql
 import os
 import uuid
 from datetime import datetime, timezone
@@ -8,39 +6,10 @@ from botocore.exceptions import ClientError
 from urllib.parse import unquote
 from typing import Dict, Any
 import cors_helper
-
-
-def get_secret():
-    """Get secret from AWS Secrets Manager. Called once per Lambda invocation."""
-    try:
-        secrets_client = boto3.client(
-            'secretsmanager', region_name='us-east-2')
-        secret_arn = os.environ.get('SECRET_ARN')
-
-        if not secret_arn:
-            raise Exception("SECRET_ARN environment variable not set")
-
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        return json.loads(response['SecretString'])
-    except Exception as e:
-        raise Exception(f"Failed to retrieve secret: {str(e)}")
-
-
-def get_db_connection(secret):
-    """Get database connection using provided secret."""
-    try:
-        connection = pymysql.connect(
-            host=secret['DB_HOST'],
-            user=secret['DB_USER'],
-            password=secret['DB_PASS'],
-            database=secret['DATABASE'],
-            connect_timeout=10,
-            read_timeout=10,
-            write_timeout=10
-        )
-        return connection
-    except Exception as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
+import runtime_helper
+import pagination_helper
+import auth_helper
+import cache_helper
 
 
 def get_user_id_from_sub(connection, current_user_id):
@@ -71,7 +40,7 @@ def send_cache_refresh_to_sqs(secret: Dict[str, Any], table: str, primary_key: i
         if not queue_url:
             raise Exception("QUEUE_URL not found in secrets")
 
-        sqs = boto3.client('sqs', region_name='us-east-2')
+        sqs = runtime_helper.get_client('sqs')
 
         # Prepare message body
         message_body = {
@@ -138,39 +107,6 @@ def get_user_primary_client_group(connection, user_id):
         return None
 
 
-def get_valid_entity_ids_for_current_user(connection, current_user_id):
-    """
-    Get all entity IDs that the current user is authorized to view/modify.
-    This includes all entities in the same client groups as the current user.
-    Returns a list of entity_ids.
-    """
-    try:
-        # Get current user's client groups
-        current_user_id_db = get_user_id_from_sub(connection, current_user_id)
-        if not current_user_id_db:
-            return []
-
-        user_client_groups = get_user_client_groups(
-            connection, current_user_id_db)
-        if not user_client_groups:
-            return []
-
-        # Get all entity IDs that are in any of the current user's client groups
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT DISTINCT entity_id 
-                FROM client_group_entities 
-                WHERE client_group_id IN ({})
-            """.format(','.join(['%s'] * len(user_client_groups))),
-                user_client_groups)
-            results = cursor.fetchall()
-            entity_ids = [row[0] for row in results]
-            return entity_ids
-    except Exception as e:
-        print(f"Error getting valid entity IDs: {e}")
-        return []
-
-
 def get_client_group_id_by_name(connection, client_group_name):
     """Get client_group_id from client_group_name."""
     try:
@@ -210,35 +146,38 @@ def get_entity_id_by_name(connection, entity_name):
         return None
 
 
-def get_user_name_by_id(connection, user_id):
-    """Get user email (user_name) from user_id."""
+def get_user_names_by_ids(connection, user_ids):
+    """Get user emails (user_names) for many user_ids with one query. Returns {user_id: email}."""
+    user_ids = list({user_id for user_id in user_ids if user_id})
+    if not user_ids:
+        return {}
     try:
         with connection.cursor() as cursor:
             cursor.execute(
-                "SELECT email FROM users WHERE user_id = %s", (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+                "SELECT user_id, email FROM users WHERE user_id IN ({})".format(
+                    ','.join(['%s'] * len(user_ids))), user_ids)
+            return {row[0]: row[1] for row in cursor.fetchall()}
     except Exception as e:
-        print(f"Error getting email by ID: {e}")
-        return None
+        print(f"Error getting emails by ID: {e}")
+        return {}
 
 
-def handle_entity_operations(connection, http_method, path, path_parameters, query_parameters, body, current_user_id, valid_entity_ids, secret):
+def handle_entity_operations(connection, http_method, path, path_parameters, query_parameters, body, current_user_id, scope_user_id, secret):
     """Handle all entity operations based on HTTP method and path."""
 
     if http_method == 'GET':
-        return handle_get_operations(connection, path, path_parameters, query_parameters, valid_entity_ids)
+        return handle_get_operations(connection, path, path_parameters, query_parameters, scope_user_id)
     elif http_method == 'POST':
-        return handle_post_operations(connection, path, path_parameters, body, current_user_id, valid_entity_ids, secret)
+        return handle_post_operations(connection, path, path_parameters, body, current_user_id, scope_user_id, secret)
     elif http_method == 'PUT':
-        return handle_put_operations(connection, path, path_parameters, body, current_user_id, valid_entity_ids, secret)
+        return handle_put_operations(connection, path, path_parameters, body, current_user_id, scope_user_id, secret)
     elif http_method == 'DELETE':
-        return handle_delete_operations(connection, path, path_parameters, current_user_id, valid_entity_ids)
+        return handle_delete_operations(connection, path, path_parameters, current_user_id, scope_user_id)
     else:
         return {"error": f"Method {http_method} not allowed for entities"}
 
 
-def handle_get_operations(connection, path, path_parameters, query_parameters, valid_entity_ids):
+def handle_get_operations(connection, path, path_parameters, query_parameters, scope_user_id):
     """Handle GET operations."""
     if '/entities:set' in path and path.startswith('/entities/'):
         return {"error": "Method not allowed. Use POST for setting entities."}
@@ -249,12 +188,13 @@ def handle_get_operations(connection, path, path_parameters, query_parameters, v
         with connection.cursor() as cursor:
             cursor.execute("""
                 SELECT e.entity_id, e.entity_name, e.entity_type_id, e.attributes, e.update_date, e.updated_user_id,
-                       et.entity_type_name
+                       et.entity_type_name, u.email as updated_by_user_name
                 FROM entities e
                 JOIN entity_types et ON e.entity_type_id = et.entity_type_id
+                LEFT JOIN users u ON e.updated_user_id = u.user_id
                 WHERE e.entity_name = %s AND e.entity_id IN ({}) AND e.deleted = false
-            """.format(','.join(['%s'] * len(valid_entity_ids))),
-                [entity_name] + valid_entity_ids)
+            """.format(auth_helper.ENTITY_SCOPE_SQL),
+                (entity_name, scope_user_id))
             result = cursor.fetchone()
 
             if not result:
@@ -262,27 +202,38 @@ def handle_get_operations(connection, path, path_parameters, query_parameters, v
 
             # Map database fields to OpenAPI schema
             attributes = json.loads(result[3]) if result[3] else {}
-            updated_by_user_name = get_user_name_by_id(
-                connection, result[5]) if result[5] else None
 
             return {
                 "entity_name": result[1],
                 "entity_type_name": result[6],
                 "attributes": attributes,
                 "update_date": result[4].isoformat() + "Z" if result[4] else None,
-                "updated_by_user_name": updated_by_user_name
+                "updated_by_user_name": result[7]
             }
     else:
         # List all entities: /entities
-        return handle_list_entities(connection, query_parameters, valid_entity_ids)
+        return handle_list_entities(connection, query_parameters, scope_user_id)
+
 
+def handle_list_entities(connection, query_parameters, scope_user_id):
+    """
+    Handle listing entities with optional filters and keyset pagination.
 
-def handle_list_entities(connection, query_parameters, valid_entity_ids):
-    """Handle listing entities with optional filters and pagination."""
+    Without `limit` or `after` every matching entity is returned as a list.
+    With them, one page is returned by name with a `next_cursor` for the
+    following page. The total is only counted if `include_count` is true, in
+    the page query itself on the first page, or estimated from index
+    statistics if it is `estimate`.
+    """
     # Apply query filters (removed user_name_filter for security - users should only see entities they have access to)
     entity_type_name_filter = query_parameters.get('entity_type_name')
     client_group_name_filter = query_parameters.get('client_group_name')
     count_only = query_parameters.get('count', 'false').lower() == 'true'
+    try:
+        limit, after = pagination_helper.get_page_request(
+            query_parameters, (str, int))
+    except ValueError as e:
+        return {"error": str(e)}
 
     # Build base query using only entities the current user has access to
     base_query = """
@@ -290,9 +241,9 @@ def handle_list_entities(connection, query_parameters, valid_entity_ids):
         JOIN entity_types et ON e.entity_type_id = et.entity_type_id
         WHERE e.entity_id IN ({})
         AND e.deleted = false
-    """.format(','.join(['%s'] * len(valid_entity_ids)))
+    """.format(auth_helper.ENTITY_SCOPE_SQL)
 
-    params = valid_entity_ids.copy()
+    params = [scope_user_id]
 
     # Add filters
     if entity_type_name_filter:
@@ -319,24 +270,60 @@ def handle_list_entities(connection, query_parameters, valid_entity_ids):
             result = cursor.fetchone()
             return {"count": result[0]}
 
-    # Get entities with pagination
+    # Keyset pagination on (entity_name, entity_id); names are not unique
+    page_query = ""
+    page_params = []
+    if after:
+        page_query += " AND (e.entity_name > %s OR (e.entity_name = %s AND e.entity_id > %s))"
+        page_params.extend([after[0], after[0], after[1]])
+    page_query += " ORDER BY e.entity_name, e.entity_id"
+    if limit:
+        # One extra row tells whether there is a next page
+        page_query += " LIMIT %s"
+        page_params.append(limit + 1)
+
+    # Before the cursor is applied the window count is the full total
+    count_mode = pagination_helper.get_count_mode(
+        query_parameters) if limit else None
+    window_count = count_mode == 'exact' and not after
+
+    # Every filter is a semi-join, so each entity appears once
     query = f"""
-        SELECT DISTINCT e.entity_id, e.entity_name, e.entity_type_id, e.attributes, e.update_date, e.updated_user_id,
-               et.entity_type_name
+        SELECT e.entity_id, e.entity_name, e.entity_type_id, e.attributes, e.update_date, e.updated_user_id,
+               et.entity_type_name{", COUNT(*) OVER() AS total_count" if window_count else ""}
         {base_query}
-        ORDER BY e.entity_name
+        {page_query}
     """
 
     with connection.cursor() as cursor:
-        cursor.execute(query, params)
+        cursor.execute(query, params + page_params)
         results = cursor.fetchall()
 
+        total_count = None
+        if window_count:
+            total_count = results[0][7] if results else 0
+        elif count_mode == 'exact':
+            count_query = f"SELECT COUNT(*) as count {base_query}"
+            cursor.execute(count_query, params)
+            total_count = cursor.fetchone()[0]
+        elif count_mode == 'estimate':
+            total_count = pagination_helper.estimate_count(
+                cursor, base_query, params)
+
+        next_cursor = None
+        if limit:
+            results, next_cursor = pagination_helper.build_page(
+                results, limit, lambda result: [result[1], result[0]])
+
+        # One lookup for the page's editors rather than one per row
+        user_names = get_user_names_by_ids(
+            connection, [result[5] for result in results])
+
         data = []
         for result in results:
             # Map database fields to OpenAPI schema
             attributes = json.loads(result[3]) if result[3] else {}
-            updated_by_user_name = get_user_name_by_id(
-                connection, result[5]) if result[5] else None
+            updated_by_user_name = user_names.get(result[5])
 
             data.append({
                 "entity_id": result[0],  # Include entity_id for DataGrid
@@ -347,10 +334,19 @@ def handle_list_entities(connection, query_parameters, valid_entity_ids):
                 "updated_by_user_name": updated_by_user_name
             })
 
-        return data
+        if not limit:
+            return data
+
+        page = {
+            "data": data,
+            "next_cursor": next_cursor
+        }
+        if total_count is not None:
+            page["count"] = total_count
+        return page
 
 
-def handle_post_operations(connection, path, path_parameters, body, current_user_id, valid_entity_ids, secret):
+def handle_post_operations(connection, path, path_parameters, body, current_user_id, scope_user_id, secret):
     """Handle POST operations."""
     if '/entities:set' in path and path.startswith('/entities/'):
         return handle_set_client_group_entities(connection, path_parameters, body, current_user_id)
@@ -525,7 +521,7 @@ def handle_create_entity(connection, body, current_user_id, secret):
             return {"message": "Entity created successfully"}
 
 
-def handle_put_operations(connection, path, path_parameters, body, current_user_id, valid_entity_ids, secret):
+def handle_put_operations(connection, path, path_parameters, body, current_user_id, scope_user_id, secret):
     """Handle PUT operations."""
     if 'entity_name' not in path_parameters:
         return {"error": "entity_name is required in path"}
@@ -558,8 +554,8 @@ def handle_put_operations(connection, path, path_parameters, body, current_user_
         cursor.execute("""
             SELECT entity_id FROM entities 
             WHERE entity_name = %s AND entity_id IN ({}) AND deleted = false
-        """.format(','.join(['%s'] * len(valid_entity_ids))),
-            [entity_name] + valid_entity_ids)
+        """.format(auth_helper.ENTITY_SCOPE_SQL),
+            (entity_name, scope_user_id))
         existing = cursor.fetchone()
 
         if not existing:
@@ -607,7 +603,7 @@ def handle_put_operations(connection, path, path_parameters, body, current_user_
         return {"message": "Entity updated successfully"}
 
 
-def handle_delete_operations(connection, path, path_parameters, current_user_id, valid_entity_ids):
+def handle_delete_operations(connection, path, path_parameters, current_user_id, scope_user_id):
     """Handle DELETE operations."""
     if 'entity_name' not in path_parameters:
         return {"error": "entity_name is required in path"}
@@ -619,8 +615,8 @@ def handle_delete_operations(connection, path, path_parameters, current_user_id,
         cursor.execute("""
             SELECT entity_id FROM entities 
             WHERE entity_name = %s AND entity_id IN ({}) AND deleted = false
-        """.format(','.join(['%s'] * len(valid_entity_ids))),
-            [entity_name] + valid_entity_ids)
+        """.format(auth_helper.ENTITY_SCOPE_SQL),
+            (entity_name, scope_user_id))
         existing = cursor.fetchone()
 
         if not existing:
@@ -686,31 +682,39 @@ def lambda_handler(event, context):
     query_parameters = event.get('queryStringParameters') or {}
     body = event.get('body', '{}')
 
-    connection = None
     try:
-        # Get secret from Secrets Manager (called once per invocation)
-        secret = get_secret()
-
-        # Get database connection
-        connection = get_db_connection(secret)
-
-        # Get valid entity IDs for authorization
-        valid_entity_ids = get_valid_entity_ids_for_current_user(
-            connection, current_user_id)
-        if not valid_entity_ids:
+        # Secret and connection are reused across warm invocations
+        secret = runtime_helper.get_secret()
+        connection = runtime_helper.get_db_connection()
+
+        # Resolve the caller's authorization scope (cached per sub in the container)
+        scope = auth_helper.get_user_scope(connection, current_user_id)
+        if not scope or not scope["has_entities"]:
+            runtime_helper.release_connection()
             return {
                 "statusCode": 403,
                 "body": json.dumps({"error": "User has no client group affiliations or access denied"}),
                 "headers": cors_helper.get_cors_headers()
             }
 
+        # Conditional GET: answer 304 if nothing the response is built from has changed.
+        # Memberships decide the scope; users and entity types supply names.
+        validators = None
+        if http_method == 'GET':
+            validators = cache_helper.get_validators(
+                connection, ['entities', 'entity_types', 'client_group_entities',
+                             'client_group_users', 'users'], event)
+            if cache_helper.is_not_modified(event, validators):
+                runtime_helper.release_connection()
+                return cache_helper.not_modified_response(validators)
+
         # Handle different operations based on HTTP method and path
         response = handle_entity_operations(
             connection, http_method, path, path_parameters,
-            query_parameters, body, current_user_id, valid_entity_ids, secret
+            query_parameters, body, current_user_id, scope["user_id"], secret
         )
 
-        connection.close()
+        runtime_helper.release_connection()
 
         # Return appropriate status code based on operation
         status_code = 200
@@ -719,19 +723,20 @@ def lambda_handler(event, context):
         elif http_method == 'DELETE':
             status_code = 204
 
+        if http_method == 'GET':
+            headers = cache_helper.get_cache_headers(validators)
+        else:
+            headers = cors_helper.get_cors_headers()
+
         return {
             "statusCode": status_code,
             "body": json.dumps(response) if response is not None else "",
-            "headers": cors_helper.get_cors_headers()
+            "headers": headers
         }
 
     except Exception as e:
-        # Try to close connection if it exists
-        try:
-            if connection:
-                connection.close()
-        except:
-            pass
+        # Roll back whatever the failed request left open
+        runtime_helper.release_connection()
 
         return {
             "statusCode": 500,
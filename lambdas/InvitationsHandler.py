@@ -1,38 +1,9 @@
 import json
-import boto3
-import pymysql
 import os
 from datetime import datetime, timedelta
 from botocore.exceptions import ClientError
 import cors_helper
-
-
-def get_db_connection():
-    """Get database connection using secrets manager."""
-    try:
-        # Get secret from AWS Secrets Manager
-        secrets_client = boto3.client(
-            'secretsmanager', region_name='us-east-2')
-        secret_arn = os.environ.get('SECRET_ARN')
-
-        if not secret_arn:
-            raise Exception("SECRET_ARN environment variable not set")
-
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        secret = json.loads(response['SecretString'])
-
-        connection = pymysql.connect(
-            host=secret['DB_HOST'],
-            user=secret['DB_USER'],
-            password=secret['DB_PASS'],
-            database=secret['DATABASE'],
-            connect_timeout=10,
-            read_timeout=10,
-            write_timeout=10
-        )
-        return connection
-    except Exception as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
+import runtime_helper
 
 
 def get_user_id_from_sub(connection, current_user_id):
@@ -98,10 +69,9 @@ def lambda_handler(event, context):
     query_parameters = event.get('queryStringParameters') or {}
     body = event.get('body', '{}')
 
-    connection = None
     try:
-        # Get database connection
-        connection = get_db_connection()
+        # Connection is reused across warm invocations
+        connection = runtime_helper.get_db_connection()
 
         if http_method == 'GET':
             # Handle GET operations
@@ -620,7 +590,7 @@ def lambda_handler(event, context):
                 "headers": cors_helper.get_cors_headers()
             }
 
-        connection.close()
+        runtime_helper.release_connection()
 
         # Return appropriate status code based on operation
         status_code = 200
@@ -638,12 +608,8 @@ def lambda_handler(event, context):
         }
 
     except Exception as e:
-        # Try to close connection if it exists
-        try:
-            if connection:
-                connection.close()
-        except:
-            pass
+        # Roll back whatever the failed request left open
+        runtime_helper.release_connection()
 
         return {
             "statusCode": 500,
@@ -1,11 +1,24 @@
 import json
-import boto3
 import os
 import time
 from datetime import datetime, timedelta, timezone
 from botocore.exceptions import ClientError
 from typing import Dict, Any, Optional
 import cors_helper
+import runtime_helper
+
+# Autoscaling thresholds, evaluated by a scheduled EventBridge invocation
+# Visible messages that start a stopped keeper
+AUTOSCALE_START_DEPTH = int(os.environ.get('AUTOSCALE_START_DEPTH', '1'))
+# Age in seconds of the oldest message that starts a stopped keeper
+AUTOSCALE_START_AGE = int(os.environ.get('AUTOSCALE_START_AGE', '60'))
+# Minutes without new messages after which a running keeper counts as idle
+AUTOSCALE_IDLE_MINUTES = int(os.environ.get('AUTOSCALE_IDLE_MINUTES', '15'))
+# Window (minutes) over which the recent arrival rate is measured
+AUTOSCALE_RATE_WINDOW = int(os.environ.get('AUTOSCALE_RATE_WINDOW', '120'))
+# Arrivals per hour over the window at or above which an idle keeper stays up as a warm standby
+AUTOSCALE_STANDBY_RATE = float(
+    os.environ.get('AUTOSCALE_STANDBY_RATE', '6'))
 
 
 def get_instance_status(instance_id):
@@ -27,7 +40,7 @@ def get_instance_status(instance_id):
         }
 
     try:
-        ec2_client = boto3.client('ec2', region_name='us-east-2')
+        ec2_client = runtime_helper.get_client('ec2')
 
         # Get EC2 instance state
         response = ec2_client.describe_instances(InstanceIds=[instance_id])
@@ -80,7 +93,7 @@ def start_instance(instance_id):
         }
 
     try:
-        ec2_client = boto3.client('ec2', region_name='us-east-2')
+        ec2_client = runtime_helper.get_client('ec2')
 
         # Start the instance (non-blocking)
         print(f"Starting EC2 instance {instance_id}...")
@@ -108,7 +121,7 @@ def release_instance(instance_id):
         raise Exception("Instance ID not provided")
 
     try:
-        ec2_client = boto3.client('ec2', region_name='us-east-2')
+        ec2_client = runtime_helper.get_client('ec2')
 
         # Check current state
         status = get_instance_status(instance_id)
@@ -132,6 +145,97 @@ def release_instance(instance_id):
         raise Exception(f"Failed to stop instance: {str(e)}")
 
 
+def get_metric_datapoints(cloudwatch, queue_name, metric_name, statistic, minutes):
+    """Per-minute CloudWatch datapoints for an SQS queue metric over the last `minutes`."""
+    now = datetime.now(timezone.utc)
+    response = cloudwatch.get_metric_statistics(
+        Namespace='AWS/SQS',
+        MetricName=metric_name,
+        Dimensions=[{'Name': 'QueueName', 'Value': queue_name}],
+        StartTime=now - timedelta(minutes=minutes),
+        EndTime=now,
+        Period=60,
+        Statistics=[statistic]
+    )
+    return [(point['Timestamp'], point[statistic]) for point in response.get('Datapoints', [])]
+
+
+def get_queue_stats(queue_url):
+    """
+    Collect the signals the autoscaler decides on.
+
+    Queue depth comes from the queue attributes (near real time); the age
+    of the oldest message and the arrival history come from CloudWatch,
+    which lags by a few minutes.
+    """
+    sqs_client = runtime_helper.get_client('sqs')
+    cloudwatch = runtime_helper.get_client('cloudwatch')
+    queue_name = queue_url.rstrip('/').rsplit('/', 1)[-1]
+
+    attributes = sqs_client.get_queue_attributes(
+        QueueUrl=queue_url,
+        AttributeNames=['ApproximateNumberOfMessages',
+                        'ApproximateNumberOfMessagesNotVisible']
+    )['Attributes']
+
+    oldest = get_metric_datapoints(
+        cloudwatch, queue_name, 'ApproximateAgeOfOldestMessage', 'Maximum', 5)
+    sent = get_metric_datapoints(
+        cloudwatch, queue_name, 'NumberOfMessagesSent', 'Sum', AUTOSCALE_RATE_WINDOW)
+    idle_since = datetime.now(timezone.utc) - \
+        timedelta(minutes=AUTOSCALE_IDLE_MINUTES)
+
+    return {
+        'queue_depth': int(attributes.get('ApproximateNumberOfMessages', 0)),
+        'in_flight': int(attributes.get('ApproximateNumberOfMessagesNotVisible', 0)),
+        'oldest_message_age': max((value for _, value in oldest), default=0),
+        'recent_arrivals': sum(value for timestamp, value in sent if timestamp >= idle_since),
+        'arrivals_per_hour': sum(value for _, value in sent) * 60 / AUTOSCALE_RATE_WINDOW
+    }
+
+
+def decide_scaling(ec2_state, stats):
+    """
+    Decide what to do with the keeper instance.
+
+    Returns (action, reason) where action is 'start', 'stop' or 'none'.
+    A stopped keeper is started once the backlog or the wait of the oldest
+    message crosses its threshold. An idle running keeper is stopped unless
+    the recent arrival rate says more work is likely soon, in which case it
+    stays up as a warm standby.
+    """
+    if ec2_state == 'stopped':
+        if stats['queue_depth'] >= AUTOSCALE_START_DEPTH:
+            return 'start', f"{stats['queue_depth']} messages waiting"
+        if stats['oldest_message_age'] >= AUTOSCALE_START_AGE:
+            return 'start', f"oldest message waiting {stats['oldest_message_age']:.0f}s"
+        return 'none', 'no backlog'
+
+    if ec2_state == 'running':
+        if stats['queue_depth'] or stats['in_flight'] or stats['recent_arrivals']:
+            return 'none', 'busy'
+        if stats['arrivals_per_hour'] >= AUTOSCALE_STANDBY_RATE:
+            return 'none', f"warm standby ({stats['arrivals_per_hour']:.1f} arrivals/hour)"
+        return 'stop', f"idle for {AUTOSCALE_IDLE_MINUTES} minutes ({stats['arrivals_per_hour']:.1f} arrivals/hour)"
+
+    return 'none', f"instance is {ec2_state}"
+
+
+def autoscale(instance_id, queue_url):
+    """Evaluate the queue and start or stop the keeper instance accordingly."""
+    stats = get_queue_stats(queue_url)
+    ec2_state = get_instance_status(instance_id)['ec2_state']
+    action, reason = decide_scaling(ec2_state, stats)
+
+    print(f"Autoscale: state={ec2_state} stats={stats} action={action} ({reason})")
+    if action == 'start':
+        start_instance(instance_id)
+    elif action == 'stop':
+        release_instance(instance_id)
+
+    return {'ec2_state': ec2_state, 'action': action, 'reason': reason, **stats}
+
+
 def lambda_handler(event, context):
     """
     Handle Position Keeper commands (start/stop/status).
@@ -144,8 +248,14 @@ def lambda_handler(event, context):
 
     POST /position-keeper/stop:
         - Stops the EC2 instance if it's running
+
+    Scheduled EventBridge events (source aws.events) run the autoscaler.
     """
 
+    if event.get('source') == 'aws.events':
+        secret = runtime_helper.get_secret()
+        return autoscale(secret.get('PK_INSTANCE'), secret.get('QUEUE_URL'))
+
     # Extract current user from headers (required by OpenAPI spec)
     current_user_id = event.get('headers', {}).get(
         'X-Current-User-Id', 'system')
@@ -170,14 +280,7 @@ def lambda_handler(event, context):
 
     try:
         # Get instance ID from secret
-        secrets_client = boto3.client(
-            'secretsmanager', region_name='us-east-2')
-        secret_arn = os.environ.get('SECRET_ARN')
-        if not secret_arn:
-            raise Exception("SECRET_ARN environment variable not set")
-
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        secret = json.loads(response['SecretString'])
+        secret = runtime_helper.get_secret()
         instance_id = secret.get('PK_INSTANCE')
 
         if not instance_id:
@@ -0,0 +1,83 @@
+import os
+import time
+from typing import Dict, Any
+
+import runtime_helper
+import positionkeeper as pk
+from datacache import DataCache
+from positionjournal import PositionJournal
+from positionsandbox import SandboxWriter
+
+# Seconds a warm container keeps its reference data snapshot before reloading it.
+# refresh_cache messages only reach the container that receives them, so this
+# bounds how stale the other containers can be.
+SNAPSHOT_MAX_AGE = int(os.environ.get("SNAPSHOT_MAX_AGE", "300"))
+
+snapshot_loaded_at = 0
+
+
+def warm_cache():
+    """Load the reference data snapshot on a cold start, and reload it once it is too old."""
+    global snapshot_loaded_at
+
+    if pk.cache is None:
+        secret = runtime_helper.get_secret()
+        pk.cache = DataCache(
+            host=secret['DB_HOST'],
+            user=secret['DB_USER'],
+            password=secret['DB_PASS'],
+            db=secret['DATABASE'],
+            tables=pk.CACHE_TABLES
+        )
+        pk.ensure_position_keeper_user()
+        pk.init_status_writer()
+
+        position_keeper_id = os.environ.get('POSITION_KEEPER_ID')
+        if position_keeper_id:
+            pk.journal = PositionJournal(pk.cache, int(position_keeper_id))
+            pk.sandbox_writer = SandboxWriter(
+                pk.cache, int(position_keeper_id))
+        snapshot_loaded_at = time.time()
+
+    elif time.time() - snapshot_loaded_at >= SNAPSHOT_MAX_AGE:
+        pk.cache.refresh_all()
+        snapshot_loaded_at = time.time()
+
+
+def to_sqs_message(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a Lambda SQS event record to the receive_message shape the keeper uses."""
+    return {
+        "MessageId": record["messageId"],
+        "ReceiptHandle": record.get("receiptHandle"),
+        "Body": record.get("body", ""),
+        "Attributes": record.get("attributes", {})
+    }
+
+
+def lambda_handler(event, context):
+    """
+    Process an SQS batch with the position keeper's message logic.
+
+    Runs the same coalescing and process_message path as the EC2 keeper and
+    reports failed messages individually (ReportBatchItemFailures), so only
+    those messages, and the later messages of their FIFO groups, are
+    redelivered.
+    """
+    warm_cache()
+
+    messages = [to_sqs_message(record)
+                for record in event.get('Records', [])]
+    print(f"Processing batch of {len(messages)} messages")
+
+    failed = pk.process_batch(messages)
+
+    # A failed flush rolls back and raises, so Lambda retries the whole batch
+    pk.flush_writes()
+    pk.metrics.emit_if_due()
+
+    if failed:
+        print(f"{len(failed)} of {len(messages)} messages failed")
+
+    return {
+        "batchItemFailures": [{"itemIdentifier": msg["MessageId"]} for msg, _ in failed]
+    }
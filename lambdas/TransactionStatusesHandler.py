@@ -1,39 +1,11 @@
 
 import json
-import boto3
-import pymysql
 import os
 from datetime import datetime
 from botocore.exceptions import ClientError
 import cors_helper
-
-
-def get_db_connection():
-    """Get database connection using secrets manager."""
-    try:
-        # Get secret from AWS Secrets Manager
-        secrets_client = boto3.client(
-            'secretsmanager', region_name='us-east-2')
-        secret_arn = os.environ.get('SECRET_ARN')
-
-        if not secret_arn:
-            raise Exception("SECRET_ARN environment variable not set")
-
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        secret = json.loads(response['SecretString'])
-
-        connection = pymysql.connect(
-            host=secret['DB_HOST'],
-            user=secret['DB_USER'],
-            password=secret['DB_PASS'],
-            database=secret['DATABASE'],
-            connect_timeout=10,
-            read_timeout=10,
-            write_timeout=10
-        )
-        return connection
-    except Exception as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
+import runtime_helper
+import cache_helper
 
 
 def lambda_handler(event, context):
@@ -51,8 +23,17 @@ def lambda_handler(event, context):
     query_parameters = event.get('queryStringParameters') or {}
 
     try:
-        # Get database connection
-        connection = get_db_connection()
+        # Connection is reused across warm invocations
+        connection = runtime_helper.get_db_connection()
+
+        # Conditional GET: answer 304 if nothing the response is built from has changed
+        validators = None
+        if http_method == 'GET':
+            validators = cache_helper.get_validators(
+                connection, ['transaction_statuses'], event)
+            if cache_helper.is_not_modified(event, validators):
+                runtime_helper.release_connection()
+                return cache_helper.not_modified_response(validators)
 
         if http_method == 'GET':
             # Handle GET operations - list transaction statuses
@@ -88,21 +69,17 @@ def lambda_handler(event, context):
                 "headers": cors_helper.get_cors_headers()
             }
 
-        connection.close()
+        runtime_helper.release_connection()
 
         return {
             "statusCode": 200,
             "body": json.dumps(response),
-            "headers": cors_helper.get_cors_headers()
+            "headers": cache_helper.get_cache_headers(validators)
         }
 
     except Exception as e:
-        # Try to close connection if it exists
-        try:
-            if 'connection' in locals():
-                connection.close()
-        except:
-            pass
+        # Roll back whatever the failed request left open
+        runtime_helper.release_connection()
 
         return {
             "statusCode": 500,
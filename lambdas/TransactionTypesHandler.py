@@ -1,6 +1,4 @@
 import json
-import boto3
-import pymysql
 import os
 import uuid
 from datetime import datetime, timezone
@@ -8,39 +6,8 @@ from botocore.exceptions import ClientError
 from urllib.parse import unquote
 from typing import Dict, Any
 import cors_helper
-
-
-def get_secret():
-    """Get secret from AWS Secrets Manager. Called once per Lambda invocation."""
-    try:
-        secrets_client = boto3.client(
-            'secretsmanager', region_name='us-east-2')
-        secret_arn = os.environ.get('SECRET_ARN')
-
-        if not secret_arn:
-            raise Exception("SECRET_ARN environment variable not set")
-
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        return json.loads(response['SecretString'])
-    except Exception as e:
-        raise Exception(f"Failed to retrieve secret: {str(e)}")
-
-
-def get_db_connection(secret):
-    """Get database connection using provided secret."""
-    try:
-        connection = pymysql.connect(
-            host=secret['DB_HOST'],
-            user=secret['DB_USER'],
-            password=secret['DB_PASS'],
-            database=secret['DATABASE'],
-            connect_timeout=10,
-            read_timeout=10,
-            write_timeout=10
-        )
-        return connection
-    except Exception as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
+import runtime_helper
+import cache_helper
 
 
 def get_user_id_from_sub(connection, current_user_id):
@@ -71,7 +38,7 @@ def send_cache_refresh_to_sqs(secret: Dict[str, Any], table: str) -> bool:
         if not queue_url:
             raise Exception("QUEUE_URL not found in secrets")
 
-        sqs = boto3.client('sqs', region_name='us-east-2')
+        sqs = runtime_helper.get_client('sqs')
 
         # Prepare message body
         message_body = {
@@ -123,13 +90,19 @@ def lambda_handler(event, context):
     query_parameters = event.get('queryStringParameters') or {}
     body = event.get('body', '{}')
 
-    connection = None
     try:
-        # Get secret from Secrets Manager (called once per invocation)
-        secret = get_secret()
+        # Secret and connection are reused across warm invocations
+        secret = runtime_helper.get_secret()
+        connection = runtime_helper.get_db_connection()
 
-        # Get database connection
-        connection = get_db_connection(secret)
+        # Conditional GET: answer 304 if nothing the response is built from has changed
+        validators = None
+        if http_method == 'GET':
+            validators = cache_helper.get_validators(
+                connection, ['transaction_types'], event)
+            if cache_helper.is_not_modified(event, validators):
+                runtime_helper.release_connection()
+                return cache_helper.not_modified_response(validators)
 
         if http_method == 'GET':
             # Handle GET operations
@@ -366,7 +339,7 @@ def lambda_handler(event, context):
                 "headers": cors_helper.get_cors_headers()
             }
 
-        connection.close()
+        runtime_helper.release_connection()
 
         # Return appropriate status code based on operation
         status_code = 200
@@ -375,19 +348,20 @@ def lambda_handler(event, context):
         elif http_method == 'DELETE':
             status_code = 204
 
+        if http_method == 'GET':
+            headers = cache_helper.get_cache_headers(validators)
+        else:
+            headers = cors_helper.get_cors_headers()
+
         return {
             "statusCode": status_code,
             "body": json.dumps(response) if response is not None else "",
-            "headers": cors_helper.get_cors_headers()
+            "headers": headers
         }
 
     except Exception as e:
-        # Try to close connection if it exists
-        try:
-            if connection:
-                connection.close()
-        except:
-            pass
+        # Roll back whatever the failed request left open
+        runtime_helper.release_connection()
 
         return {
             "statusCode": 500,
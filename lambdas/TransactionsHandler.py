@@ -1,117 +1,55 @@
 
+import io
+import re
+import csv
 import json
-import boto3
-import pymysql
 import os
 import uuid
+import unicodedata
 from datetime import datetime, timezone
 from botocore.exceptions import ClientError
 from urllib.parse import unquote
 from typing import Dict, Any
+import pymysql
 import cors_helper
-
-
-def get_secret():
-    """Get secret from AWS Secrets Manager. Called once per Lambda invocation."""
-    try:
-        secrets_client = boto3.client(
-            'secretsmanager', region_name='us-east-2')
-        secret_arn = os.environ.get('SECRET_ARN')
-
-        if not secret_arn:
-            raise Exception("SECRET_ARN environment variable not set")
-
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        return json.loads(response['SecretString'])
-    except Exception as e:
-        raise Exception(f"Failed to retrieve secret: {str(e)}")
-
-
-def get_db_connection(secret):
-    """Get database connection using provided secret."""
-    try:
-        connection = pymysql.connect(
-            host=secret['DB_HOST'],
-            user=secret['DB_USER'],
-            password=secret['DB_PASS'],
-            database=secret['DATABASE'],
-            connect_timeout=10,
-            read_timeout=10,
-            write_timeout=10
-        )
-        return connection
-    except Exception as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
-
-
-def get_user_id_from_sub(connection, current_user_id):
-    """
-    Get the user_id from the database based on the sub (Cognito user ID).
-    Returns None if user not found.
-    """
-    try:
-        if current_user_id == 'system':
-            return None
-
-        with connection.cursor() as cursor:
-            cursor.execute(
-                "SELECT user_id FROM users WHERE sub = %s", (current_user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
-    except Exception as e:
-        print(f"Error getting user_id from sub: {e}")
-        return None
-
-
-def get_user_client_groups(connection, user_id):
-    """
-    Get all client group IDs that the user is affiliated with.
-    Returns a list of client_group_ids.
-    """
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT DISTINCT client_group_id 
-                FROM client_group_users 
-                WHERE user_id = %s
-            """, (user_id,))
-            results = cursor.fetchall()
-            return [row[0] for row in results]
-    except Exception as e:
-        print(f"Error getting user client groups: {e}")
-        return []
-
-
-def get_valid_portfolio_entity_ids_for_current_user(connection, current_user_id):
-    """
-    Get all portfolio entity IDs that the current user is authorized to view/modify.
-    This includes all portfolio entities in the same client groups as the current user.
-    Returns a list of portfolio_entity_ids.
-    """
-    try:
-        # Get current user's client groups
-        current_user_id_db = get_user_id_from_sub(connection, current_user_id)
-        if not current_user_id_db:
-            return []
-
-        user_client_groups = get_user_client_groups(
-            connection, current_user_id_db)
-        if not user_client_groups:
-            return []
-
-        # Get all portfolio entity IDs that are in any of the current user's client groups
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT DISTINCT entity_id 
-                FROM client_group_entities 
-                WHERE client_group_id IN ({})
-            """.format(','.join(['%s'] * len(user_client_groups))),
-                user_client_groups)
-            results = cursor.fetchall()
-            return [row[0] for row in results]
-    except Exception as e:
-        print(f"Error getting valid portfolio entity IDs: {e}")
-        return []
+import runtime_helper
+import pagination_helper
+import auth_helper
+
+# Date range filters: query parameter -> (column, comparison)
+DATE_RANGE_FILTERS = {
+    'trade_date_from': ('t.trade_date', '>='),
+    'trade_date_to': ('t.trade_date', '<='),
+    'settle_date_from': ('t.settle_date', '>='),
+    'settle_date_to': ('t.settle_date', '<='),
+}
+
+# Most transactions accepted by one POST /transactions/batch
+MAX_BATCH_SIZE = 1000
+# Rows per multi-row INSERT statement
+INSERT_CHUNK_SIZE = 200
+# Most messages SQS accepts in one send_message_batch call
+SQS_BATCH_SIZE = 10
+
+# Rows read from the unbuffered export cursor at a time
+EXPORT_FETCH_SIZE = 1000
+# Bytes buffered before they are uploaded as one part of the export object
+EXPORT_PART_SIZE = 8 * 1024 * 1024
+# Seconds the export download link stays valid
+EXPORT_URL_TTL = int(os.environ.get('EXPORT_URL_TTL', '3600'))
+# Seconds the export job's own connection waits for rows (the sort can take a while),
+# and MySQL waits for the job to read them while it uploads a part
+EXPORT_READ_TIMEOUT = 300
+# Seconds before the Lambda timeout at which an export job gives up, so it can
+# abort its multipart upload itself rather than be killed mid-upload
+EXPORT_TIME_MARGIN = 60
+EXPORT_ID_PATTERN = re.compile(r'^\d{8}T\d{6}Z-[0-9a-f]{8}$')
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_COLUMNS = [
+    'transaction_id', 'portfolio_entity_name', 'contra_entity_name', 'instrument_entity_name',
+    'transaction_status_name', 'transaction_type_name', 'trade_date', 'settle_date',
+    'properties', 'update_date', 'updated_by_user_name'
+]
 
 
 def get_entity_id_by_name(connection, entity_name):
@@ -194,17 +132,57 @@ def get_transaction_status_name_by_id(connection, transaction_status_id):
         return None
 
 
-def get_user_name_by_id(connection, user_id):
-    """Get user email (user_name) from user_id."""
+def collation_key(name):
+    """
+    Fold a name the way utf8mb4_0900_ai_ci compares it: ignoring case and accents.
+    Trailing spaces are kept, since 0900 collations do not pad.
+    """
+    decomposed = unicodedata.normalize('NFKD', name)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def get_ids_by_names(connection, table, id_column, name_column, names):
+    """
+    Get ids for many names in one query. Returns {name: id} keyed by the names
+    as requested; unknown names are absent.
+
+    The IN lookup matches under the column's case- and accent-insensitive
+    collation, so each requested name is paired with the row it matched by
+    comparing collation keys, as a single lookup by name would.
+    """
+    names = list({name for name in names if name})
+    if not names:
+        return {}
     try:
         with connection.cursor() as cursor:
             cursor.execute(
-                "SELECT email FROM users WHERE user_id = %s", (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+                "SELECT {}, {} FROM {} WHERE {} IN ({})".format(
+                    name_column, id_column, table, name_column,
+                    ','.join(['%s'] * len(names))), names)
+            ids_by_key = {}
+            for row in cursor.fetchall():
+                ids_by_key.setdefault(collation_key(row[0]), row[1])
+            return {name: ids_by_key[collation_key(name)]
+                    for name in names if collation_key(name) in ids_by_key}
     except Exception as e:
-        print(f"Error getting email by ID: {e}")
-        return None
+        print(f"Error getting {id_column}s by {name_column}: {e}")
+        return {}
+
+
+def get_user_names_by_ids(connection, user_ids):
+    """Get user emails (user_names) for many user_ids with one query. Returns {user_id: email}."""
+    user_ids = list({user_id for user_id in user_ids if user_id})
+    if not user_ids:
+        return {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT user_id, email FROM users WHERE user_id IN ({})".format(
+                    ','.join(['%s'] * len(user_ids))), user_ids)
+            return {row[0]: row[1] for row in cursor.fetchall()}
+    except Exception as e:
+        print(f"Error getting emails by ID: {e}")
+        return {}
 
 
 def lambda_handler(event, context):
@@ -213,6 +191,10 @@ def lambda_handler(event, context):
     Returns data compliant with OpenAPI specification.
     """
 
+    # Export job invoked asynchronously by GET /transactions/export
+    if 'export_job' in event:
+        return run_export_job(event['export_job'], context)
+
     # Extract current user from headers (case-insensitive lookup)
     headers = event.get('headers', {})
     current_user_id = 'system'  # default
@@ -228,18 +210,15 @@ def lambda_handler(event, context):
     query_parameters = event.get('queryStringParameters') or {}
     body = event.get('body', '{}')
 
-    connection = None
     try:
-        # Get secret from Secrets Manager (called once per invocation)
-        secret = get_secret()
-
-        # Get database connection
-        connection = get_db_connection(secret)
-
-        # Get valid portfolio entity IDs for authorization
-        valid_portfolio_entity_ids = get_valid_portfolio_entity_ids_for_current_user(
-            connection, current_user_id)
-        if not valid_portfolio_entity_ids:
+        # Secret and connection are reused across warm invocations
+        secret = runtime_helper.get_secret()
+        connection = runtime_helper.get_db_connection()
+
+        # Resolve the caller's authorization scope (cached per sub in the container)
+        scope = auth_helper.get_user_scope(connection, current_user_id)
+        if not scope or not scope["has_entities"]:
+            runtime_helper.release_connection()
             return {
                 "statusCode": 403,
                 "body": json.dumps({"error": "User has no client group affiliations or access denied"}),
@@ -249,10 +228,10 @@ def lambda_handler(event, context):
         # Handle different operations based on HTTP method and path
         response = handle_transaction_operations(
             connection, http_method, path, path_parameters,
-            query_parameters, body, current_user_id, valid_portfolio_entity_ids, secret
+            query_parameters, body, current_user_id, scope["user_id"], secret
         )
 
-        connection.close()
+        runtime_helper.release_connection()
 
         # Return appropriate status code based on operation
         status_code = 200
@@ -268,12 +247,8 @@ def lambda_handler(event, context):
         }
 
     except Exception as e:
-        # Try to close connection if it exists
-        try:
-            if connection:
-                connection.close()
-        except:
-            pass
+        # Roll back whatever the failed request left open
+        runtime_helper.release_connection()
 
         return {
             "statusCode": 500,
@@ -282,21 +257,71 @@ def lambda_handler(event, context):
         }
 
 
-def handle_transaction_operations(connection, http_method, path, path_parameters, query_parameters, body, current_user_id, valid_portfolio_entity_ids, secret):
+def handle_transaction_operations(connection, http_method, path, path_parameters, query_parameters, body, current_user_id, scope_user_id, secret):
     """Handle all transaction operations based on HTTP method and path."""
 
-    if http_method == 'GET':
-        return handle_get_operations(connection, path, path_parameters, query_parameters, valid_portfolio_entity_ids)
+    if http_method == 'GET' and path.rstrip('/').endswith('/transactions/export'):
+        return handle_export_transactions(connection, query_parameters, scope_user_id, secret)
+    elif http_method == 'GET' and '/transactions/export/' in path:
+        export_id = path_parameters.get(
+            'export_id') or path.rstrip('/').rsplit('/', 1)[-1]
+        return handle_export_status(export_id, scope_user_id, secret)
+    elif http_method == 'GET':
+        return handle_get_operations(connection, path, path_parameters, query_parameters, scope_user_id)
+    elif http_method == 'POST' and path.rstrip('/').endswith('/transactions/batch'):
+        return handle_batch_post(connection, body, scope_user_id, secret)
     elif http_method == 'POST':
-        return handle_post_operations(connection, path, path_parameters, body, current_user_id, valid_portfolio_entity_ids, secret)
+        return handle_post_operations(connection, path, path_parameters, body, current_user_id, scope_user_id, secret)
     elif http_method == 'PUT':
-        return handle_put_operations(connection, path, path_parameters, body, current_user_id, valid_portfolio_entity_ids, secret)
+        return handle_put_operations(connection, path, path_parameters, body, current_user_id, scope_user_id, secret)
     elif http_method == 'DELETE':
-        return handle_delete_operations(connection, path, path_parameters, current_user_id, valid_portfolio_entity_ids, secret)
+        return handle_delete_operations(connection, path, path_parameters, current_user_id, scope_user_id, secret)
     else:
         return {"error": f"Method {http_method} not allowed for transactions"}
 
 
+def build_sqs_message(transaction_data: Dict[str, Any], operation: str) -> Dict[str, str]:
+    """Build the SQS FIFO message (body, group ID and deduplication ID) for a transaction."""
+    # Convert date objects to strings for JSON serialization
+    trade_date = transaction_data.get("trade_date")
+    if hasattr(trade_date, 'isoformat'):
+        trade_date = trade_date.isoformat()
+
+    settle_date = transaction_data.get("settle_date")
+    if hasattr(settle_date, 'isoformat'):
+        settle_date = settle_date.isoformat()
+
+    # Prepare message body
+    message_body = {
+        "operation": operation,  # "create" or "update" or "delete"
+        "transaction_id": transaction_data.get("transaction_id"),
+        "portfolio_entity_id": transaction_data.get("portfolio_entity_id"),
+        "contra_entity_id": transaction_data.get("contra_entity_id"),
+        "instrument_entity_id": transaction_data.get("instrument_entity_id"),
+        "transaction_type_id": transaction_data.get("transaction_type_id"),
+        "transaction_status_id": transaction_data.get("transaction_status_id"),
+        "trade_date": trade_date,
+        "settle_date": settle_date,
+        "properties": transaction_data.get("properties"),
+        "updated_user_id": transaction_data.get("updated_user_id"),
+        "timestamp": transaction_data.get("timestamp", datetime.now(timezone.utc).isoformat())
+    }
+
+    # Include changes for update operations
+    if "changes" in transaction_data:
+        message_body["changes"] = transaction_data["changes"]
+
+    # Generate unique message group ID and deduplication ID
+    message_group_id = f"transaction-{transaction_data.get('transaction_id', 'new')}"
+    message_deduplication_id = f"{operation}-{transaction_data.get('transaction_id', uuid.uuid4())}-{int(os.urandom(4).hex(), 16)}"
+
+    return {
+        "MessageBody": json.dumps(message_body),
+        "MessageGroupId": message_group_id,
+        "MessageDeduplicationId": message_deduplication_id
+    }
+
+
 def send_to_sqs(transaction_data: Dict[str, Any], operation: str, secret: Dict[str, Any]) -> bool:
     """Send transaction data to SQS FIFO queue."""
     try:
@@ -306,50 +331,14 @@ def send_to_sqs(transaction_data: Dict[str, Any], operation: str, secret: Dict[s
         if not queue_url:
             raise Exception("QUEUE_URL not found in secrets")
 
-        sqs = boto3.client('sqs', region_name='us-east-2')
-
-        # Convert date objects to strings for JSON serialization
-        trade_date = transaction_data.get("trade_date")
-        if hasattr(trade_date, 'isoformat'):
-            trade_date = trade_date.isoformat()
-
-        settle_date = transaction_data.get("settle_date")
-        if hasattr(settle_date, 'isoformat'):
-            settle_date = settle_date.isoformat()
-
-        # Prepare message body
-        message_body = {
-            "operation": operation,  # "create" or "update" or "delete"
-            "transaction_id": transaction_data.get("transaction_id"),
-            "portfolio_entity_id": transaction_data.get("portfolio_entity_id"),
-            "contra_entity_id": transaction_data.get("contra_entity_id"),
-            "instrument_entity_id": transaction_data.get("instrument_entity_id"),
-            "transaction_type_id": transaction_data.get("transaction_type_id"),
-            "transaction_status_id": transaction_data.get("transaction_status_id"),
-            "trade_date": trade_date,
-            "settle_date": settle_date,
-            "properties": transaction_data.get("properties"),
-            "updated_user_id": transaction_data.get("updated_user_id"),
-            "timestamp": transaction_data.get("timestamp", datetime.now(timezone.utc).isoformat())
-        }
+        sqs = runtime_helper.get_client('sqs')
 
-        # Include changes for update operations
-        if "changes" in transaction_data:
-            message_body["changes"] = transaction_data["changes"]
-
-        # Generate unique message group ID and deduplication ID
-        message_group_id = f"transaction-{transaction_data.get('transaction_id', 'new')}"
-        message_deduplication_id = f"{operation}-{transaction_data.get('transaction_id', uuid.uuid4())}-{int(os.urandom(4).hex(), 16)}"
+        message = build_sqs_message(transaction_data, operation)
 
         print(
-            f"DEBUG: Sending to SQS - Group ID: {message_group_id}, Dedup ID: {message_deduplication_id}")
+            f"DEBUG: Sending to SQS - Group ID: {message['MessageGroupId']}, Dedup ID: {message['MessageDeduplicationId']}")
 
-        response = sqs.send_message(
-            QueueUrl=queue_url,
-            MessageBody=json.dumps(message_body),
-            MessageGroupId=message_group_id,
-            MessageDeduplicationId=message_deduplication_id
-        )
+        response = sqs.send_message(QueueUrl=queue_url, **message)
 
         print(f"DEBUG: SQS message sent successfully: {response['MessageId']}")
         return True
@@ -359,7 +348,49 @@ def send_to_sqs(transaction_data: Dict[str, Any], operation: str, secret: Dict[s
         return False
 
 
-def handle_get_operations(connection, path, path_parameters, query_parameters, valid_portfolio_entity_ids):
+def send_batch_to_sqs(transactions, operation: str, secret: Dict[str, Any]) -> set:
+    """
+    Send many transactions to the SQS FIFO queue, SQS_BATCH_SIZE per call.
+
+    Returns:
+        set: transaction_ids whose messages SQS accepted
+    """
+    sent = set()
+    try:
+        queue_url = secret.get('QUEUE_URL')
+        if not queue_url:
+            raise Exception("QUEUE_URL not found in secrets")
+
+        sqs = runtime_helper.get_client('sqs')
+
+        for start in range(0, len(transactions), SQS_BATCH_SIZE):
+            chunk = transactions[start:start + SQS_BATCH_SIZE]
+            entries = [
+                dict(build_sqs_message(transaction_data, operation),
+                     Id=str(transaction_data["transaction_id"]))
+                for transaction_data in chunk
+            ]
+            try:
+                response = sqs.send_message_batch(
+                    QueueUrl=queue_url, Entries=entries)
+            except Exception as e:
+                print(f"ERROR: Failed to send message batch to SQS: {str(e)}")
+                continue
+
+            for failure in response.get('Failed', []):
+                print(
+                    f"ERROR: SQS rejected message for transaction {failure['Id']}: {failure.get('Message')}")
+            sent.update(int(success['Id'])
+                        for success in response.get('Successful', []))
+
+        print(
+            f"DEBUG: SQS batch sent - {len(sent)} of {len(transactions)} messages accepted")
+    except Exception as e:
+        print(f"ERROR: Failed to send messages to SQS: {str(e)}")
+    return sent
+
+
+def handle_get_operations(connection, path, path_parameters, query_parameters, scope_user_id):
     """Handle GET operations."""
     if 'transaction_id' in path_parameters:
         # Get single transaction by ID: /transactions/{transaction_id}
@@ -371,16 +402,17 @@ def handle_get_operations(connection, path, path_parameters, query_parameters, v
                        t.properties, t.transaction_status_id, t.transaction_type_id, t.update_date, t.updated_user_id,
                        pe.entity_name as portfolio_entity_name, ce.entity_name as contra_entity_name, ie.entity_name as instrument_entity_name,
                        ts.transaction_status_name as transaction_status_name, tt.transaction_type_name as transaction_type_name,
-                       t.trade_date, t.settle_date
+                       t.trade_date, t.settle_date, u.email as updated_by_user_name
                 FROM transactions t
                 LEFT JOIN entities pe ON t.portfolio_entity_id = pe.entity_id
                 LEFT JOIN entities ce ON t.contra_entity_id = ce.entity_id
                 LEFT JOIN entities ie ON t.instrument_entity_id = ie.entity_id
                 LEFT JOIN transaction_statuses ts ON t.transaction_status_id = ts.transaction_status_id
                 LEFT JOIN transaction_types tt ON t.transaction_type_id = tt.transaction_type_id
+                LEFT JOIN users u ON t.updated_user_id = u.user_id
                 WHERE t.transaction_id = %s AND t.portfolio_entity_id IN ({}) AND t.deleted = false
-            """.format(','.join(['%s'] * len(valid_portfolio_entity_ids))),
-                [transaction_id] + valid_portfolio_entity_ids)
+            """.format(auth_helper.ENTITY_SCOPE_SQL),
+                (transaction_id, scope_user_id))
             result = cursor.fetchone()
 
             if not result:
@@ -388,8 +420,6 @@ def handle_get_operations(connection, path, path_parameters, query_parameters, v
 
             # Map database fields to OpenAPI schema
             properties = json.loads(result[4]) if result[4] else {}
-            updated_by_user_name = get_user_name_by_id(
-                connection, result[8]) if result[8] else None
 
             return {
                 "transaction_id": result[0],
@@ -402,15 +432,27 @@ def handle_get_operations(connection, path, path_parameters, query_parameters, v
                 "settle_date": result[15].isoformat() if result[15] else None,
                 "properties": properties,
                 "update_date": result[7].isoformat() + "Z" if result[7] else None,
-                "updated_by_user_name": updated_by_user_name
+                "updated_by_user_name": result[16]
             }
     else:
         # List all transactions: /transactions
-        return handle_list_transactions(connection, query_parameters, valid_portfolio_entity_ids)
+        return handle_list_transactions(connection, query_parameters, scope_user_id)
 
 
-def handle_list_transactions(connection, query_parameters, valid_portfolio_entity_ids):
-    """Handle listing transactions with optional filters and pagination."""
+def build_transaction_filters(query_parameters, scope_user_id):
+    """
+    Build the FROM/WHERE clause shared by the transaction list and export.
+
+    The date ranges are inclusive and are served by the (portfolio_entity_id,
+    deleted, trade_date/settle_date) indexes; scripts/check-transaction-indexes.py
+    checks that the plans keep using them.
+
+    Returns:
+        tuple: (base_query, params), restricted to the caller's portfolios
+
+    Raises:
+        ValueError: if a date filter is not a YYYY-MM-DD date
+    """
     # Apply query filters
     portfolio_entity_name_filter = query_parameters.get(
         'portfolio_entity_name')
@@ -421,7 +463,6 @@ def handle_list_transactions(connection, query_parameters, valid_portfolio_entit
         'transaction_status_name')
     transaction_type_name_filter = query_parameters.get(
         'transaction_type_name')
-    count_only = query_parameters.get('count', 'false').lower() == 'true'
 
     # Build base query
     base_query = """
@@ -433,9 +474,9 @@ def handle_list_transactions(connection, query_parameters, valid_portfolio_entit
         LEFT JOIN transaction_types tt ON t.transaction_type_id = tt.transaction_type_id
         WHERE t.portfolio_entity_id IN ({})
         AND t.deleted = false
-    """.format(','.join(['%s'] * len(valid_portfolio_entity_ids)))
+    """.format(auth_helper.ENTITY_SCOPE_SQL)
 
-    params = valid_portfolio_entity_ids.copy()
+    params = [scope_user_id]
 
     # Add filters
     if portfolio_entity_name_filter:
@@ -458,6 +499,39 @@ def handle_list_transactions(connection, query_parameters, valid_portfolio_entit
         base_query += " AND tt.transaction_type_name = %s"
         params.append(transaction_type_name_filter)
 
+    for parameter, (column, comparison) in DATE_RANGE_FILTERS.items():
+        value = query_parameters.get(parameter)
+        if not value:
+            continue
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"{parameter} must be a YYYY-MM-DD date")
+        base_query += f" AND {column} {comparison} %s"
+        params.append(value)
+
+    return base_query, params
+
+
+def handle_list_transactions(connection, query_parameters, scope_user_id):
+    """
+    Handle listing transactions with optional filters and keyset pagination.
+
+    Without `limit` or `after` every matching transaction is returned. With
+    them, one page is returned newest first with a `next_cursor` for the
+    following page. The total is only counted if `include_count` is true, in
+    the page query itself on the first page, or estimated from index
+    statistics if it is `estimate`.
+    """
+    count_only = query_parameters.get('count', 'false').lower() == 'true'
+    try:
+        limit, after = pagination_helper.get_page_request(
+            query_parameters, (int,))
+        base_query, params = build_transaction_filters(
+            query_parameters, scope_user_id)
+    except ValueError as e:
+        return {"error": str(e)}
+
     if count_only:
         # Return count only
         count_query = f"SELECT COUNT(*) as count {base_query}"
@@ -466,33 +540,67 @@ def handle_list_transactions(connection, query_parameters, valid_portfolio_entit
             result = cursor.fetchone()
             return {"count": result[0] if result else 0}
 
-    # Get transactions with pagination
+    # Keyset pagination on transaction_id, newest first
+    page_query = ""
+    page_params = []
+    if after:
+        page_query += " AND t.transaction_id < %s"
+        page_params.append(after[0])
+    if limit:
+        # One extra row tells whether there is a next page
+        page_query += " ORDER BY t.transaction_id DESC LIMIT %s"
+        page_params.append(limit + 1)
+    else:
+        page_query += " ORDER BY t.transaction_id DESC"
+
+    # Before the cursor is applied the window count is the full total
+    count_mode = pagination_helper.get_count_mode(
+        query_parameters) if limit else None
+    window_count = count_mode == 'exact' and not after
+
     query = f"""
         SELECT t.transaction_id, t.portfolio_entity_id, t.contra_entity_id, t.instrument_entity_id,
                t.properties, t.transaction_status_id, t.transaction_type_id, t.update_date, t.updated_user_id,
                pe.entity_name as portfolio_entity_name, ce.entity_name as contra_entity_name, ie.entity_name as instrument_entity_name,
                ts.transaction_status_name as transaction_status_name, tt.transaction_type_name as transaction_type_name,
-               t.trade_date, t.settle_date
+               t.trade_date, t.settle_date{", COUNT(*) OVER() AS total_count" if window_count else ""}
         {base_query}
-        ORDER BY t.transaction_id DESC
+        {page_query}
     """
 
     with connection.cursor() as cursor:
-        cursor.execute(query, params)
+        cursor.execute(query, params + page_params)
         results = cursor.fetchall()
 
-        # Get total count for pagination
-        count_query = f"SELECT COUNT(*) as count {base_query}"
-        cursor.execute(count_query, params)
-        count_result = cursor.fetchone()
-        total_count = count_result[0] if count_result else 0
+        total_count = None
+        if not limit:
+            # The unpaged list is every match, so it is its own count
+            total_count = len(results)
+        elif window_count:
+            total_count = results[0][16] if results else 0
+        elif count_mode == 'exact':
+            count_query = f"SELECT COUNT(*) as count {base_query}"
+            cursor.execute(count_query, params)
+            count_result = cursor.fetchone()
+            total_count = count_result[0] if count_result else 0
+        elif count_mode == 'estimate':
+            total_count = pagination_helper.estimate_count(
+                cursor, base_query, params)
+
+        next_cursor = None
+        if limit:
+            results, next_cursor = pagination_helper.build_page(
+                results, limit, lambda result: [result[0]])
+
+        # One lookup for the page's editors rather than one per row
+        user_names = get_user_names_by_ids(
+            connection, [result[8] for result in results])
 
         data = []
         for result in results:
             # Map database fields to OpenAPI schema
             properties = json.loads(result[4]) if result[4] else {}
-            updated_by_user_name = get_user_name_by_id(
-                connection, result[8]) if result[8] else None
+            updated_by_user_name = user_names.get(result[8])
 
             data.append({
                 "transaction_id": result[0],
@@ -508,13 +616,248 @@ def handle_list_transactions(connection, query_parameters, valid_portfolio_entit
                 "updated_by_user_name": updated_by_user_name
             })
 
-        return {
+        if not limit:
+            return {
+                "data": data,
+                "count": total_count
+            }
+
+        page = {
             "data": data,
-            "count": total_count
+            "next_cursor": next_cursor
         }
+        if total_count is not None:
+            page["count"] = total_count
+        return page
+
+
+def format_export_row(row, export_format, writer, buffer):
+    """Append one export row to buffer as an NDJSON line or a CSV record."""
+    record = {
+        "transaction_id": row[0],
+        "portfolio_entity_name": row[1],
+        "contra_entity_name": row[2],
+        "instrument_entity_name": row[3],
+        "transaction_status_name": row[4],
+        "transaction_type_name": row[5],
+        "trade_date": row[6].isoformat() if row[6] else None,
+        "settle_date": row[7].isoformat() if row[7] else None,
+        "properties": json.loads(row[8]) if row[8] else {},
+        "update_date": row[9].isoformat() + "Z" if row[9] else None,
+        "updated_by_user_name": row[10]
+    }
+    if export_format == 'csv':
+        record["properties"] = json.dumps(record["properties"])
+        writer.writerow(record)
+    else:
+        buffer.write(json.dumps(record) + "\n")
+
+
+def get_export_prefix(scope_user_id, export_id):
+    """S3 key prefix of an export: the file is <prefix><format>, a failure is <prefix>error."""
+    return f"exports/transactions/{scope_user_id}/{export_id}."
+
+
+def handle_export_transactions(connection, query_parameters, scope_user_id, secret):
+    """
+    Handle exporting transactions: GET /transactions/export.
+
+    Accepts the list filters, including the date ranges, and `format` (ndjson
+    or csv). The request is validated here, and the export itself runs as an
+    asynchronous invocation of this function (run_export_job), since a large
+    export outlasts API Gateway's 29 second limit. Returns the export_id to
+    poll with GET /transactions/export/{export_id}.
+    """
+    export_format = query_parameters.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return {"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}
+
+    if not secret.get('EXPORT_BUCKET'):
+        raise Exception("EXPORT_BUCKET not found in secrets")
+
+    try:
+        build_transaction_filters(query_parameters, scope_user_id)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    export_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{uuid.uuid4().hex[:8]}"
+    runtime_helper.get_client('lambda').invoke(
+        FunctionName=os.environ['AWS_LAMBDA_FUNCTION_NAME'],
+        InvocationType='Event',
+        Payload=json.dumps({"export_job": {
+            "export_id": export_id,
+            "format": export_format,
+            "query_parameters": query_parameters,
+            "scope_user_id": scope_user_id
+        }}))
+
+    return {"export_id": export_id, "status": "pending", "format": export_format}
+
+
+def handle_export_status(export_id, scope_user_id, secret):
+    """
+    Handle checking an export: GET /transactions/export/{export_id}.
+
+    Exports are stored under the requesting user's id, so a user only ever
+    finds their own. Returns the status (pending, complete or failed), with a
+    pre-signed download link once complete.
+    """
+    if not EXPORT_ID_PATTERN.match(export_id or ''):
+        return {"error": "Export not found"}
+
+    bucket = secret.get('EXPORT_BUCKET')
+    if not bucket:
+        raise Exception("EXPORT_BUCKET not found in secrets")
+
+    s3 = runtime_helper.get_client('s3')
+    prefix = get_export_prefix(scope_user_id, export_id)
+    objects = {obj['Key']: obj for obj in s3.list_objects_v2(
+        Bucket=bucket, Prefix=prefix).get('Contents', [])}
+
+    for export_format in EXPORT_FORMATS:
+        key = prefix + export_format
+        if key in objects:
+            return {
+                "export_id": export_id,
+                "status": "complete",
+                "url": s3.generate_presigned_url(
+                    'get_object', Params={"Bucket": bucket, "Key": key}, ExpiresIn=EXPORT_URL_TTL),
+                "format": export_format,
+                "size": objects[key]['Size'],
+                "expires_in": EXPORT_URL_TTL
+            }
+
+    if prefix + 'error' in objects:
+        error = s3.get_object(Bucket=bucket, Key=prefix + 'error')['Body'].read().decode('utf-8')
+        return {"export_id": export_id, "status": "failed", "error": error}
 
+    return {"export_id": export_id, "status": "pending"}
 
-def handle_post_operations(connection, path, path_parameters, body, current_user_id, valid_portfolio_entity_ids, secret):
+
+def run_export_job(job, context):
+    """
+    Write an export requested by GET /transactions/export to S3.
+
+    Runs in its own invocation, on a connection of its own with a longer read
+    timeout than the shared one. A failure, including running out of time,
+    aborts the multipart upload and is recorded as <prefix>error for
+    GET /transactions/export/{export_id} to report.
+    """
+    export_id = job['export_id']
+    prefix = get_export_prefix(job['scope_user_id'], export_id)
+    secret = runtime_helper.get_secret()
+    bucket = secret.get('EXPORT_BUCKET')
+    s3 = runtime_helper.get_client('s3')
+
+    connection = None
+    try:
+        connection = runtime_helper.open_connection(EXPORT_READ_TIMEOUT)
+        with connection.cursor() as cursor:
+            cursor.execute("SET SESSION net_write_timeout = %s",
+                           (EXPORT_READ_TIMEOUT,))
+        row_count = write_export(connection, s3, bucket, prefix + job['format'],
+                                 job['format'], job['query_parameters'],
+                                 job['scope_user_id'], context)
+    except Exception as e:
+        print(f"ERROR: Export {export_id} failed: {e}")
+        s3.put_object(Bucket=bucket, Key=prefix + 'error', ContentType='text/plain',
+                      Body=str(e).encode('utf-8'))
+        return {"export_id": export_id, "status": "failed"}
+    finally:
+        if connection is not None:
+            connection.close()
+
+    print(
+        f"DEBUG: Exported {row_count} transactions to s3://{bucket}/{prefix}{job['format']}")
+    return {"export_id": export_id, "status": "complete", "row_count": row_count}
+
+
+def write_export(connection, s3, bucket, key, export_format, query_parameters, scope_user_id, context):
+    """
+    Stream the matching transactions to s3://bucket/key. Returns the row count.
+
+    Rows are streamed from an unbuffered server-side cursor and uploaded in
+    EXPORT_PART_SIZE parts, so neither the result set nor the file is ever
+    held in memory whole. Raises TimeoutError once less than
+    EXPORT_TIME_MARGIN seconds of the invocation remain; any failure aborts
+    the multipart upload.
+    """
+    base_query, params = build_transaction_filters(
+        query_parameters, scope_user_id)
+
+    query = f"""
+        SELECT t.transaction_id, pe.entity_name, ce.entity_name, ie.entity_name,
+               ts.transaction_status_name, tt.transaction_type_name,
+               t.trade_date, t.settle_date, t.properties, t.update_date,
+               (SELECT u.email FROM users u WHERE u.user_id = t.updated_user_id)
+        {base_query}
+        ORDER BY t.transaction_id
+    """
+
+    content_type = EXPORT_FORMATS[export_format]
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    if export_format == 'csv':
+        writer.writeheader()
+
+    upload_id = None
+    parts = []
+    row_count = 0
+
+    def upload_part():
+        # Parts other than the last must be at least 5 MB, which EXPORT_PART_SIZE guarantees
+        nonlocal upload_id
+        if upload_id is None:
+            upload_id = s3.create_multipart_upload(
+                Bucket=bucket, Key=key, ContentType=content_type)['UploadId']
+        part_number = len(parts) + 1
+        response = s3.upload_part(
+            Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number,
+            Body=buffer.getvalue().encode('utf-8'))
+        parts.append({"ETag": response['ETag'], "PartNumber": part_number})
+        buffer.seek(0)
+        buffer.truncate()
+
+    cursor = connection.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(query, params)
+        while True:
+            if context.get_remaining_time_in_millis() < EXPORT_TIME_MARGIN * 1000:
+                raise TimeoutError(
+                    f"Export did not finish in time after {row_count} rows; narrow the filters")
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                format_export_row(row, export_format, writer, buffer)
+            row_count += len(rows)
+            if buffer.tell() >= EXPORT_PART_SIZE:
+                upload_part()
+
+        if upload_id is None:
+            # Small enough for one request
+            s3.put_object(Bucket=bucket, Key=key, ContentType=content_type,
+                          Body=buffer.getvalue().encode('utf-8'))
+        else:
+            if buffer.tell():
+                upload_part()
+            s3.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts})
+    except Exception:
+        if upload_id is not None:
+            s3.abort_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id)
+        # Not cursor.close(), which would read the rest of the result set;
+        # the caller closes the connection instead
+        raise
+
+    cursor.close()
+    return row_count
+
+
+def handle_post_operations(connection, path, path_parameters, body, current_user_id, scope_user_id, secret):
     """Handle POST operations."""
     try:
         request_data = json.loads(body) if body else {}
@@ -532,7 +875,7 @@ def handle_post_operations(connection, path, path_parameters, body, current_user
         return {"error": "portfolio_entity_name, transaction_status_name, transaction_type_name, trade_date, and settle_date are required"}
 
     # Get user ID for tracking
-    user_id = get_user_id_from_sub(connection, current_user_id)
+    user_id = scope_user_id
 
     # Get entity IDs
     portfolio_entity_id = get_entity_id_by_name(
@@ -541,7 +884,7 @@ def handle_post_operations(connection, path, path_parameters, body, current_user
         return {"error": f"Portfolio entity '{portfolio_entity_name}' not found"}
 
     # Check if user has access to this portfolio
-    if portfolio_entity_id not in valid_portfolio_entity_ids:
+    if not auth_helper.entity_in_scope(connection, scope_user_id, portfolio_entity_id):
         return {"error": "Access denied - cannot create transactions for this portfolio"}
 
     contra_entity_id = None
@@ -607,7 +950,161 @@ def handle_post_operations(connection, path, path_parameters, body, current_user
         return {"message": "Transaction created successfully", "transaction_id": new_transaction_id}
 
 
-def handle_put_operations(connection, path, path_parameters, body, current_user_id, valid_portfolio_entity_ids, secret):
+def insert_transactions(connection, transactions):
+    """
+    Insert transactions in one database transaction, setting each one's transaction_id.
+
+    Rows are inserted INSERT_CHUNK_SIZE per statement (built here, since
+    executemany() may split a chunk into several statements). Every row is
+    stamped with the same insert_batch_id, and the ids are read back in the
+    same transaction. In interleaved innodb_autoinc_lock_mode (2, the MySQL 8
+    default) concurrent inserts can take ids in between, so they cannot be
+    worked out from lastrowid; but ids still increase in insert order, so
+    ordering the batch's rows by id lines them up with transactions. The
+    first chunk's lastrowid bounds the primary key range that is read.
+    """
+    insert_batch_id = uuid.uuid4().hex
+    with connection.cursor() as cursor:
+        first_id = None
+        for start in range(0, len(transactions), INSERT_CHUNK_SIZE):
+            chunk = transactions[start:start + INSERT_CHUNK_SIZE]
+            cursor.execute("""
+                INSERT INTO transactions (portfolio_entity_id, contra_entity_id, instrument_entity_id, 
+                                        properties, transaction_status_id, transaction_type_id, 
+                                        trade_date, settle_date, updated_user_id, insert_batch_id)
+                VALUES {}
+            """.format(', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))),
+                [value for data in chunk for value in (
+                    data["portfolio_entity_id"], data["contra_entity_id"], data["instrument_entity_id"],
+                    json.dumps(data["properties"]) if data["properties"] else None,
+                    data["transaction_status_id"], data["transaction_type_id"],
+                    data["trade_date"], data["settle_date"], data["updated_user_id"],
+                    insert_batch_id)])
+            if first_id is None:
+                first_id = cursor.lastrowid
+
+        cursor.execute("""
+            SELECT transaction_id FROM transactions
+            WHERE transaction_id >= %s AND insert_batch_id = %s
+            ORDER BY transaction_id
+        """, (first_id, insert_batch_id))
+        for data, row in zip(transactions, cursor.fetchall()):
+            data["transaction_id"] = row[0]
+
+    connection.commit()
+
+
+def handle_batch_post(connection, body, scope_user_id, secret):
+    """
+    Handle creating many transactions: POST /transactions/batch.
+
+    Every item is validated like a single POST, with names resolved by one query
+    per lookup table for the whole batch. Valid items are inserted together in one
+    database transaction and enqueued with send_message_batch; invalid items are
+    reported without blocking the rest. Results are returned per item, in request order.
+    """
+    try:
+        request_data = json.loads(body) if body else {}
+    except json.JSONDecodeError:
+        return {"error": "Invalid JSON in request body"}
+
+    items = request_data.get('transactions')
+    if not isinstance(items, list) or not items:
+        return {"error": "transactions must be a non-empty array"}
+    if len(items) > MAX_BATCH_SIZE:
+        return {"error": f"At most {MAX_BATCH_SIZE} transactions can be submitted per batch"}
+
+    items = [item if isinstance(item, dict) else {} for item in items]
+
+    # Resolve every name in the batch with one query per table
+    entity_ids = get_ids_by_names(
+        connection, 'entities', 'entity_id', 'entity_name',
+        [item.get(field) for item in items
+         for field in ('portfolio_entity_name', 'contra_entity_name', 'instrument_entity_name')])
+    transaction_type_ids = get_ids_by_names(
+        connection, 'transaction_types', 'transaction_type_id', 'transaction_type_name',
+        [item.get('transaction_type_name') for item in items])
+    transaction_status_ids = get_ids_by_names(
+        connection, 'transaction_statuses', 'transaction_status_id', 'transaction_status_name',
+        [item.get('transaction_status_name') for item in items])
+    portfolios_in_scope = auth_helper.entities_in_scope(
+        connection, scope_user_id,
+        [entity_ids.get(item.get('portfolio_entity_name')) for item in items])
+
+    results = [None] * len(items)
+    valid = []  # (index, transaction_data)
+
+    for index, item in enumerate(items):
+        portfolio_entity_name = item.get('portfolio_entity_name')
+        transaction_status_name = item.get('transaction_status_name')
+        transaction_type_name = item.get('transaction_type_name')
+        trade_date = item.get('trade_date')
+        settle_date = item.get('settle_date')
+
+        error = None
+        if not portfolio_entity_name or not transaction_status_name or not transaction_type_name or not trade_date or not settle_date:
+            error = "portfolio_entity_name, transaction_status_name, transaction_type_name, trade_date, and settle_date are required"
+        elif portfolio_entity_name not in entity_ids:
+            error = f"Portfolio entity '{portfolio_entity_name}' not found"
+        elif entity_ids[portfolio_entity_name] not in portfolios_in_scope:
+            error = "Access denied - cannot create transactions for this portfolio"
+        elif item.get('contra_entity_name') and item['contra_entity_name'] not in entity_ids:
+            error = f"Contra entity '{item['contra_entity_name']}' not found"
+        elif item.get('instrument_entity_name') and item['instrument_entity_name'] not in entity_ids:
+            error = f"Instrument entity '{item['instrument_entity_name']}' not found"
+        elif transaction_type_name not in transaction_type_ids:
+            error = f"Transaction type '{transaction_type_name}' not found"
+        elif transaction_status_name not in transaction_status_ids:
+            error = f"Transaction status '{transaction_status_name}' not found"
+        else:
+            # A bad date would otherwise fail the whole batch's INSERT
+            try:
+                datetime.strptime(str(trade_date), '%Y-%m-%d')
+                datetime.strptime(str(settle_date), '%Y-%m-%d')
+            except ValueError:
+                error = "trade_date and settle_date must be YYYY-MM-DD dates"
+
+        if error:
+            results[index] = {"index": index, "error": error}
+            continue
+
+        valid.append((index, {
+            "portfolio_entity_id": entity_ids[portfolio_entity_name],
+            "contra_entity_id": entity_ids.get(item.get('contra_entity_name')),
+            "instrument_entity_id": entity_ids.get(item.get('instrument_entity_name')),
+            "transaction_type_id": transaction_type_ids[transaction_type_name],
+            "transaction_status_id": transaction_status_ids[transaction_status_name],
+            "trade_date": trade_date,
+            "settle_date": settle_date,
+            "properties": item.get('properties', {}),
+            "updated_user_id": scope_user_id
+        }))
+
+    if valid:
+        insert_transactions(connection, [data for _, data in valid])
+
+        timestamp = datetime.now(timezone.utc).isoformat()
+        for _, data in valid:
+            data["timestamp"] = timestamp
+        queued = send_batch_to_sqs(
+            [data for _, data in valid], "create", secret)
+
+        for index, data in valid:
+            results[index] = {
+                "index": index,
+                "transaction_id": data["transaction_id"],
+                "queued": data["transaction_id"] in queued
+            }
+
+    return {
+        "message": f"{len(valid)} of {len(items)} transactions created",
+        "created": len(valid),
+        "failed": len(items) - len(valid),
+        "results": results
+    }
+
+
+def handle_put_operations(connection, path, path_parameters, body, current_user_id, scope_user_id, secret):
     """Handle PUT operations."""
     if 'transaction_id' not in path_parameters:
         return {"error": "transaction_id is required in path"}
@@ -620,7 +1117,7 @@ def handle_put_operations(connection, path, path_parameters, body, current_user_
     transaction_id = path_parameters['transaction_id']
 
     # Get user ID for tracking
-    user_id = get_user_id_from_sub(connection, current_user_id)
+    user_id = scope_user_id
 
     with connection.cursor() as cursor:
         # Fetch the existing transaction data for comparison
@@ -630,8 +1127,8 @@ def handle_put_operations(connection, path, path_parameters, body, current_user_
                    trade_date, settle_date, properties, updated_user_id
             FROM transactions 
             WHERE transaction_id = %s AND portfolio_entity_id IN ({}) AND deleted = false
-        """.format(','.join(['%s'] * len(valid_portfolio_entity_ids))),
-            [transaction_id] + valid_portfolio_entity_ids)
+        """.format(auth_helper.ENTITY_SCOPE_SQL),
+            (transaction_id, scope_user_id))
         existing = cursor.fetchone()
 
         if not existing:
@@ -662,7 +1159,7 @@ def handle_put_operations(connection, path, path_parameters, body, current_user_
                 connection, portfolio_entity_name)
             if not portfolio_entity_id:
                 return {"error": f"Portfolio entity '{portfolio_entity_name}' not found"}
-            if portfolio_entity_id not in valid_portfolio_entity_ids:
+            if not auth_helper.entity_in_scope(connection, scope_user_id, portfolio_entity_id):
                 return {"error": "Access denied - cannot move transaction to this portfolio"}
             update_fields.append("portfolio_entity_id = %s")
             update_params.append(portfolio_entity_id)
@@ -800,7 +1297,7 @@ def handle_put_operations(connection, path, path_parameters, body, current_user_
         return {"message": "Transaction updated successfully"}
 
 
-def handle_delete_operations(connection, path, path_parameters, current_user_id, valid_portfolio_entity_ids, secret):
+def handle_delete_operations(connection, path, path_parameters, current_user_id, scope_user_id, secret):
     """Handle DELETE operations."""
     if 'transaction_id' not in path_parameters:
         return {"error": "transaction_id is required in path"}
@@ -812,8 +1309,8 @@ def handle_delete_operations(connection, path, path_parameters, current_user_id,
         cursor.execute("""
             SELECT portfolio_entity_id FROM transactions 
             WHERE transaction_id = %s AND portfolio_entity_id IN ({}) AND deleted = false
-        """.format(','.join(['%s'] * len(valid_portfolio_entity_ids))),
-            [transaction_id] + valid_portfolio_entity_ids)
+        """.format(auth_helper.ENTITY_SCOPE_SQL),
+            (transaction_id, scope_user_id))
         existing = cursor.fetchone()
 
         if not existing:
@@ -830,7 +1327,7 @@ def handle_delete_operations(connection, path, path_parameters, current_user_id,
         transaction_to_delete = cursor.fetchone()
 
         # Get current user ID for tracking
-        current_user_id_db = get_user_id_from_sub(connection, current_user_id)
+        current_user_id_db = scope_user_id
 
         # Soft delete transaction (set deleted = true)
         cursor.execute(
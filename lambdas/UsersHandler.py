@@ -1,6 +1,4 @@
 import json
-import boto3
-import pymysql
 import os
 import uuid
 from datetime import datetime, timezone
@@ -8,6 +6,7 @@ from botocore.exceptions import ClientError
 from urllib.parse import unquote
 from typing import Dict, Any
 import cors_helper
+import runtime_helper
 # Data consistency functions (inline to avoid import issues)
 
 
@@ -46,34 +45,6 @@ def ensure_primary_client_group_consistency(connection, user_id, primary_client_
         return False
 
 
-def get_db_connection():
-    """Get database connection using secrets manager."""
-    try:
-        # Get secret from AWS Secrets Manager
-        secrets_client = boto3.client(
-            'secretsmanager', region_name='us-east-2')
-        secret_arn = os.environ.get('SECRET_ARN')
-
-        if not secret_arn:
-            raise Exception("SECRET_ARN environment variable not set")
-
-        response = secrets_client.get_secret_value(SecretId=secret_arn)
-        secret = json.loads(response['SecretString'])
-
-        connection = pymysql.connect(
-            host=secret['DB_HOST'],
-            user=secret['DB_USER'],
-            password=secret['DB_PASS'],
-            database=secret['DATABASE'],
-            connect_timeout=10,
-            read_timeout=10,
-            write_timeout=10
-        )
-        return connection, secret
-    except Exception as e:
-        raise Exception(f"Failed to connect to database: {str(e)}")
-
-
 def send_cache_refresh_to_sqs(secret: Dict[str, Any], table: str, primary_key: int) -> bool:
     """Send cache refresh message to SQS FIFO queue."""
     try:
@@ -83,7 +54,7 @@ def send_cache_refresh_to_sqs(secret: Dict[str, Any], table: str, primary_key: i
         if not queue_url:
             raise Exception("QUEUE_URL not found in secrets")
 
-        sqs = boto3.client('sqs', region_name='us-east-2')
+        sqs = runtime_helper.get_client('sqs')
 
         # Prepare message body
         message_body = {
@@ -135,50 +106,27 @@ def get_user_id_from_sub(connection, current_user_id):
         return None
 
 
-def get_user_client_groups(connection, user_id):
-    """
-    Get all client group IDs that the user is affiliated with.
-    Returns a list of client_group_ids.
-    """
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT DISTINCT client_group_id 
-                FROM client_group_users 
-                WHERE user_id = %s
-            """, (user_id,))
-            results = cursor.fetchall()
-            return [row[0] for row in results]
-    except Exception as e:
-        print(f"Error getting user client groups: {e}")
-        return []
-
-
-def get_valid_user_ids_for_current_user(connection, current_user_id):
+def get_valid_user_ids_for_current_user(connection, current_user_id_db):
     """
     Get all user IDs that the current user is authorized to view/modify.
     This includes all users in the same client groups as the current user.
     Returns a list of user_ids.
-    """
-    try:
-        # Get current user's client groups
-        current_user_id_db = get_user_id_from_sub(connection, current_user_id)
-        if not current_user_id_db:
-            return []
 
-        user_client_groups = get_user_client_groups(
-            connection, current_user_id_db)
-        if not user_client_groups:
-            return []
+    One self-join on client_group_users, served by its (client_group_id, user_id)
+    and user_id indexes. Users reach each other through client groups rather than
+    entities, so user_entity_access does not apply here.
+    """
+    if not current_user_id_db:
+        return []
 
-        # Get all user IDs that are in any of the current user's client groups
+    try:
         with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT DISTINCT user_id 
-                FROM client_group_users 
-                WHERE client_group_id IN ({})
-            """.format(','.join(['%s'] * len(user_client_groups))),
-                user_client_groups)
+                SELECT DISTINCT peer.user_id
+                FROM client_group_users mine
+                JOIN client_group_users peer ON peer.client_group_id = mine.client_group_id
+                WHERE mine.user_id = %s
+            """, (current_user_id_db,))
             results = cursor.fetchall()
             return [row[0] for row in results]
     except Exception as e:
@@ -233,17 +181,17 @@ def lambda_handler(event, context):
     query_parameters = event.get('queryStringParameters') or {}
     body = event.get('body', '{}')
 
-    connection = None
     try:
-        # Get database connection and secrets
-        connection, secret = get_db_connection()
+        # Secret and connection are reused across warm invocations
+        secret = runtime_helper.get_secret()
+        connection = runtime_helper.get_db_connection()
 
         # Get current user's database ID
         current_user_id_db = get_user_id_from_sub(connection, current_user_id)
 
         # Get valid user IDs for authorization
         valid_user_ids = get_valid_user_ids_for_current_user(
-            connection, current_user_id)
+            connection, current_user_id_db)
         if not valid_user_ids:
             return {
                 "statusCode": 403,
@@ -692,7 +640,7 @@ def lambda_handler(event, context):
                 "headers": cors_helper.get_cors_headers()
             }
 
-        connection.close()
+        runtime_helper.release_connection()
 
         # Return appropriate status code based on operation
         status_code = 200
@@ -708,12 +656,8 @@ def lambda_handler(event, context):
         }
 
     except Exception as e:
-        # Try to close connection if it exists
-        try:
-            if connection:
-                connection.close()
-        except:
-            pass
+        # Roll back whatever the failed request left open
+        runtime_helper.release_connection()
 
         return {
             "statusCode": 500,
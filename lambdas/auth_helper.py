@@ -0,0 +1,107 @@
+"""
+Authorization helper module for Lambda functions.
+Resolves which entities the current user can reach through their client
+groups, and caches that scope per Cognito sub in the warm container.
+Reachability is read from user_entity_access, which the access triggers on
+client_group_users and client_group_entities keep current.
+"""
+
+import os
+import time
+
+# Seconds a cached scope is trusted before it is resolved again
+SCOPE_TTL = int(os.environ.get('SCOPE_TTL', '60'))
+# Cached scopes kept per container before the cache is emptied
+SCOPE_CACHE_SIZE = 1000
+
+# Entity ids the user reaches through their client groups, for use as a
+# semi-join: `<entity column> IN (ENTITY_SCOPE_SQL)` with the user_id as parameter
+ENTITY_SCOPE_SQL = """
+    SELECT uea.entity_id FROM user_entity_access uea WHERE uea.user_id = %s
+"""
+
+# Changes whenever a client group membership changes (the audit triggers log every
+# write to both tables). One MAX per table, since MAX over table_name IN (...)
+# range-scans every audit row of both tables instead of reading one index entry
+SCOPE_VERSION_SQL = """
+    SELECT GREATEST(
+        COALESCE((SELECT MAX(audit_id) FROM audit_log WHERE table_name = 'client_group_users'), 0),
+        COALESCE((SELECT MAX(audit_id) FROM audit_log WHERE table_name = 'client_group_entities'), 0))
+"""
+
+_scopes = {}  # sub -> (scope, version, resolved_at)
+
+
+def get_user_scope(connection, sub):
+    """
+    Get the current user's authorization scope.
+
+    A cached scope is reused while it is younger than SCOPE_TTL and no
+    membership has changed since it was resolved; otherwise the user and
+    their reach are resolved in a single query.
+
+    Returns:
+        dict: {"user_id": int, "has_entities": bool}, or None if the sub
+              is unknown (or 'system')
+    """
+    if sub == 'system':
+        return None
+
+    try:
+        with connection.cursor() as cursor:
+            cached = _scopes.get(sub)
+            if cached and time.time() - cached[2] < SCOPE_TTL:
+                cursor.execute(SCOPE_VERSION_SQL)
+                if cursor.fetchone()[0] == cached[1]:
+                    return cached[0]
+
+            cursor.execute(f"""
+                SELECT u.user_id,
+                       EXISTS (SELECT 1 FROM user_entity_access uea WHERE uea.user_id = u.user_id),
+                       ({SCOPE_VERSION_SQL})
+                FROM users u
+                WHERE u.sub = %s
+            """, (sub,))
+            result = cursor.fetchone()
+    except Exception as e:
+        print(f"Error resolving authorization scope: {e}")
+        return None
+
+    if not result:
+        _scopes.pop(sub, None)
+        return None
+
+    if len(_scopes) >= SCOPE_CACHE_SIZE:
+        _scopes.clear()
+    scope = {"user_id": result[0], "has_entities": bool(result[1])}
+    _scopes[sub] = (scope, result[2], time.time())
+    return scope
+
+
+def entity_in_scope(connection, user_id, entity_id):
+    """Check whether user_id reaches entity_id through a client group."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT 1 FROM user_entity_access
+            WHERE user_id = %s AND entity_id = %s
+            LIMIT 1
+        """, (user_id, entity_id))
+        return cursor.fetchone() is not None
+
+
+def entities_in_scope(connection, user_id, entity_ids):
+    """
+    Check many entities at once.
+
+    Returns:
+        set: the entity_ids that user_id reaches through a client group
+    """
+    entity_ids = list({entity_id for entity_id in entity_ids if entity_id})
+    if not entity_ids:
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT entity_id FROM user_entity_access
+            WHERE user_id = %s AND entity_id IN ({})
+        """.format(','.join(['%s'] * len(entity_ids))), [user_id] + entity_ids)
+        return {row[0] for row in cursor.fetchall()}
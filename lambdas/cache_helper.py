@@ -0,0 +1,106 @@
+"""
+Conditional GET helper module for Lambda functions.
+Derives ETag and Last-Modified validators from the newest audit_log row of the
+tables a response is built from, and answers 304 Not Modified when the client
+already holds the current version.
+"""
+
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import timezone
+
+import cors_helper
+
+# Newest audit row across the given tables. The audit triggers log every write,
+# so its id changes whenever any of them does. Each table's MAX is a single read
+# of idx_audit_log_table; MAX over table_name IN (...) would range-scan every
+# audit row of the tables instead.
+TABLE_VERSION_SQL = """
+    SELECT audit_id, update_date FROM audit_log WHERE audit_id = {}
+"""
+TABLE_MAX_AUDIT_SQL = "COALESCE((SELECT MAX(audit_id) FROM audit_log WHERE table_name = %s), 0)"
+
+
+def _get_header(event, name):
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def get_validators(connection, tables, event):
+    """
+    Get the ETag and Last-Modified for a GET response built from tables.
+
+    The ETag also covers the path, query string and X-Current-User-Id, since
+    those decide which rows the response holds.
+
+    Returns:
+        dict: {"ETag": str, "Last-Modified": str or None}
+    """
+    # GREATEST needs at least two arguments
+    table_max = [TABLE_MAX_AUDIT_SQL] * len(tables)
+    version = table_max[0] if len(tables) == 1 else f"GREATEST({', '.join(table_max)})"
+    with connection.cursor() as cursor:
+        cursor.execute(TABLE_VERSION_SQL.format(version), tables)
+        result = cursor.fetchone()
+    audit_id, update_date = result if result else (0, None)
+
+    query_parameters = event.get('queryStringParameters') or {}
+    key = '|'.join([
+        str(audit_id),
+        event.get('path', ''),
+        '&'.join(f"{name}={query_parameters[name]}" for name in sorted(query_parameters)),
+        _get_header(event, 'x-current-user-id') or 'system'
+    ])
+
+    return {
+        "ETag": f'W/"{hashlib.sha256(key.encode()).hexdigest()[:32]}"',
+        "Last-Modified": format_datetime(
+            update_date.replace(tzinfo=timezone.utc), usegmt=True) if update_date else None
+    }
+
+
+def is_not_modified(event, validators):
+    """
+    Check the request's If-None-Match (or, without it, If-Modified-Since)
+    against the current validators.
+    """
+    if_none_match = _get_header(event, 'if-none-match')
+    if if_none_match:
+        return if_none_match.strip() == '*' or validators["ETag"] in [
+            tag.strip() for tag in if_none_match.split(',')]
+
+    if_modified_since = _get_header(event, 'if-modified-since')
+    if if_modified_since and validators["Last-Modified"]:
+        try:
+            return parsedate_to_datetime(validators["Last-Modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def get_cache_headers(validators):
+    """
+    Get the headers of a 200 or 304 GET response: the CORS headers plus the validators.
+
+    Cache-Control tells browsers to keep the response but revalidate it on
+    every use, so repeat fetches become conditional requests. Other responses
+    use cors_helper.get_cors_headers().
+    """
+    headers = cors_helper.get_cors_headers()
+    headers['ETag'] = validators["ETag"]
+    if validators["Last-Modified"]:
+        headers['Last-Modified'] = validators["Last-Modified"]
+    headers['Cache-Control'] = 'private, no-cache'
+    headers['Access-Control-Expose-Headers'] = 'ETag,Last-Modified'
+    return headers
+
+
+def not_modified_response(validators):
+    """Build the 304 Not Modified response for validators."""
+    return {
+        "statusCode": 304,
+        "body": "",
+        "headers": get_cache_headers(validators)
+    }
@@ -0,0 +1,148 @@
+"""
+Pagination helper module for Lambda functions.
+Keyset pagination for list endpoints: a page is requested with `limit` and
+an opaque `after` cursor that encodes the sort key of the last row returned.
+"""
+
+import json
+import base64
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(key):
+    """
+    Encode a row's sort key as an opaque, URL-safe cursor.
+
+    Returns:
+        str: cursor for the `after` query parameter
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, key_types):
+    """
+    Decode a cursor created by encode_cursor.
+
+    Args:
+        cursor: the `after` query parameter
+        key_types: expected type of each sort key value, e.g. (str, int)
+
+    Returns:
+        list: the sort key values
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)))
+        if len(key) != len(key_types) or not all(
+                isinstance(value, key_type) for value, key_type in zip(key, key_types)):
+            raise ValueError()
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    return key
+
+
+def get_page_request(query_parameters, key_types):
+    """
+    Read the `limit` and `after` query parameters.
+
+    Args:
+        query_parameters: the request's query string parameters
+        key_types: expected type of each sort key value in the cursor
+
+    Returns:
+        tuple: (limit, after_key); (None, None) if the request is not paged.
+               `after` alone pages with DEFAULT_PAGE_SIZE, and limit is
+               capped at MAX_PAGE_SIZE.
+
+    Raises:
+        ValueError: if limit is not a positive integer or the cursor is malformed
+    """
+    limit_param = query_parameters.get('limit')
+    after_param = query_parameters.get('after')
+    if not limit_param and not after_param:
+        return None, None
+
+    try:
+        limit = int(limit_param) if limit_param else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise ValueError("limit must be a positive integer")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+
+    after_key = decode_cursor(
+        after_param, key_types) if after_param else None
+    return min(limit, MAX_PAGE_SIZE), after_key
+
+
+def get_count_mode(query_parameters):
+    """
+    Read the `include_count` query parameter.
+
+    Returns:
+        str: 'exact' for true, 'estimate' for estimate, or None if no count is wanted
+    """
+    include_count = query_parameters.get('include_count', 'false').lower()
+    if include_count == 'true':
+        return 'exact'
+    if include_count == 'estimate':
+        return 'estimate'
+    return None
+
+
+def estimate_count(cursor, query, params):
+    """
+    Estimate how many rows a query returns from the optimizer's statistics.
+
+    EXPLAIN reads only cached index statistics, so this costs the same however
+    many rows match; the figure is approximate. The estimate is the plan's
+    rows_produced_per_join for the last table of the join, which already
+    multiplies the rows of every table before it: with the scope semi-join the
+    optimizer may drive from user_entity_access, and the listed table's own
+    rows are then only the fan-out per scoped entity.
+
+    Args:
+        cursor: database cursor
+        query: the query's FROM/WHERE clause
+        params: the query's parameters
+
+    Returns:
+        int: estimated row count
+    """
+    cursor.execute(f"EXPLAIN FORMAT=JSON SELECT 1 {query}", params)
+    plan = json.loads(cursor.fetchone()[0])
+    return int(_rows_produced(plan.get('query_block', {})))
+
+
+def _rows_produced(block):
+    """Estimated output rows of a query block from EXPLAIN FORMAT=JSON."""
+    if 'nested_loop' in block:
+        return _rows_produced(block['nested_loop'][-1])
+    if 'table' in block:
+        return block['table'].get('rows_produced_per_join') or 0
+    for operation in ('ordering_operation', 'grouping_operation', 'duplicates_removal'):
+        if operation in block:
+            return _rows_produced(block[operation])
+    return 0
+
+
+def build_page(rows, limit, sort_key):
+    """
+    Trim rows fetched with LIMIT limit + 1 to a page.
+
+    Args:
+        rows: query results, fetched one row beyond the page
+        limit: page size
+        sort_key: function returning a row's sort key values
+
+    Returns:
+        tuple: (page_rows, next_cursor); next_cursor is None on the last page
+    """
+    page_rows = list(rows[:limit])
+    if len(rows) <= limit:
+        return page_rows, None
+    return page_rows, encode_cursor(sort_key(page_rows[-1]))
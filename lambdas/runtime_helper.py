@@ -0,0 +1,135 @@
+"""
+Runtime helper module for Lambda functions.
+Keeps AWS clients, the database secret and the MySQL connection alive across
+warm invocations of a container instead of recreating them on every call.
+"""
+
+import os
+import json
+import time
+
+import boto3
+import pymysql
+
+REGION = 'us-east-2'
+# Seconds a fetched secret is reused before Secrets Manager is asked again
+SECRET_TTL = int(os.environ.get('SECRET_TTL', '300'))
+
+_clients = {}
+_secret = None
+_secret_fetched_at = 0
+_connection = None
+
+
+def get_client(service_name):
+    """
+    Get a boto3 client for service_name, created once per container.
+
+    Returns:
+        botocore client for the service in REGION
+    """
+    if service_name not in _clients:
+        _clients[service_name] = boto3.client(
+            service_name, region_name=REGION)
+    return _clients[service_name]
+
+
+def get_secret(refresh=False):
+    """
+    Get the secret named by SECRET_ARN, cached for SECRET_TTL seconds.
+
+    Returns:
+        dict: the secret's key/value pairs (DB_HOST, DB_USER, QUEUE_URL, ...)
+    """
+    global _secret, _secret_fetched_at
+
+    if refresh or _secret is None or time.time() - _secret_fetched_at >= SECRET_TTL:
+        try:
+            secret_arn = os.environ.get('SECRET_ARN')
+            if not secret_arn:
+                raise Exception("SECRET_ARN environment variable not set")
+
+            response = get_client('secretsmanager').get_secret_value(
+                SecretId=secret_arn)
+            _secret = json.loads(response['SecretString'])
+            _secret_fetched_at = time.time()
+        except Exception as e:
+            raise Exception(f"Failed to retrieve secret: {str(e)}")
+    return _secret
+
+
+def _connect(secret, read_timeout=10):
+    return pymysql.connect(
+        host=secret['DB_HOST'],
+        user=secret['DB_USER'],
+        password=secret['DB_PASS'],
+        database=secret['DATABASE'],
+        connect_timeout=10,
+        read_timeout=read_timeout,
+        write_timeout=10
+    )
+
+
+def open_connection(read_timeout):
+    """
+    Open a MySQL connection of its own, for a long-running job whose reads
+    can take longer than the shared connection's read timeout allows.
+    The caller closes it.
+
+    Returns:
+        pymysql connection
+    """
+    return _connect(get_secret(), read_timeout=read_timeout)
+
+
+def get_db_connection():
+    """
+    Get the container's MySQL connection, reconnecting if it has gone away.
+
+    The connection is checked with a ping and any transaction left open by a
+    previous invocation is rolled back, so every invocation starts with a
+    fresh read view. A failed connect re-reads the secret once, in case the
+    credentials were rotated.
+
+    Returns:
+        pymysql connection
+    """
+    global _connection
+
+    if _connection is not None:
+        try:
+            _connection.ping(reconnect=False)
+            _connection.rollback()
+            return _connection
+        except Exception:
+            discard_connection()
+
+    try:
+        try:
+            _connection = _connect(get_secret())
+        except pymysql.err.OperationalError:
+            _connection = _connect(get_secret(refresh=True))
+    except Exception as e:
+        raise Exception(f"Failed to connect to database: {str(e)}")
+    return _connection
+
+
+def release_connection():
+    """End the invocation's transaction, keeping the connection for the next invocation."""
+    if _connection is not None:
+        try:
+            _connection.rollback()
+        except Exception:
+            discard_connection()
+
+
+def discard_connection():
+    """Close and forget the connection, e.g. after an error left it in an unknown state."""
+    global _connection
+
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+    _connection = None
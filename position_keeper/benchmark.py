@@ -0,0 +1,403 @@
+# /home/ec2-user/fullbor-pk/benchmark.py
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import positionkeeper as pk
+from datacache import DataCache
+from deadletter import DeadLetterSpool
+from localsqs import LocalSQS
+from metrics import DEFAULT_BUCKETS, percentile
+from sqspoller import PrefetchingPoller
+
+logger = logging.getLogger("Benchmark")
+logger.setLevel(logging.INFO)
+
+QUEUE_URL = "local://fullbor-pk-benchmark.fifo"
+DEFAULT_MIX = "create=0.5,update=0.3,delete=0.05,refresh_cache=0.15"
+
+# Cache refreshes in the shapes the handlers send them (table, sends a primary key, key column)
+REFRESH_SHAPES = [
+    ("entities", True, None),                # EntitiesHandler
+    ("entities", True, None),
+    ("entities", True, None),
+    ("users", True, "user_id"),              # UsersHandler
+    ("entity_types", False, None),           # EntityTypesHandler
+    ("transaction_types", False, None),      # TransactionTypesHandler
+]
+
+
+# ==============================
+# SQLite-backed DataCache
+# ==============================
+class SQLiteConnection:
+    """pymysql-style wrapper over sqlite3, so the keeper's SQL runs unchanged."""
+
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.open = True
+
+    def cursor(self):
+        return SQLiteCursor(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+        self.open = False
+
+
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=None):
+        self.cursor.execute(to_sqlite(sql), params or ())
+        return self.cursor.rowcount
+
+    def executemany(self, sql, rows):
+        self.cursor.executemany(to_sqlite(sql), rows)
+        return self.cursor.rowcount
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+def to_sqlite(sql):
+    return sql.replace("%s", "?").replace("NOW()", "CURRENT_TIMESTAMP")
+
+
+class SQLiteDataCache(DataCache):
+    """DataCache over a SQLiteConnection instead of MySQL."""
+
+    def __init__(self, conn, tables=None):
+        self.sqlite_conn = conn
+        super().__init__(host=None, user=None, password=None, db=None, tables=tables)
+
+    def _connect(self):
+        self.conn = self.sqlite_conn
+
+
+def create_sqlite_schema(conn, entities=500, users=50, transaction_types=20, transactions=0):
+    """Create the tables the keeper reads and writes, filled with synthetic reference data."""
+    rng = random.Random(0)
+    with conn.conn:
+        conn.conn.executescript("""
+            CREATE TABLE entity_types (entity_type_id INTEGER PRIMARY KEY, entity_type_name TEXT,
+                                       entity_category TEXT, updated_user_id INTEGER);
+            CREATE TABLE entities (entity_id INTEGER PRIMARY KEY, entity_name TEXT, entity_type_id INTEGER,
+                                   attributes TEXT, updated_user_id INTEGER, deleted INTEGER DEFAULT 0);
+            CREATE TABLE transaction_types (transaction_type_id INTEGER PRIMARY KEY,
+                                            transaction_type_name TEXT, properties TEXT, updated_user_id INTEGER);
+            CREATE TABLE transaction_statuses (transaction_status_id INTEGER PRIMARY KEY,
+                                               transaction_status_name TEXT, updated_user_id INTEGER);
+            CREATE TABLE users (user_id INTEGER PRIMARY KEY, sub TEXT, email TEXT,
+                                updated_user_id INTEGER, deleted INTEGER DEFAULT 0);
+            CREATE TABLE transactions (transaction_id INTEGER PRIMARY KEY, portfolio_entity_id INTEGER,
+                                       contra_entity_id INTEGER, instrument_entity_id INTEGER, properties TEXT,
+                                       transaction_status_id INTEGER, transaction_type_id INTEGER,
+                                       update_date TEXT, updated_user_id INTEGER, trade_date TEXT,
+                                       settle_date TEXT, deleted INTEGER DEFAULT 0);
+        """)
+        conn.conn.executemany("INSERT INTO entity_types VALUES (?, ?, ?, 1)", [
+            (1, "Portfolio", "Portfolio"), (2, "Equity", "Instrument"), (3, "Broker", "Contra")])
+        conn.conn.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, 1, 0)", [
+            (i, f"Entity {i}", 1 + i % 3, json.dumps({"n": i})) for i in range(1, entities + 1)])
+        conn.conn.executemany("INSERT INTO transaction_types VALUES (?, ?, ?, 1)", [
+            (i, f"Type {i}", json.dumps({"position_keeping_actions": rng.choice(["Buy", "Sell", "Transfer"])}))
+            for i in range(1, transaction_types + 1)])
+        conn.conn.executemany("INSERT INTO transaction_statuses VALUES (?, ?, 1)", [
+            (1, "INCOMPLETE"), (2, "NEW"), (3, "PROCESSED"), (4, "UNKNOWN")])
+        conn.conn.executemany("INSERT INTO users VALUES (?, ?, ?, 1, 0)", [
+            (i, f"sub-{i}", f"user{i}@example.com") for i in range(1, users + 1)])
+        conn.conn.executemany(
+            "INSERT INTO transactions (transaction_id, transaction_status_id) VALUES (?, 2)",
+            [(i,) for i in range(1, transactions + 1)])
+
+
+# ==============================
+# Synthetic load
+# ==============================
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        operation, _, weight = item.partition("=")
+        mix[operation.strip()] = float(weight)
+    return mix
+
+
+def generate_messages(count, cache, mix, first_transaction_id, seed=None):
+    """
+    Yield (body, group_id, deduplication_id) for count synthetic messages.
+
+    Transactions follow TransactionsHandler.send_to_sqs and cache refreshes
+    follow the handlers' send_cache_refresh_to_sqs: same fields, the same
+    message groups, and updates and deletes only for transactions created
+    earlier in the run.
+    """
+    rng = random.Random(seed)
+    entity_ids = cache.get("entities")["entity_id"].tolist()
+    type_ids = cache.get("transaction_types")["transaction_type_id"].tolist()
+    user_ids = cache.get("users")["user_id"].tolist()
+    operations, weights = zip(*mix.items())
+
+    next_transaction_id = first_transaction_id
+    live = {}  # transaction_id -> last message body
+    for _ in range(count):
+        operation = rng.choices(operations, weights)[0]
+        if operation in ("update", "delete") and not live:
+            operation = "create"
+
+        if operation == "refresh_cache":
+            table, keyed, key_column = rng.choice(REFRESH_SHAPES)
+            body = {"operation": "refresh_cache", "table": table}
+            if keyed:
+                ids = user_ids if table == "users" else entity_ids
+                body["primary_key"] = rng.choice(ids)
+            if key_column:
+                body["primary_key_column"] = key_column
+            yield body, f"cache-refresh-{table}", f"refresh-{table}-{rng.getrandbits(64)}"
+            continue
+
+        if operation == "create":
+            transaction_id = next_transaction_id
+            next_transaction_id += 1
+            trade_date = date(2025, 1, 2) + timedelta(days=rng.randrange(250))
+            body = {
+                "operation": "create",
+                "transaction_id": transaction_id,
+                "portfolio_entity_id": rng.choice(entity_ids),
+                "contra_entity_id": rng.choice(entity_ids),
+                "instrument_entity_id": rng.choice(entity_ids),
+                "transaction_type_id": rng.choice(type_ids),
+                # Most are saved as NEW, some as INCOMPLETE drafts
+                "transaction_status_id": 2 if rng.random() < 0.9 else 1,
+                "trade_date": trade_date.isoformat(),
+                "settle_date": (trade_date + timedelta(days=2)).isoformat(),
+                "properties": {"quantity": rng.randrange(1, 10000), "price": round(rng.uniform(1, 500), 2)},
+                "updated_user_id": rng.choice(user_ids),
+            }
+            live[transaction_id] = body
+        else:
+            transaction_id = rng.choice(list(live))
+            body = dict(live[transaction_id], operation=operation)
+            if operation == "update":
+                new_quantity = rng.randrange(1, 10000)
+                body["changes"] = {"properties": {"old": body["properties"],
+                                                  "new": dict(body["properties"], quantity=new_quantity)}}
+                body["properties"] = dict(
+                    body["properties"], quantity=new_quantity)
+                body["transaction_status_id"] = 2
+                live[transaction_id] = {k: v for k, v in body.items()
+                                        if k != "changes"}
+            else:
+                del live[transaction_id]
+
+        body["timestamp"] = datetime.now(timezone.utc).isoformat()
+        yield body, f"transaction-{transaction_id}", f"{operation}-{transaction_id}-{rng.getrandbits(32)}"
+
+
+def send_messages(sqs, messages, rate=0):
+    """Send generated messages in batches of 10, at about rate messages/second (0 = all at once)."""
+    batch = []
+    start = time.perf_counter()
+    sent = 0
+    for body, group_id, deduplication_id in messages:
+        if rate and "timestamp" in body:
+            # Stamp the production time when the message is actually sent
+            body = dict(body, timestamp=datetime.now(
+                timezone.utc).isoformat())
+        batch.append({
+            "Id": str(len(batch)),
+            "MessageBody": json.dumps(body),
+            "MessageGroupId": group_id,
+            "MessageDeduplicationId": deduplication_id,
+        })
+        sent += 1
+        if len(batch) == 10 or rate:
+            sqs.send_message_batch(QueueUrl=QUEUE_URL, Entries=batch)
+            batch = []
+        if rate:
+            delay = start + sent / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    if batch:
+        sqs.send_message_batch(QueueUrl=QUEUE_URL, Entries=batch)
+
+
+# ==============================
+# Runner
+# ==============================
+def run(sqs, messages, rate=0, prefetch_batches=1, timeout=600):
+    """Feed messages through the keeper's poll/process/acknowledge path. Returns elapsed seconds."""
+    producer = threading.Thread(
+        target=send_messages, args=(sqs, messages, rate), daemon=True)
+    if not rate:
+        # Preload the queue so the run measures processing throughput only
+        producer.run()
+
+    poller = PrefetchingPoller(sqs, QUEUE_URL, prefetch_batches=prefetch_batches,
+                               wait_time=1, metrics=pk.metrics)
+    start = time.perf_counter()
+    if rate:
+        producer.start()
+    poller.start()
+    while producer.is_alive() or sqs.pending(QUEUE_URL):
+        if time.perf_counter() - start > timeout:
+            logger.warning(
+                f"Timed out with {sqs.pending(QUEUE_URL)} messages pending")
+            break
+        messages = poller.get_batch(timeout=1)
+        if messages:
+            pk.handle_batch(poller, messages)
+    elapsed = time.perf_counter() - start
+    poller.stop()
+    return elapsed
+
+
+def exact_percentile(values, q):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(sqs, elapsed):
+    latencies = [(sqs.deleted_times[i] - sqs.sent_times[i]) * 1000
+                 for i in sqs.deleted_times]
+    summary = {
+        "messages": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "latency_ms": {f"p{int(q * 100)}": round(exact_percentile(latencies, q), 1)
+                       for q in (0.5, 0.9, 0.99)},
+        "operations": {},
+        "stages": {},
+    }
+    summary["latency_ms"]["max"] = round(max(latencies, default=0), 1)
+
+    # Per-operation and per-stage breakdown from the keeper's own histograms
+    with pk.metrics.lock:
+        histograms = {key: h.snapshot()
+                      for key, h in pk.metrics.histograms.items()}
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        labels = dict(labels)
+        if name == "operation_duration_ms":
+            section, label = summary["operations"], labels["operation"]
+        elif name == "stage_duration_ms":
+            section, label = summary["stages"], labels["stage"]
+        else:
+            continue
+        section[label] = {
+            "count": count,
+            "avg_ms": round(total / count, 3) if count else 0,
+            "p50_ms": percentile(DEFAULT_BUCKETS, counts, count, 0.50),
+            "p99_ms": percentile(DEFAULT_BUCKETS, counts, count, 0.99),
+        }
+    return summary
+
+
+def print_summary(summary):
+    print(f"Processed {summary['messages']} messages in {summary['elapsed_s']}s "
+          f"({summary['messages_per_second']} msgs/sec)")
+    latency = summary["latency_ms"]
+    print(f"End-to-end latency (send to delete): p50 {latency['p50']}ms  p90 {latency['p90']}ms  "
+          f"p99 {latency['p99']}ms  max {latency['max']}ms")
+    for title, section in (("Operation", summary["operations"]), ("Stage", summary["stages"])):
+        print(f"\n{title:<16}{'count':>8}{'avg ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for label, row in section.items():
+            print(f"{label:<16}{row['count']:>8}{row['avg_ms']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the position keeper against an in-process SQS queue")
+    parser.add_argument("--messages", type=int, default=5000,
+                        help="Number of messages to generate (default 5000)")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"Operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Send at this many messages/second while processing; 0 preloads the queue (default)")
+    parser.add_argument("--prefetch", type=int, default=pk.PREFETCH_BATCHES,
+                        help="Receive batches buffered ahead of processing")
+    parser.add_argument("--mysql", action="store_true",
+                        help="Use the MySQL database in DB_HOST/DB_USER/DB_PASS/DATABASE instead of SQLite. "
+                             "Transaction status updates are made, so point it at a local or scratch database")
+    parser.add_argument("--sqlite", default=":memory:",
+                        help="SQLite database file for the default backend (default in-memory)")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="Random seed for the generated load")
+    parser.add_argument("--keeper-log", default=os.devnull,
+                        help="Where the keeper's own log lines go (default discarded; they are still formatted)")
+    parser.add_argument("--dead-letter-spool", default=os.devnull,
+                        help="Where dead-lettered messages are spooled (default discarded)")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    # Keep the report readable: keeper logs are still produced, just not on the terminal
+    keeper_log = open(args.keeper_log, "w")
+    for handler in logging.root.handlers:
+        handler.setStream(keeper_log)
+    logging.getLogger("MetricsEMF").disabled = True
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(console)
+    logger.propagate = False
+
+    if args.mysql:
+        pk.cache = DataCache(
+            host=os.environ.get("DB_HOST"),
+            user=os.environ.get("DB_USER"),
+            password=os.environ.get("DB_PASS"),
+            db=os.environ.get("DATABASE"),
+            tables=pk.CACHE_TABLES
+        )
+    else:
+        conn = SQLiteConnection(args.sqlite)
+        create_sqlite_schema(conn)
+        pk.cache = SQLiteDataCache(conn, tables=pk.CACHE_TABLES)
+    pk.ensure_position_keeper_user()
+    pk.init_status_writer()
+    pk.dead_letters = DeadLetterSpool(args.dead_letter_spool)
+
+    with pk.cache.cursor() as cursor:
+        cursor.execute("SELECT MAX(transaction_id) FROM transactions")
+        first_transaction_id = (cursor.fetchone()[0] or 0) + 1
+    messages = list(generate_messages(args.messages, pk.cache, parse_mix(args.mix),
+                                      first_transaction_id, seed=args.seed))
+    if not args.mysql:
+        # The API inserts the row before queueing, so give every generated transaction one
+        with pk.cache.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO transactions (transaction_id, transaction_status_id) VALUES (%s, 2)",
+                [(i,) for i in sorted({body["transaction_id"] for body, _, _ in messages
+                                       if "transaction_id" in body})])
+        pk.cache.conn.commit()
+
+    backend = "MySQL" if args.mysql else "SQLite"
+    logger.info(f"Generated {len(messages)} messages ({args.mix}); running against {backend}")
+    sqs = LocalSQS()
+    elapsed = run(sqs, messages, rate=args.rate,
+                  prefetch_batches=args.prefetch)
+    summary = summarize(sqs, elapsed)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
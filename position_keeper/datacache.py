@@ -77,7 +77,7 @@ class DataCache:
     def refresh_record(self, table, primary_key, primary_key_column='id'):
         """Refresh a single record in a cached table, or remove it if deleted."""
         try:
-            logger.info(
+            logger.debug(
                 f"Refreshing single record from {table} with {primary_key_column}={primary_key}")
             if self.conn is None or not self.conn.open:
                 logger.warning(
@@ -111,7 +111,7 @@ class DataCache:
             df = pd.concat([df, df_new_record], ignore_index=True)
             self.cache[table] = df
             self.last_refresh[table] = time.time()
-            logger.info(
+            logger.debug(
                 f"Successfully refreshed record {primary_key_column}={primary_key} in {table}")
 
         except Exception as e:
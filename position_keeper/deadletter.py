@@ -0,0 +1,57 @@
+# /home/ec2-user/fullbor-pk/deadletter.py
+
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger("DeadLetter")
+logger.setLevel(logging.INFO)
+
+
+class DeadLetterSpool:
+    """Destination for messages that keep failing, with the error attached.
+
+    Records go to an SQS dead-letter queue when one is configured, and to a
+    local JSON-lines spool file otherwise (or when sending to the queue
+    fails), so a poison message is kept for inspection and replay instead of
+    being lost.
+    """
+
+    def __init__(self, spool_path, sqs=None, queue_url=None):
+        self.spool_path = spool_path
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.lock = threading.Lock()
+
+    def spill(self, msg, error):
+        record = {
+            "message_id": msg.get("MessageId"),
+            "body": msg.get("Body"),
+            "attributes": msg.get("Attributes", {}),
+            "error": error,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+        if self.queue_url:
+            try:
+                params = {}
+                if self.queue_url.endswith(".fifo"):
+                    params = {
+                        "MessageGroupId": msg.get("Attributes", {}).get("MessageGroupId", "dead-letter"),
+                        "MessageDeduplicationId": msg.get("MessageId"),
+                    }
+                self.sqs.send_message(QueueUrl=self.queue_url,
+                                      MessageBody=json.dumps(record), **params)
+                logger.warning(
+                    f"Dead-lettered message {record['message_id']} to {self.queue_url}: {error}")
+                return
+            except Exception as e:
+                logger.error(
+                    f"Failed to send message {record['message_id']} to the dead-letter queue, spooling locally: {e}")
+
+        with self.lock:
+            with open(self.spool_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        logger.warning(
+            f"Spooled message {record['message_id']} to {self.spool_path}: {error}")
@@ -0,0 +1,96 @@
+# /home/ec2-user/fullbor-pk/eventlog.py
+
+import sys
+import json
+import random
+import logging
+from datetime import datetime, timezone
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+# Per-key sample rates for INFO/DEBUG events; WARNING and above are never sampled
+sample_rates = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line. Event fields are only serialized if the record is emitted."""
+
+    def format(self, record):
+        line = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        line.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The keeper's classic text format, with event fields appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+
+def parse_levels(spec):
+    """Parse 'name=LEVEL,name=LEVEL' into {name: level}."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def parse_sample_rates(spec):
+    """Parse 'key=rate,key=rate' into {key: float rate}."""
+    return {key: float(rate) for key, rate in parse_levels(spec).items()}
+
+
+def configure_logging(level="INFO", log_format="json", logger_levels=None, rates=None):
+    """
+    Install the stdout handler for the process.
+
+    level is the root verbosity; logger_levels overrides it per logger name
+    (e.g. {"SqsPoller": "WARNING"}); rates sets per-key sampling for
+    INFO/DEBUG events logged through log_event.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if log_format ==
+                         "json" else TextFormatter())
+    logging.basicConfig(level=level.upper(), handlers=[handler], force=True)
+    for name, logger_level in (logger_levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+    sample_rates.clear()
+    sample_rates.update(rates or {})
+
+
+def is_logged(logger, level, sample_key=None):
+    """
+    Decide whether an event would be written, before building its fields.
+
+    The event must be enabled for the logger, and INFO/DEBUG events with a
+    sample_key are kept with that key's sample rate.
+    """
+    if not logger.isEnabledFor(level):
+        return False
+    if level >= logging.WARNING or sample_key is None:
+        return True
+    rate = sample_rates.get(sample_key, 1.0)
+    return rate >= 1.0 or random.random() < rate
+
+
+def log_event(logger, level, event, sample_key=None, exc_info=False, **fields):
+    """Log a structured event: a short message plus fields rendered by the formatter."""
+    if is_logged(logger, level, sample_key):
+        logger.log(level, event, exc_info=exc_info,
+                   extra={"fields": fields})
@@ -0,0 +1,194 @@
+# /home/ec2-user/fullbor-pk/localsqs.py
+
+import time
+import uuid
+import threading
+
+
+class LocalSQS:
+    """In-process stand-in for the boto3 SQS client, for benchmarks and local runs.
+
+    Implements the calls the keeper makes with the same request and response
+    shapes, and FIFO queue behaviour: visibility timeouts, ApproximateReceiveCount,
+    and no delivery from a message group that has a message in flight. Every
+    QueueUrl maps to its own queue.
+    """
+
+    def __init__(self, default_visibility_timeout=30):
+        self.default_visibility_timeout = default_visibility_timeout
+        self.queues = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.arrived = threading.Condition(self.lock)
+        # MessageId -> epoch seconds sent / deleted, for latency reporting
+        self.sent_times = {}
+        self.deleted_times = {}
+
+    def _queue(self, queue_url):
+        """Messages of one queue, in send order, keyed by MessageId."""
+        return self.queues.setdefault(queue_url, {})
+
+    def _in_flight(self, queue_url, now):
+        """Received, undeleted messages whose visibility timeout has not expired."""
+        in_flight = self.in_flight.setdefault(queue_url, {})
+        for message_id in [i for i, m in in_flight.items() if m["VisibleAt"] <= now]:
+            del in_flight[message_id]
+        return in_flight
+
+    # ------------------------------
+    # Sending
+    # ------------------------------
+    def send_message(self, QueueUrl, MessageBody, MessageGroupId=None,
+                     MessageDeduplicationId=None, **kwargs):
+        with self.lock:
+            message_id = self._enqueue(QueueUrl, MessageBody, MessageGroupId)
+            self.arrived.notify_all()
+        return {"MessageId": message_id}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        successful = []
+        with self.lock:
+            for entry in Entries:
+                message_id = self._enqueue(
+                    QueueUrl, entry["MessageBody"], entry.get("MessageGroupId"))
+                successful.append({"Id": entry["Id"], "MessageId": message_id})
+            self.arrived.notify_all()
+        return {"Successful": successful, "Failed": []}
+
+    def _enqueue(self, queue_url, body, group_id):
+        message_id = str(uuid.uuid4())
+        now = time.time()
+        self._queue(queue_url)[message_id] = {
+            "MessageId": message_id,
+            "Body": body,
+            "GroupId": group_id,
+            "SentTimestamp": now,
+            "ReceiveCount": 0,
+            "VisibleAt": now,
+            "ReceiptHandle": None,
+        }
+        self.sent_times[message_id] = now
+        return message_id
+
+    # ------------------------------
+    # Receiving
+    # ------------------------------
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0,
+                        VisibilityTimeout=None, AttributeNames=None, **kwargs):
+        timeout = self.default_visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        deadline = time.time() + WaitTimeSeconds
+        with self.lock:
+            while True:
+                messages = self._take_visible(
+                    QueueUrl, MaxNumberOfMessages, timeout)
+                remaining = deadline - time.time()
+                if messages or remaining <= 0:
+                    break
+                # Wake on new messages, or in time for an expiring visibility timeout
+                self.arrived.wait(min(remaining, 0.5))
+        if not messages:
+            return {}
+        return {"Messages": messages}
+
+    def _take_visible(self, queue_url, max_messages, visibility_timeout):
+        now = time.time()
+        queue = self._queue(queue_url)
+        # FIFO: a group with a message in flight delivers nothing else
+        in_flight = self._in_flight(queue_url, now)
+        blocked = {m["GroupId"]
+                   for m in in_flight.values() if m["GroupId"] is not None}
+        taken = []
+        for message in queue.values():
+            if len(taken) >= max_messages:
+                break
+            if message["GroupId"] in blocked:
+                continue
+            if message["VisibleAt"] > now:
+                continue
+            message["ReceiveCount"] += 1
+            message["VisibleAt"] = now + visibility_timeout
+            message["ReceiptHandle"] = f"{message['MessageId']}#{uuid.uuid4().hex}"
+            in_flight[message["MessageId"]] = message
+            attributes = {
+                "SentTimestamp": str(int(message["SentTimestamp"] * 1000)),
+                "ApproximateReceiveCount": str(message["ReceiveCount"]),
+            }
+            if message["GroupId"] is not None:
+                attributes["MessageGroupId"] = message["GroupId"]
+            taken.append({
+                "MessageId": message["MessageId"],
+                "ReceiptHandle": message["ReceiptHandle"],
+                "Body": message["Body"],
+                "Attributes": attributes,
+            })
+        return taken
+
+    def _find(self, queue_url, receipt_handle):
+        message = self._queue(queue_url).get(
+            receipt_handle.split("#", 1)[0])
+        if message is None or message["ReceiptHandle"] != receipt_handle:
+            return None
+        return message
+
+    # ------------------------------
+    # Acknowledging
+    # ------------------------------
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        resp = self.delete_message_batch(
+            QueueUrl, [{"Id": "0", "ReceiptHandle": ReceiptHandle}])
+        if resp["Failed"]:
+            raise ValueError(resp["Failed"][0]["Message"])
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        successful, failed = [], []
+        now = time.time()
+        with self.lock:
+            for entry in Entries:
+                message = self._find(QueueUrl, entry["ReceiptHandle"])
+                if message is None:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid",
+                                   "Message": "The receipt handle is not valid", "SenderFault": True})
+                    continue
+                del self._queue(QueueUrl)[message["MessageId"]]
+                self.in_flight.get(QueueUrl, {}).pop(
+                    message["MessageId"], None)
+                self.deleted_times[message["MessageId"]] = now
+                successful.append({"Id": entry["Id"]})
+            self.arrived.notify_all()
+        return {"Successful": successful, "Failed": failed}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        successful, failed = [], []
+        now = time.time()
+        with self.lock:
+            for entry in Entries:
+                message = self._find(QueueUrl, entry["ReceiptHandle"])
+                if message is None:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid",
+                                   "Message": "The receipt handle is not valid", "SenderFault": True})
+                    continue
+                message["VisibleAt"] = now + entry["VisibilityTimeout"]
+                if entry["VisibilityTimeout"] > 0:
+                    self.in_flight.setdefault(QueueUrl, {})[
+                        message["MessageId"]] = message
+                successful.append({"Id": entry["Id"]})
+            self.arrived.notify_all()
+        return {"Successful": successful, "Failed": failed}
+
+    # ------------------------------
+    # Queue attributes
+    # ------------------------------
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        with self.lock:
+            total = len(self._queue(QueueUrl))
+            not_visible = len(self._in_flight(QueueUrl, time.time()))
+        return {"Attributes": {
+            "ApproximateNumberOfMessages": str(total - not_visible),
+            "ApproximateNumberOfMessagesNotVisible": str(not_visible),
+        }}
+
+    def pending(self, queue_url):
+        """Messages not yet deleted."""
+        with self.lock:
+            return len(self._queue(queue_url))
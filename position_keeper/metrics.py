@@ -0,0 +1,235 @@
+# /home/ec2-user/fullbor-pk/metrics.py
+
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("Metrics")
+logger.setLevel(logging.INFO)
+
+# EMF lines must be bare JSON, so they bypass the timestamped root log format
+emf_logger = logging.getLogger("MetricsEMF")
+emf_logger.setLevel(logging.INFO)
+emf_logger.propagate = False
+_emf_handler = logging.StreamHandler(sys.stdout)
+_emf_handler.setFormatter(logging.Formatter("%(message)s"))
+emf_logger.addHandler(_emf_handler)
+
+# Histogram bucket upper bounds in milliseconds
+DEFAULT_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+                   1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class Histogram:
+    """Cumulative bucketed histogram of millisecond observations."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return list(self.counts), self.sum, self.count
+
+
+def percentile(buckets, counts, count, q):
+    """Estimate a percentile as the upper bound of the bucket that contains it."""
+    if count == 0:
+        return 0
+    target = q * count
+    running = 0
+    for i, bucket_count in enumerate(counts):
+        running += bucket_count
+        if running >= target:
+            return buckets[i] if i < len(buckets) else buckets[-1]
+    return buckets[-1]
+
+
+class Metrics:
+    """Thread-safe registry of labelled histograms and counters.
+
+    Exports as CloudWatch Embedded Metric Format log lines (per-interval
+    deltas, via emit_if_due) and as Prometheus text (cumulative, via
+    serve_prometheus).
+    """
+
+    def __init__(self, namespace="FullBor/PositionKeeper", prefix="fullbor_pk",
+                 emit_interval=60):
+        self.namespace = namespace
+        self.prefix = prefix
+        self.emit_interval = emit_interval
+        self.histograms = {}
+        self.counters = {}
+        self.last_emitted = {}
+        self.last_emit_time = time.time()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value_ms, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value_ms)
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the wall-clock milliseconds spent in the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000, **labels)
+
+    # ------------------------------
+    # CloudWatch Embedded Metric Format
+    # ------------------------------
+    def emit_if_due(self):
+        if time.time() - self.last_emit_time >= self.emit_interval:
+            self.emit_emf()
+
+    def emit_emf(self):
+        """Log one EMF line per series with the activity since the previous emit."""
+        now = time.time()
+        elapsed = max(now - self.last_emit_time, 1e-9)
+        with self.lock:
+            histograms = {key: h.snapshot()
+                          for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+        self.last_emit_time = now
+
+        for (name, labels), (counts, total, count) in histograms.items():
+            prev_counts, prev_total, prev_count = self.last_emitted.get(
+                (name, labels), ([0] * len(counts), 0.0, 0))
+            self.last_emitted[(name, labels)] = (counts, total, count)
+            delta_counts = [c - p for c, p in zip(counts, prev_counts)]
+            delta_count = count - prev_count
+            if delta_count == 0:
+                continue
+            self._emit_line(now, dict(labels), {
+                f"{name}_count": (delta_count, "Count"),
+                f"{name}_avg": ((total - prev_total) / delta_count, "Milliseconds"),
+                f"{name}_p50": (percentile(DEFAULT_BUCKETS, delta_counts, delta_count, 0.50), "Milliseconds"),
+                f"{name}_p99": (percentile(DEFAULT_BUCKETS, delta_counts, delta_count, 0.99), "Milliseconds"),
+            })
+
+        for (name, labels), value in counters.items():
+            previous = self.last_emitted.get((name, labels), 0)
+            self.last_emitted[(name, labels)] = value
+            if value == previous:
+                continue
+            self._emit_line(now, dict(labels), {
+                name: (value - previous, "Count"),
+                f"{name}_per_second": ((value - previous) / elapsed, "Count/Second"),
+            })
+
+    def _emit_line(self, now, labels, values):
+        line = {
+            "_aws": {
+                "Timestamp": int(now * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [sorted(labels.keys())],
+                    "Metrics": [{"Name": metric, "Unit": unit}
+                                for metric, (_, unit) in values.items()]
+                }]
+            }
+        }
+        line.update(labels)
+        line.update({metric: value for metric, (value, _) in values.items()})
+        emf_logger.info(json.dumps(line))
+
+    # ------------------------------
+    # Prometheus text exposition
+    # ------------------------------
+    def prometheus_text(self):
+        with self.lock:
+            histograms = {key: h.snapshot()
+                          for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        typed = set()
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            running = 0
+            for bound, bucket_count in zip(list(DEFAULT_BUCKETS) + ["+Inf"], counts):
+                running += bucket_count
+                lines.append(
+                    f"{metric}_bucket{_labels(labels, le=bound)} {running}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+
+        for (name, labels), value in sorted(counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port, host="127.0.0.1"):
+        """Serve /metrics in Prometheus text format on a background thread."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the keeper log
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever,
+                         name="metrics-http", daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+        return server
+
+
+def _escape_label_value(value):
+    """Escape a label value as the Prometheus text format requires."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + "}"
@@ -0,0 +1,151 @@
+# /home/ec2-user/fullbor-pk/positionjournal.py
+
+import os
+import time
+import logging
+import argparse
+from datetime import datetime
+from positionsandbox import promote_sandbox
+
+logger = logging.getLogger("PositionJournal")
+logger.setLevel(logging.INFO)
+
+INSERT_SQL = """
+    INSERT INTO position_journal (
+        transaction_id, position_date, position_type_id, portfolio_entity_id,
+        instrument_entity_id, share_delta, market_value_delta, applied_at,
+        position_keeper_id
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+
+class PositionJournal:
+    """Append-only journal of position deltas, written in multi-row batches.
+
+    Deltas are buffered in memory and written with a single executemany()
+    (which pymysql turns into one multi-row INSERT) and a single commit.
+    """
+
+    def __init__(self, cache, position_keeper_id, batch_size=500):
+        self.cache = cache
+        self.position_keeper_id = position_keeper_id
+        self.batch_size = batch_size
+        self.pending = []
+
+    def record(self, transaction_id, position_date, position_type_id,
+               portfolio_entity_id, instrument_entity_id,
+               share_delta, market_value_delta=0):
+        """Buffer one position delta. Writes the buffer (uncommitted) once batch_size is reached."""
+        self.pending.append((
+            transaction_id, position_date, position_type_id, portfolio_entity_id,
+            instrument_entity_id, share_delta, market_value_delta,
+            datetime.utcnow(), self.position_keeper_id
+        ))
+        if len(self.pending) >= self.batch_size:
+            self.flush(commit=False)
+
+    def flush(self, commit=True):
+        """
+        Write all buffered deltas in one statement and one commit.
+
+        With commit=False the rows are left in the open transaction for the
+        caller to commit (or roll back and discard()).
+        """
+        if not self.pending:
+            return 0
+        rows = self.pending
+        start = time.time()
+        with self.cache.cursor() as cursor:
+            cursor.executemany(INSERT_SQL, rows)
+            if commit:
+                self.cache.conn.commit()
+        # Only drop the buffer once the rows are safely written
+        self.pending = []
+        logger.info(
+            f"Journaled {len(rows)} position deltas in {(time.time() - start) * 1000:.1f}ms")
+        return len(rows)
+
+    def discard(self):
+        """Drop buffered deltas whose messages will be redelivered."""
+        self.pending = []
+
+
+def replay_journal(conn, position_keeper_id, as_of=None):
+    """
+    Rebuild position_sandbox from the journal as of a point in time.
+
+    The rebuild covers the whole fleet: keepers share one queue, so deltas to
+    the same position can be journaled by any of them, and only the sum over
+    every keeper's journal rows is a correct position. The sandbox is
+    therefore replaced as a whole, and every rebuilt row is stamped with
+    position_keeper_id, the keeper running the replay. Running keepers are
+    not affected (they write to positions), so the fleet need not be stopped.
+
+    The sandbox is emptied and refilled with one set-based INSERT ... SELECT
+    that sums every journal delta applied on or before as_of (default: now),
+    so recovery is a sequential journal scan rather than a re-run of the
+    transaction business logic. Both happen in one transaction (a DELETE
+    rather than TRUNCATE, which would commit on its own), so a failed replay
+    leaves the sandbox as it was. Returns the number of sandbox rows written.
+    """
+    as_of = as_of or datetime.utcnow()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM position_sandbox")
+            cursor.execute("""
+                INSERT INTO position_sandbox (
+                    position_date, position_type_id, portfolio_entity_id,
+                    instrument_entity_id, share_amount, market_value, position_keeper_id
+                )
+                SELECT position_date, position_type_id, portfolio_entity_id,
+                       instrument_entity_id, SUM(share_delta), SUM(market_value_delta), %s
+                FROM position_journal  -- every keeper's deltas, not just position_keeper_id's
+                WHERE applied_at <= %s
+                GROUP BY position_date, position_type_id, portfolio_entity_id, instrument_entity_id
+            """, (position_keeper_id, as_of))
+            row_count = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(
+        f"Replayed position journal as of {as_of} into {row_count} sandbox rows")
+    return row_count
+
+
+def main():
+    import pymysql
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild position_sandbox from every keeper's position journal")
+    parser.add_argument("--position-keeper-id", type=int, required=True,
+                        help="position_keeper_id to stamp on the rebuilt sandbox rows "
+                             "(the replay covers every keeper's journal)")
+    parser.add_argument("--as-of",
+                        help="Replay deltas applied on or before this UTC time (YYYY-MM-DD[THH:MM:SS]); default now")
+    parser.add_argument("--promote", action="store_true",
+                        help="Atomically publish the rebuilt sandbox as the live positions table, "
+                             "carrying over deltas journaled after --as-of")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s [%(levelname)s] %(message)s")
+
+    as_of = datetime.fromisoformat(
+        args.as_of) if args.as_of else datetime.utcnow()
+    conn = pymysql.connect(
+        host=os.environ.get("DB_HOST"),
+        user=os.environ.get("DB_USER"),
+        password=os.environ.get("DB_PASS"),
+        database=os.environ.get("DATABASE")
+    )
+    try:
+        replay_journal(conn, args.position_keeper_id, as_of)
+        if args.promote:
+            promote_sandbox(conn, since=as_of)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
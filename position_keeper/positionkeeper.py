@@ -1,33 +1,85 @@
 #!/usr/bin/env python3
 import os
-import sys
 import time
 import json
 import boto3
+import signal
+import threading
 import logging
-from datetime import datetime, timedelta
-from botocore.exceptions import BotoCoreError, ClientError
+from datetime import datetime, timedelta, timezone
 from datacache import DataCache
+from positionjournal import PositionJournal
+from positionsandbox import SandboxWriter
+from statuswriter import StatusWriter
+from sqspoller import PrefetchingPoller
+from metrics import Metrics
+from profiler import SamplingProfiler
+from deadletter import DeadLetterSpool
+from eventlog import configure_logging, parse_levels, parse_sample_rates, is_logged, log_event
 
 # ==============================
 # Configuration
 # ==============================
 REGION = os.environ.get("AWS_REGION", "us-east-2")
+# Reference tables held in memory by the DataCache
+CACHE_TABLES = ["entities", "entity_types", "transaction_types",
+                "users", "transaction_statuses"]
 SECRET_ARN = os.environ.get(
     "SECRET_ARN",
     "arn:aws:secretsmanager:us-east-2:316490106381:secret:PandaDbSecretCache-pdzjei"
 )
-POLL_INTERVAL = 5  # seconds between polls when idle
-IDLE_TIMEOUT = 30  # minutes after which the instance commits suicide
+POLL_INTERVAL = 5  # seconds between idle-timeout checks while waiting for a batch
+# Received batches buffered ahead of processing (bounds how far receiving runs ahead)
+PREFETCH_BATCHES = int(os.environ.get("PREFETCH_BATCHES", "1"))
+# Visibility timeout (seconds) kept on received messages by the poller's heartbeat
+VISIBILITY_TIMEOUT = int(os.environ.get("VISIBILITY_TIMEOUT", "30"))
+# Seconds after which a held message is no longer heartbeated and can be redelivered
+MAX_VISIBILITY_EXTENSION = int(
+    os.environ.get("MAX_VISIBILITY_EXTENSION", "900"))
+# Receives after which a failing message is dead-lettered instead of retried
+MAX_RECEIVES = int(os.environ.get("MAX_RECEIVES", "5"))
+# Retry backoff in seconds: RETRY_BASE_DELAY * 2^(receives - 1), capped at RETRY_MAX_DELAY
+RETRY_BASE_DELAY = int(os.environ.get("RETRY_BASE_DELAY", "5"))
+RETRY_MAX_DELAY = int(os.environ.get("RETRY_MAX_DELAY", "300"))
+# Dead-letter SQS queue (optional) and the local spool used without one
+DEAD_LETTER_QUEUE_URL = os.environ.get("DEAD_LETTER_QUEUE_URL")
+DEAD_LETTER_SPOOL = os.environ.get("DEAD_LETTER_SPOOL", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "dead-letter.jsonl"))
+# Minutes idle after which the instance commits suicide (0 leaves stopping to the
+# PKManager autoscaler)
+IDLE_TIMEOUT = int(os.environ.get("IDLE_TIMEOUT", "30"))
+# Record refreshes for one table within a batch before they collapse into a table refresh
+COALESCE_REFRESH_THRESHOLD = int(
+    os.environ.get("COALESCE_REFRESH_THRESHOLD", "10"))
+METRICS_INTERVAL = int(os.environ.get(
+    "METRICS_INTERVAL", "60"))  # seconds between EMF metric lines
+# Operations used as metric labels; any other operation is labelled "unknown",
+# so values taken from message bodies cannot grow the number of series
+METRIC_OPERATIONS = {"create", "update", "delete", "refresh_cache",
+                     "profile", "log_level", "unparsed"}
+# Local Prometheus /metrics port (0 disables)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9108"))
+# Fraction of messages profiled (0 disables; also settable with a "profile" control message)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DUMP_INTERVAL = int(os.environ.get(
+    "PROFILE_DUMP_INTERVAL", "300"))  # seconds between collapsed-stack dumps
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "profiles"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # json or text
+# Per-logger level overrides, e.g. "SqsPoller=WARNING,DataCache=DEBUG"
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+# Sample rates for INFO/DEBUG events by operation, e.g. "refresh_cache=0.01,create=0.1"
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "")
 
 # ==============================
 # Logging setup (CloudWatch-compatible)
 # ==============================
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    stream=sys.stdout,
-    force=True
+configure_logging(
+    level=LOG_LEVEL,
+    log_format=LOG_FORMAT,
+    logger_levels=parse_levels(LOG_LEVELS),
+    rates=parse_sample_rates(LOG_SAMPLE_RATES)
 )
 logger = logging.getLogger(__name__)
 
@@ -37,7 +89,17 @@ logger = logging.getLogger(__name__)
 sqs = None
 ec2 = None
 cache = None
+journal = None  # PositionJournal, set during startup if this instance is a registered position keeper
+# SandboxWriter for position rows, set alongside the journal. Nothing computes positions
+# yet, so nothing calls sandbox_writer.write() and its per-batch flush writes no rows.
+sandbox_writer = None
 position_keeper_user_id = None  # Will be set during startup
+status_writer = None  # StatusWriter for PROCESSED updates, set once the keeper user is known
+dead_letters = None  # DeadLetterSpool, set in main once the SQS client exists
+draining = threading.Event()  # set by SIGTERM/SIGINT to stop after the current batch
+metrics = Metrics(emit_interval=METRICS_INTERVAL)
+profiler = SamplingProfiler(sample_rate=PROFILE_SAMPLE_RATE,
+                            dump_interval=PROFILE_DUMP_INTERVAL, output_dir=PROFILE_DIR)
 
 # ==============================
 # Secret retrieval
@@ -71,10 +133,28 @@ def load_secret_values(secret_arn):
 last_message_time = datetime.now()
 
 
+def entity_name(entity_id):
+    """Cached entity name for log output."""
+    if not entity_id:
+        return None
+    entities_df = cache.cache.get("entities")
+    row = entities_df[entities_df['entity_id'] == entity_id]
+    return row.iloc[0]['entity_name'] if not row.empty else f"Unknown({entity_id})"
+
+
+def user_email(user_id):
+    """Cached user email for log output."""
+    users_df = cache.cache.get("users")
+    row = users_df[users_df['user_id'] == user_id]
+    return row.iloc[0]['email'] if not row.empty else "Unknown"
+
+
 def process_transaction(message_data):
-    """Process a transaction message (create, update, or delete)."""
+    """Process a transaction message (create, update, or delete). Returns an error description if processing failed."""
+    transaction_id = message_data.get("transaction_id")
     try:
-        transaction_id = message_data.get("transaction_id")
+        lookup_start = time.perf_counter()
+        operation = message_data.get("operation")
         transaction_status_id = message_data.get("transaction_status_id")
         transaction_type_id = message_data.get("transaction_type_id")
         updated_user_id = message_data.get("updated_user_id")
@@ -85,128 +165,102 @@ def process_transaction(message_data):
                                                     == transaction_type_id]
 
         if transaction_type_row.empty:
-            logger.warning(
-                f"Transaction type {transaction_type_id} not found in cache for transaction {transaction_id}")
-            return
+            log_event(logger, logging.WARNING, "Transaction type not found in cache",
+                      transaction_id=transaction_id, transaction_type_id=transaction_type_id)
+            return None
 
         transaction_type_name = transaction_type_row.iloc[0]['transaction_type_name']
-        properties = transaction_type_row.iloc[0].get('properties', {})
-        if isinstance(properties, str):
-            properties = json.loads(properties)
-        position_keeping_actions = properties.get(
-            'position_keeping_actions', 'None')
-
-        # Look up user email from cache
-        users_df = cache.cache.get("users")
-        user_row = users_df[users_df['user_id'] == updated_user_id]
-        email = user_row.iloc[0]['email'] if not user_row.empty else "Unknown"
-
-        # Look up transaction status name from cache
-        transaction_statuses_df = cache.cache.get("transaction_statuses")
-        transaction_status_row = transaction_statuses_df[
-            transaction_statuses_df['transaction_status_id'] == transaction_status_id]
-        transaction_status_name = transaction_status_row.iloc[0][
-            'transaction_status_name'] if not transaction_status_row.empty else f"Unknown({transaction_status_id})"
+        metrics.observe("stage_duration_ms",
+                        (time.perf_counter() - lookup_start) * 1000, stage="lookups")
 
         # Handle INCOMPLETE transactions (status 1)
         if transaction_status_id == 1:
-            logger.info(
-                f"{transaction_status_name} saved transaction {transaction_id} by {email} ignored.")
-            return
+            log_event(logger, logging.INFO, "Ignored incomplete transaction", sample_key=operation,
+                      transaction_id=transaction_id, updated_user_id=updated_user_id)
+            return None
 
         # Handle NEW (status 2) or AMENDED (status 4) transactions
         if transaction_status_id in [2, 4]:
-            # Look up entity names from cache
-            entities_df = cache.cache.get("entities")
-
-            portfolio_entity_id = message_data.get("portfolio_entity_id")
-            contra_entity_id = message_data.get("contra_entity_id")
-            instrument_entity_id = message_data.get("instrument_entity_id")
-
-            portfolio_entity_name = "None"
-            if portfolio_entity_id:
-                portfolio_row = entities_df[entities_df['entity_id']
-                                            == portfolio_entity_id]
-                portfolio_entity_name = portfolio_row.iloc[0][
-                    'entity_name'] if not portfolio_row.empty else f"Unknown({portfolio_entity_id})"
-
-            contra_entity_name = "None"
-            if contra_entity_id:
-                contra_row = entities_df[entities_df['entity_id']
-                                         == contra_entity_id]
-                contra_entity_name = contra_row.iloc[0][
-                    'entity_name'] if not contra_row.empty else f"Unknown({contra_entity_id})"
-
-            instrument_entity_name = "None"
-            if instrument_entity_id:
-                instrument_row = entities_df[entities_df['entity_id']
-                                             == instrument_entity_id]
-                instrument_entity_name = instrument_row.iloc[0][
-                    'entity_name'] if not instrument_row.empty else f"Unknown({instrument_entity_id})"
-
-            trade_date = message_data.get("trade_date")
-            settle_date = message_data.get("settle_date")
-            transaction_properties = message_data.get("properties", {})
-            timestamp = message_data.get("timestamp")
-            changes = message_data.get("changes", {})
-
             status_label = "NEW" if transaction_status_id == 2 else "AMENDED"
 
-            logger.info(f"""
-{status_label} transaction {transaction_id}:
-    Portfolio {portfolio_entity_id} {portfolio_entity_name}
-    Contra {contra_entity_id} {contra_entity_name}
-    Instrument {instrument_entity_id} {instrument_entity_name}
-    Transaction Type {transaction_type_id} {transaction_type_name}
-    Properties {transaction_properties}
-    User {updated_user_id} {email}
-    Timestamp {timestamp}
-    Trade Date {trade_date}
-    Settle Date {settle_date}
-    Position Keeping Actions {position_keeping_actions}
-    Changes {changes}
-""")
-
-            # Update transaction status to PROCESSED (status 3)
+            # Name lookups only happen when the event is actually written
+            if is_logged(logger, logging.INFO, operation):
+                with metrics.timer("stage_duration_ms", stage="entity_lookups"):
+                    properties = transaction_type_row.iloc[0].get(
+                        'properties', {})
+                    if isinstance(properties, str):
+                        properties = json.loads(properties)
+                    fields = {
+                        "transaction_id": transaction_id,
+                        "status": status_label,
+                        "operation": operation,
+                        "transaction_type_id": transaction_type_id,
+                        "transaction_type_name": transaction_type_name,
+                        "portfolio_entity_id": message_data.get("portfolio_entity_id"),
+                        "portfolio_entity_name": entity_name(message_data.get("portfolio_entity_id")),
+                        "contra_entity_id": message_data.get("contra_entity_id"),
+                        "contra_entity_name": entity_name(message_data.get("contra_entity_id")),
+                        "instrument_entity_id": message_data.get("instrument_entity_id"),
+                        "instrument_entity_name": entity_name(message_data.get("instrument_entity_id")),
+                        "updated_user_id": updated_user_id,
+                        "email": user_email(updated_user_id),
+                        "timestamp": message_data.get("timestamp"),
+                        "trade_date": message_data.get("trade_date"),
+                        "settle_date": message_data.get("settle_date"),
+                        "position_keeping_actions": properties.get('position_keeping_actions', 'None'),
+                    }
+                    # Full payloads only at DEBUG verbosity
+                    if logger.isEnabledFor(logging.DEBUG):
+                        fields["properties"] = message_data.get(
+                            "properties", {})
+                        fields["changes"] = message_data.get("changes", {})
+                log_event(logger, logging.INFO,
+                          f"{status_label} transaction", **fields)
+
+            # Update transaction status to PROCESSED (status 3), written behind
+            # in one set-based update per batch; flush_writes commits it before the ack.
             # Position Keeper uses the HEADLESS POSITION KEEPER user_id
-            try:
-                with cache.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE transactions SET transaction_status_id = 3, updated_user_id = %s, update_date = NOW() WHERE transaction_id = %s",
-                        (position_keeper_user_id, transaction_id)
-                    )
-                    cache.conn.commit()
-                    logger.info(
-                        f"Transaction {transaction_id} marked as PROCESSED by Position Keeper (user {position_keeper_user_id})")
-            except Exception as e:
-                logger.error(
-                    f"Failed to update transaction {transaction_id} status: {e}")
-
-            return
+            with metrics.timer("stage_duration_ms", stage="db_update"):
+                status_writer.mark_processed(transaction_id)
+            log_event(logger, logging.DEBUG, "Transaction queued as PROCESSED", sample_key=operation,
+                      transaction_id=transaction_id, updated_user_id=position_keeper_user_id)
+
+            return None
 
         # Handle unknown status
-        logger.warning(
-            f"WARNING: Unrecognized {transaction_type_name} type transaction {transaction_id} with status {transaction_status_id} ignored.")
+        log_event(logger, logging.WARNING, "Unrecognized transaction status ignored",
+                  transaction_id=transaction_id, transaction_type_name=transaction_type_name,
+                  transaction_status_id=transaction_status_id)
+        return None
 
     except Exception as e:
-        logger.error(f"Error processing transaction message: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        log_event(logger, logging.ERROR, "Error processing transaction message",
+                  exc_info=True, transaction_id=transaction_id, error=str(e))
+        return f"Error processing transaction message: {e}"
+
 
+def process_message(msg, message_data=None):
+    """
+    Process and log an SQS message. message_data may be passed in if the body is already parsed.
 
-def process_message(msg):
-    """Process and log an SQS message."""
+    Returns None if the message was handled (including messages that are
+    ignored), or a description of the failure if it should be retried.
+    """
     global last_message_time
     body = msg.get("Body", "")
     message_id = msg.get("MessageId", "unknown")
-    logger.info(f"Received message {message_id}: {body}")
+    log_event(logger, logging.DEBUG, "Received message",
+              message_id=message_id, body=body)
 
     # Update last message time
     last_message_time = datetime.now()
+    start = time.perf_counter()
+    operation = "unparsed"
 
     # Parse and handle messages
     try:
-        message_data = json.loads(body)
+        if message_data is None:
+            message_data = json.loads(body)
         operation = message_data.get("operation")
 
         if operation == "refresh_cache":
@@ -215,115 +269,398 @@ def process_message(msg):
             primary_key_column = message_data.get("primary_key_column", "id")
 
             if not table:
-                logger.warning(
-                    f"Cache refresh message missing 'table' field: {body}")
-                return
+                log_event(logger, logging.WARNING, "Cache refresh message missing 'table' field",
+                          message_id=message_id, body=body)
+                return None
 
             if primary_key is not None:
                 # Refresh single record
-                logger.info(
-                    f"Refreshing single record: table={table}, {primary_key_column}={primary_key}")
+                log_event(logger, logging.INFO, "Refreshing single record", sample_key=operation,
+                          table=table, primary_key_column=primary_key_column, primary_key=primary_key)
                 cache.refresh_record(table, primary_key, primary_key_column)
             else:
                 # Refresh entire table
-                logger.info(f"Refreshing entire table: {table}")
+                log_event(logger, logging.INFO,
+                          "Refreshing entire table", table=table)
                 cache.refresh(table)
 
         elif operation in ["create", "update", "delete"]:
             # Handle transaction messages
-            process_transaction(message_data)
+            error = process_transaction(message_data)
+            if error:
+                metrics.increment("processing_errors", operation=operation_label(operation))
+            return error
+
+        elif operation == "profile":
+            # Control message: {"operation": "profile", "sample_rate": 0.05}
+            profiler.set_sample_rate(message_data.get("sample_rate", 0))
+
+        elif operation == "log_level":
+            # Control message: {"operation": "log_level", "level": "DEBUG", "logger": "DataCache"}
+            # (no logger changes the root level)
+            level = message_data.get("level", "INFO").upper()
+            logging.getLogger(message_data.get("logger")).setLevel(level)
+            log_event(logger, logging.WARNING, "Log level changed",
+                      logger_name=message_data.get("logger") or "root", level=level)
 
         else:
-            logger.info(f"Unrecognized operation: {operation}")
+            log_event(logger, logging.WARNING, "Unrecognized operation",
+                      message_id=message_id, operation=operation)
+        return None
 
     except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse message as JSON: {e}")
+        log_event(logger, logging.ERROR, "Failed to parse message as JSON",
+                  message_id=message_id, error=str(e), body=body)
+        metrics.increment("processing_errors", operation=operation_label(operation))
+        return f"Failed to parse message as JSON: {e}"
+    except Exception as e:
+        log_event(logger, logging.ERROR, "Error processing message",
+                  message_id=message_id, operation=operation, error=str(e))
+        metrics.increment("processing_errors", operation=operation_label(operation))
+        return f"Error processing message: {e}"
+    finally:
+        record_message_metrics(operation, message_data, start)
+
+
+def operation_label(operation):
+    """Map a message's operation to its metric label, one of METRIC_OPERATIONS or "unknown"."""
+    if isinstance(operation, str) and operation in METRIC_OPERATIONS:
+        return operation
+    return "unknown"
+
+
+def record_message_metrics(operation, message_data, start):
+    """Record per-operation processing time, throughput and end-to-end latency."""
+    operation = operation_label(operation)
+    metrics.observe("operation_duration_ms",
+                    (time.perf_counter() - start) * 1000, operation=operation)
+    metrics.increment("messages_processed", operation=operation)
+
+    # End-to-end latency from when the API produced the message
+    timestamp = message_data.get("timestamp") if isinstance(
+        message_data, dict) else None
+    if timestamp:
+        try:
+            produced = datetime.fromisoformat(timestamp)
+            if produced.tzinfo is None:
+                produced = produced.replace(tzinfo=timezone.utc)
+            metrics.observe("end_to_end_latency_ms",
+                            (datetime.now(timezone.utc) - produced).total_seconds() * 1000,
+                            operation=operation)
+        except ValueError:
+            pass
+
+
+def coalesce_messages(messages):
+    """
+    Drop redundant work from a receive batch.
+
+    - Cache refreshes are deduplicated per (table, primary_key). A refresh reads
+      the current database state, so the first occurrence is kept.
+    - A full-table refresh, or COALESCE_REFRESH_THRESHOLD or more distinct record
+      refreshes for one table, collapses all refreshes of that table into a
+      single table refresh.
+    - Only the latest message for each transaction_id is kept.
+
+    Returns a list of (msg, message_data) pairs to process in batch order.
+    message_data is None for bodies that are not valid JSON objects, which are
+    passed through so process_message reports them.
+    """
+    parsed = []
+    for msg in messages:
+        try:
+            message_data = json.loads(msg.get("Body", ""))
+        except json.JSONDecodeError:
+            message_data = None
+        if not isinstance(message_data, dict):
+            message_data = None
+        parsed.append((msg, message_data))
+
+    # Find the tables that only need one full refresh
+    full_refresh_tables = set()
+    record_keys = {}
+    for msg, message_data in parsed:
+        if message_data is None or message_data.get("operation") != "refresh_cache":
+            continue
+        table = message_data.get("table")
+        if not table:
+            continue
+        if message_data.get("primary_key") is None:
+            full_refresh_tables.add(table)
+        else:
+            record_keys.setdefault(table, set()).add(
+                message_data["primary_key"])
+    for table, keys in record_keys.items():
+        if len(keys) >= COALESCE_REFRESH_THRESHOLD:
+            full_refresh_tables.add(table)
+
+    # Key each message by the unit of work it represents
+    work_keys = []
+    for msg, message_data in parsed:
+        key = None
+        if message_data is not None:
+            operation = message_data.get("operation")
+            table = message_data.get("table")
+            if operation == "refresh_cache" and table:
+                primary_key = None if table in full_refresh_tables else message_data.get(
+                    "primary_key")
+                key = ("refresh", table, primary_key)
+            elif operation in ["create", "update", "delete"] and message_data.get("transaction_id") is not None:
+                key = ("transaction", message_data["transaction_id"])
+        work_keys.append(key)
+
+    # Refreshes keep their first occurrence, transactions their last
+    keep_index = {}
+    for i, key in enumerate(work_keys):
+        if key is None:
+            continue
+        if key[0] == "transaction" or key not in keep_index:
+            keep_index[key] = i
+
+    kept = []
+    for i, (msg, message_data) in enumerate(parsed):
+        key = work_keys[i]
+        if key is not None and keep_index[key] != i:
+            continue
+        if key is not None and key[0] == "refresh" and key[2] is None:
+            # Collapsed record refresh becomes a full-table refresh
+            message_data = {"operation": "refresh_cache", "table": key[1]}
+        kept.append((msg, message_data))
+
+    if len(kept) < len(messages):
+        metrics.increment("messages_coalesced_away", len(messages) - len(kept))
+        logger.info(
+            f"Coalesced {len(messages)} messages into {len(kept)} units of work")
+    return kept
+
+
+def message_group(msg):
+    """FIFO message group of a message (its own id on a standard queue)."""
+    return msg.get("Attributes", {}).get("MessageGroupId") or msg.get("MessageId")
+
+
+def process_batch(messages):
+    """
+    Coalesce a receive batch and process the remaining messages in order.
+
+    Returns (msg, error) pairs for the messages that should be redelivered.
+    A failure also holds back the rest of its message group in the batch
+    (including messages coalesced into the failed one), so FIFO order is
+    kept; those messages did not fail themselves and have error None.
+    """
+    failed_ids = {}
+    failed_groups = set()
+    succeeded = set()
+    for msg, message_data in coalesce_messages(messages):
+        group = message_group(msg)
+        if group in failed_groups:
+            continue
+        operation = message_data.get(
+            "operation") if message_data else "unparsed"
+        with profiler.profile(operation):
+            error = process_message(msg, message_data)
+        if error:
+            failed_ids[msg.get("MessageId")] = error
+            failed_groups.add(group)
+        else:
+            succeeded.add(msg.get("MessageId"))
+
+    failed = [(msg, failed_ids.get(msg.get("MessageId"))) for msg in messages
+              if message_group(msg) in failed_groups and msg.get("MessageId") not in succeeded]
+    if failed_ids:
+        metrics.increment("messages_failed", len(failed_ids))
+    return failed
+
+
+def flush_writes():
+    """
+    Journal the processed position deltas, write position rows, then mark transactions PROCESSED.
+
+    All three are written in one transaction and committed together. If any
+    write fails the transaction is rolled back and the connection closed, the
+    buffered writes are discarded (their messages are redelivered and will
+    buffer them again) and the error is raised.
+
+    The connection is held here because DataCache.cursor() drops its
+    reference to it on any error; the next cursor() reconnects.
+    """
+    writers = [writer for writer in (journal, sandbox_writer, status_writer) if writer]
+    conn = cache.conn
+    with metrics.timer("stage_duration_ms", stage="flush"):
+        try:
+            # Status last, so a transaction is only PROCESSED once its positions are written
+            written = sum(writer.flush(commit=False) for writer in writers)
+            if written:
+                cache.conn.commit()
+        except Exception:
+            for writer in writers:
+                writer.discard()
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            raise
+
+
+def handle_batch(poller, messages):
+    """Process a received batch, flush its writes, then acknowledge what succeeded."""
+    with metrics.timer("stage_duration_ms", stage="process_batch"):
+        failed = process_batch(messages)
+
+    # Journal the batch's position deltas and write its position rows
+    # before acknowledging it. If that fails nothing is acknowledged:
+    # every message is retried with backoff (or dead-lettered).
+    try:
+        flush_writes()
     except Exception as e:
-        logger.error(f"Error processing message: {e}")
+        log_event(logger, logging.ERROR, "Failed to write batch",
+                  exc_info=True, messages=len(messages), error=str(e))
+        metrics.increment("flush_errors")
+        errors = {msg.get("MessageId"): error for msg, error in failed if error}
+        handle_failures(poller, [
+            (msg, errors.get(msg.get("MessageId"), f"Failed to write batch: {e}"))
+            for msg in messages])
+        return
+
+    # delete messages after successful processing (sent asynchronously)
+    failed_ids = {msg.get("MessageId") for msg, _ in failed}
+    poller.acknowledge(
+        [msg for msg in messages if msg.get("MessageId") not in failed_ids])
+    if failed:
+        handle_failures(poller, failed)
+
+
+def handle_failures(poller, failed):
+    """
+    Retry failed messages with exponential backoff, dead-lettering persistent failures.
+
+    Retries go back to SQS with a visibility timeout as the backoff delay, so
+    the keeper keeps working on other message groups meanwhile. Messages that
+    were only held back behind a failure in their group are released at once.
+    """
+    retries = []
+    for msg, error in failed:
+        if error is None:
+            retries.append((msg, 0))
+            continue
+        receives = int(msg.get("Attributes", {}).get(
+            "ApproximateReceiveCount", 1))
+        if receives >= MAX_RECEIVES:
+            dead_letters.spill(msg, error)
+            poller.acknowledge([msg])
+            metrics.increment("messages_dead_lettered")
+        else:
+            delay = min(RETRY_BASE_DELAY * 2 ** (receives - 1), RETRY_MAX_DELAY)
+            log_event(logger, logging.WARNING, "Retrying failed message",
+                      message_id=msg.get("MessageId"), receives=receives, delay=delay, error=error)
+            retries.append((msg, delay))
+            metrics.increment("messages_retried")
+    poller.retry(retries)
 
 
-def shutdown_instance(instance_id):
-    """Stop the EC2 instance."""
-    try:
-        logger.info(
-            f"Idle timeout reached. Shutting down instance {instance_id}")
+def flush_logs():
+    """Flush all log handlers so the last lines reach the log file."""
+    for handler in logging.root.handlers:
+        handler.flush()
 
-        # Stop the EC2 instance
-        logger.info(f"Stopping EC2 instance: {instance_id}")
 
-        # Flush all log handlers to ensure messages reach CloudWatch
-        for handler in logger.handlers:
-            handler.flush()
-        for handler in logging.root.handlers:
-            handler.flush()
+def request_drain(signum, frame):
+    """SIGTERM/SIGINT handler: finish the current batch, then drain and exit."""
+    logger.warning(
+        f"Received {signal.Signals(signum).name}, draining before exit...")
+    draining.set()
 
-        # Give CloudWatch agent time to pick up the logs
-        time.sleep(2)
 
-        ec2.stop_instances(InstanceIds=[instance_id])
-        logger.info(f"Instance {instance_id} stop command sent successfully")
+def drain(poller):
+    """
+    Shut the keeper down without dropping work.
 
-        # Final flush after stop command
-        for handler in logger.handlers:
-            handler.flush()
-        for handler in logging.root.handlers:
-            handler.flush()
+    Receiving stops and batches that were received but not started go back
+    to the queue. Pending bulk writes and telemetry are flushed, and the
+    poller sends its outstanding acknowledgements before returning.
+    """
+    logger.info("Draining: stopping receives")
+    try:
+        poller.stop_receiving()
+        flush_writes()
+        profiler.dump()
+        metrics.emit_emf()
+    except Exception as e:
+        logger.exception(f"Error while draining: {e}")
+    finally:
+        poller.stop()
+        logger.info("Drain complete")
+        flush_logs()
 
-        # Final delay for last log message
-        time.sleep(1)
 
+def shutdown_instance(instance_id):
+    """Stop the EC2 instance (after the keeper has drained)."""
+    try:
+        logger.info(f"Stopping EC2 instance: {instance_id}")
+        ec2.stop_instances(InstanceIds=[instance_id])
+        logger.info(f"Instance {instance_id} stop command sent successfully")
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
         raise
+    finally:
+        flush_logs()
 
 
 def poll_sqs_forever(queue_url, instance_id):
-    """Continuously poll the SQS queue and process messages."""
+    """Poll the SQS queue and process messages until idle or asked to stop, then drain."""
     global last_message_time
     logger.info(f"Starting SQS poller for queue: {queue_url}")
     logger.info(f"Idle timeout set to {IDLE_TIMEOUT} minutes")
 
-    while True:
+    # The next receive stays in flight while the current batch is processed
+    poller = PrefetchingPoller(
+        sqs, queue_url, prefetch_batches=PREFETCH_BATCHES,
+        visibility_timeout=VISIBILITY_TIMEOUT, max_extension=MAX_VISIBILITY_EXTENSION,
+        metrics=metrics)
+    poller.start()
+
+    idle_shutdown = False
+    while not draining.is_set():
         try:
+            metrics.emit_if_due()
+            profiler.dump_if_due()
+
             # Check for idle timeout
             idle_duration = datetime.now() - last_message_time
             idle_minutes = idle_duration.total_seconds() / 60
 
-            if idle_minutes >= IDLE_TIMEOUT:
+            if IDLE_TIMEOUT and idle_minutes >= IDLE_TIMEOUT:
                 logger.warning(
                     f"Idle timeout reached ({idle_minutes:.1f} minutes). Initiating shutdown...")
-                shutdown_instance(instance_id)
-                logger.info("Shutdown complete. Exiting.")
-                exit(0)
-
-            resp = sqs.receive_message(
-                QueueUrl=queue_url,
-                MaxNumberOfMessages=5,
-                WaitTimeSeconds=20,  # long polling
-                VisibilityTimeout=30
-            )
+                idle_shutdown = True
+                break
 
-            messages = resp.get("Messages", [])
+            messages = poller.get_batch(timeout=POLL_INTERVAL)
             if not messages:
-                time.sleep(POLL_INTERVAL)
                 continue
 
-            for msg in messages:
-                process_message(msg)
-
-                # delete message after successful processing
-                sqs.delete_message(
-                    QueueUrl=queue_url,
-                    ReceiptHandle=msg["ReceiptHandle"]
-                )
-
-        except (BotoCoreError, ClientError) as e:
-            logger.error(f"SQS error: {e}")
-            time.sleep(10)
+            handle_batch(poller, messages)
 
         except Exception as e:
             logger.exception(f"Unexpected error: {e}")
-            time.sleep(10)
+            draining.wait(10)
+
+    drain(poller)
+    if idle_shutdown:
+        shutdown_instance(instance_id)
+    logger.info("Shutdown complete. Exiting.")
+
+
+def init_status_writer():
+    """Create the PROCESSED status buffer for the HEADLESS POSITION KEEPER user."""
+    global status_writer
+    status_writer = StatusWriter(cache, position_keeper_user_id)
+    return status_writer
 
 
 def ensure_position_keeper_user():
@@ -389,11 +726,29 @@ def ensure_position_keeper_user():
         raise
 
 
+def get_position_keeper_id(instance_id):
+    """Look up the position_keeper_id registered for this EC2 instance."""
+    try:
+        with cache.cursor() as cursor:
+            cursor.execute(
+                "SELECT position_keeper_id FROM position_keepers WHERE instance = %s",
+                (instance_id,)
+            )
+            result = cursor.fetchone()
+            return result[0] if result else None
+    except Exception as e:
+        logger.error(f"Error looking up position_keeper_id: {e}")
+        return None
+
+
 # ==============================
 # Main entry
 # ==============================
 def main():
-    global sqs, ec2, cache
+    global sqs, ec2, cache, journal, sandbox_writer, dead_letters
+
+    signal.signal(signal.SIGTERM, request_drain)
+    signal.signal(signal.SIGINT, request_drain)
 
     # Load configuration from environment
     secrets = load_secret_values(SECRET_ARN)
@@ -403,14 +758,15 @@ def main():
     sqs = boto3.client("sqs", region_name=REGION)
     ec2 = boto3.client("ec2", region_name=REGION)
     logger.info("AWS clients initialized successfully")
+    dead_letters = DeadLetterSpool(
+        DEAD_LETTER_SPOOL, sqs=sqs, queue_url=DEAD_LETTER_QUEUE_URL)
 
     cache = DataCache(
         host=secrets.get("DB_HOST"),
         user=secrets.get("DB_USER"),
         password=secrets.get("DB_PASS"),
         db=secrets.get("DATABASE"),
-        tables=["entities", "entity_types", "transaction_types",
-                "users", "transaction_statuses"]
+        tables=CACHE_TABLES
     )
     QUEUE_URL = secrets.get("QUEUE_URL")
     INSTANCE_ID = secrets.get("PK_INSTANCE")
@@ -432,11 +788,25 @@ def main():
     logger.info("Refreshing cache...")
     cache.refresh_all()
 
+    if METRICS_PORT:
+        metrics.serve_prometheus(METRICS_PORT)
+
     # Ensure HEADLESS POSITION KEEPER user exists
     logger.info("Ensuring HEADLESS POSITION KEEPER user exists...")
     ensure_position_keeper_user()
     logger.info(
         f"Position Keeper will use user_id={position_keeper_user_id} for database updates")
+    init_status_writer()
+
+    position_keeper_id = get_position_keeper_id(INSTANCE_ID)
+    if position_keeper_id:
+        journal = PositionJournal(cache, position_keeper_id)
+        sandbox_writer = SandboxWriter(cache, position_keeper_id)
+        logger.info(
+            f"Journaling position deltas as position_keeper_id={position_keeper_id}")
+    else:
+        logger.warning(
+            f"No position_keepers row for instance {INSTANCE_ID}; position journal disabled")
 
     poll_sqs_forever(QUEUE_URL, INSTANCE_ID)
 
@@ -0,0 +1,202 @@
+# /home/ec2-user/fullbor-pk/positionsandbox.py
+
+import os
+import time
+import logging
+import argparse
+from datetime import datetime
+
+logger = logging.getLogger("PositionSandbox")
+logger.setLevel(logging.INFO)
+
+# Table the keeper's live position writes go to; recomputes are built in position_sandbox
+POSITIONS_TABLE = "positions"
+
+SANDBOX_COLUMNS = (
+    "position_date", "position_type_id", "portfolio_entity_id",
+    "instrument_entity_id", "share_amount", "market_value", "position_keeper_id"
+)
+
+
+class SandboxWriter:
+    """Buffered bulk writer for position rows.
+
+    The keeper writes to the live positions table; a recompute writes to
+    position_sandbox and is published with promote_sandbox(). Rows are
+    addressed by table name on every flush, so after a promotion the keeper
+    writes to the newly published table. Rows are accumulated in memory and flushed as multi-row
+    INSERT ... ON DUPLICATE KEY UPDATE statements (keyed on uq_sandbox_lookup)
+    with one commit per flush, instead of one INSERT and commit per row.
+    The key uses the generated instrument_lookup_id, so rows without an
+    instrument (cash and portfolio-level positions) are upserted as well.
+    """
+
+    def __init__(self, cache, position_keeper_id, table=POSITIONS_TABLE,
+                 batch_size=5000, rows_per_statement=1000):
+        self.cache = cache
+        self.position_keeper_id = position_keeper_id
+        self.table = table
+        self.batch_size = batch_size
+        self.rows_per_statement = rows_per_statement
+        self.pending = []
+
+    def write(self, position_date, position_type_id, portfolio_entity_id,
+              instrument_entity_id, share_amount, market_value=0):
+        """Buffer one position row. Writes the buffer (uncommitted) once batch_size is reached."""
+        self.pending.append((
+            position_date, position_type_id, portfolio_entity_id,
+            instrument_entity_id, share_amount, market_value, self.position_keeper_id
+        ))
+        if len(self.pending) >= self.batch_size:
+            self.flush(commit=False)
+
+    def flush(self, commit=True):
+        """
+        Upsert all buffered rows and commit once. Returns the number of rows written.
+
+        With commit=False the rows are left in the open transaction for the
+        caller to commit (or roll back and discard()).
+        """
+        if not self.pending:
+            return 0
+        rows = self.pending
+        start = time.time()
+        with self.cache.cursor() as cursor:
+            for i in range(0, len(rows), self.rows_per_statement):
+                chunk = rows[i:i + self.rows_per_statement]
+                cursor.execute(build_upsert_sql(len(chunk), self.table),
+                               [value for row in chunk for value in row])
+            if commit:
+                self.cache.conn.commit()
+        # Only drop the buffer once the rows are safely written
+        self.pending = []
+        logger.info(
+            f"Wrote {len(rows)} {self.table} rows in {(time.time() - start) * 1000:.1f}ms")
+        return len(rows)
+
+    def discard(self):
+        """Drop buffered rows whose messages will be redelivered."""
+        self.pending = []
+
+
+def build_upsert_sql(row_count, table="position_sandbox"):
+    """Build a multi-row upsert into table for row_count rows."""
+    placeholders = "(" + ", ".join(["%s"] * len(SANDBOX_COLUMNS)) + ")"
+    return f"""
+        INSERT INTO {table} ({', '.join(SANDBOX_COLUMNS)})
+        VALUES {', '.join([placeholders] * row_count)} AS new
+        ON DUPLICATE KEY UPDATE
+            share_amount = new.share_amount,
+            market_value = new.market_value,
+            position_keeper_id = new.position_keeper_id
+    """
+
+
+def promote_sandbox(conn, since=None, force=False):
+    """
+    Publish a finished position_sandbox run as the live positions table.
+
+    The two tables are swapped with one RENAME TABLE statement, which MySQL
+    performs atomically: readers see either the previous positions or the
+    complete new run, never a half-written recompute, and no rows are copied.
+    After the swap position_sandbox holds the previous positions, so calling
+    this again rolls the promotion back until reset_sandbox() is called.
+
+    Running keepers keep writing to positions while the sandbox is built.
+    Both tables are write-locked for the promotion, which pauses the keepers'
+    flushes (and waits for any in progress to commit). If since is given, the
+    journal deltas applied after it, which the run does not contain, are
+    first added to the sandbox. After the swap the keepers' next flushes go
+    to the promoted table, since they address it by name.
+
+    Refuses to publish an empty sandbox unless force is set.
+    Returns the number of rows promoted.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "LOCK TABLES positions WRITE, position_sandbox WRITE, position_journal READ")
+        try:
+            cursor.execute("SELECT COUNT(*) FROM position_sandbox")
+            row_count = cursor.fetchone()[0]
+            if row_count == 0 and not force:
+                raise ValueError(
+                    "position_sandbox is empty; refusing to promote (use force=True to override)")
+
+            if since is not None:
+                cursor.execute(CATCH_UP_SQL, (since,))
+                logger.info(
+                    f"Carried {cursor.rowcount} position changes journaled after {since} into the sandbox")
+                conn.commit()
+
+            cursor.execute("""
+                RENAME TABLE positions TO positions_retired,
+                             position_sandbox TO positions,
+                             positions_retired TO position_sandbox
+            """)
+        finally:
+            cursor.execute("UNLOCK TABLES")
+    logger.info(f"Promoted {row_count} sandbox rows to positions")
+    return row_count
+
+
+# Journal deltas applied after a point in time, added onto the sandbox's rows
+CATCH_UP_SQL = """
+    INSERT INTO position_sandbox (
+        position_date, position_type_id, portfolio_entity_id,
+        instrument_entity_id, share_amount, market_value, position_keeper_id
+    )
+    SELECT * FROM (
+        SELECT position_date, position_type_id, portfolio_entity_id, instrument_entity_id,
+               SUM(share_delta) AS share_delta, SUM(market_value_delta) AS market_value_delta,
+               MAX(position_keeper_id) AS position_keeper_id
+        FROM position_journal
+        WHERE applied_at > %s
+        GROUP BY position_date, position_type_id, portfolio_entity_id, instrument_entity_id
+    ) AS delta
+    ON DUPLICATE KEY UPDATE
+        share_amount = position_sandbox.share_amount + delta.share_delta,
+        market_value = position_sandbox.market_value + delta.market_value_delta
+"""
+
+
+def reset_sandbox(conn):
+    """Empty position_sandbox ahead of a new run (discards the rollback copy)."""
+    with conn.cursor() as cursor:
+        cursor.execute("TRUNCATE TABLE position_sandbox")
+    logger.info("Reset position_sandbox")
+
+
+def main():
+    import pymysql
+
+    parser = argparse.ArgumentParser(
+        description="Promote or reset the position sandbox")
+    parser.add_argument("command", choices=["promote", "reset"])
+    parser.add_argument("--force", action="store_true",
+                        help="Promote even if the sandbox is empty")
+    parser.add_argument("--since",
+                        help="Carry journal deltas applied after this UTC time (YYYY-MM-DD[THH:MM:SS]) "
+                             "into the sandbox before promoting, e.g. the --as-of of the replay that built it")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s [%(levelname)s] %(message)s")
+
+    conn = pymysql.connect(
+        host=os.environ.get("DB_HOST"),
+        user=os.environ.get("DB_USER"),
+        password=os.environ.get("DB_PASS"),
+        database=os.environ.get("DATABASE")
+    )
+    try:
+        if args.command == "promote":
+            since = datetime.fromisoformat(args.since) if args.since else None
+            promote_sandbox(conn, since=since, force=args.force)
+        else:
+            reset_sandbox(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# /home/ec2-user/fullbor-pk/profiler.py
+
+import os
+import re
+import sys
+import time
+import random
+import logging
+import threading
+from datetime import datetime
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger("Profiler")
+logger.setLevel(logging.INFO)
+
+
+class SamplingProfiler:
+    """Opt-in stack sampler for a sampled fraction of hot-path calls.
+
+    While a sampled call is running, a background thread snapshots the calling
+    thread's stack every `interval` seconds. Stacks are aggregated per operation
+    type and periodically written as collapsed stacks ("a;b;c 42" lines) that
+    flamegraph.pl, speedscope and similar tools read directly.
+    """
+
+    def __init__(self, sample_rate=0.0, interval=0.005, dump_interval=300, output_dir="profiles"):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.output_dir = output_dir
+        self.stacks = defaultdict(Counter)
+        self.targets = {}  # thread id -> operation being profiled
+        self.has_targets = threading.Event()
+        self.lock = threading.Lock()
+        self.last_dump = time.time()
+        self.sampler = None
+
+    def set_sample_rate(self, sample_rate):
+        """Change the fraction of calls profiled (0 disables, 1 profiles everything)."""
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        logger.info(f"Profiler sample rate set to {self.sample_rate}")
+
+    @contextmanager
+    def profile(self, operation):
+        """Sample the stack of the with block if this call is picked for profiling."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            yield
+            return
+
+        self._ensure_sampler()
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.targets[thread_id] = operation or "unknown"
+            self.has_targets.set()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.targets.pop(thread_id, None)
+                if not self.targets:
+                    self.has_targets.clear()
+
+    def _ensure_sampler(self):
+        if self.sampler is None:
+            self.sampler = threading.Thread(
+                target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self.sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            self.has_targets.wait()
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, operation in self.targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self.stacks[operation][collapse_stack(frame)] += 1
+            time.sleep(self.interval)
+
+    def dump_if_due(self):
+        if time.time() - self.last_dump >= self.dump_interval:
+            self.dump()
+
+    def dump(self):
+        """Write and reset the collected stacks, one .folded file per operation type."""
+        self.last_dump = time.time()
+        with self.lock:
+            stacks, self.stacks = self.stacks, defaultdict(Counter)
+        if not stacks:
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        for operation, counter in stacks.items():
+            safe_operation = re.sub(r"[^\w-]", "_", str(operation))
+            path = os.path.join(self.output_dir,
+                                f"{safe_operation}-{timestamp}.folded")
+            with open(path, "w") as f:
+                for stack, count in counter.most_common():
+                    f.write(f"{stack} {count}\n")
+            logger.info(
+                f"Wrote {sum(counter.values())} profile samples for {operation} to {path}")
+
+
+def collapse_stack(frame):
+    """Render a frame's stack root-first as 'file:function;file:function;...'."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
@@ -0,0 +1,248 @@
+# /home/ec2-user/fullbor-pk/sqspoller.py
+
+import time
+import queue
+import logging
+import threading
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger("SqsPoller")
+logger.setLevel(logging.INFO)
+
+SQS_BATCH_LIMIT = 10  # max entries per SQS batch API call
+
+
+class PrefetchingPoller:
+    """Pipelined SQS consumer.
+
+    A receiver thread keeps the next long poll in flight while the caller is
+    processing the current batch, handing batches over through a bounded queue
+    (so a slow processor applies backpressure to receiving). Acknowledgements
+    are queued to an acker thread and sent with delete_message_batch, off the
+    processing path.
+
+    A heartbeat thread keeps every received, unacknowledged message invisible
+    (change_message_visibility_batch every third of the visibility timeout),
+    so slow batches and prefetched batches are not redelivered while they are
+    still held. Heartbeating stops after max_extension seconds, letting a
+    message that is stuck become visible again. Messages handed to retry()
+    stop being heartbeated and reappear after their backoff delay.
+    """
+
+    def __init__(self, sqs, queue_url, prefetch_batches=1, max_messages=SQS_BATCH_LIMIT,
+                 wait_time=20, visibility_timeout=30, max_extension=900, metrics=None):
+        self.sqs = sqs
+        self.metrics = metrics
+        self.queue_url = queue_url
+        self.max_messages = max_messages
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+        self.max_extension = max_extension
+        # ReceiptHandle -> (message, received time) for messages not yet acknowledged
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        self.batches = queue.Queue(maxsize=prefetch_batches)
+        self.acks = queue.Queue()
+        self.stopping = threading.Event()
+        self.receiver = threading.Thread(
+            target=self._receive_loop, name="sqs-receiver", daemon=True)
+        self.acker = threading.Thread(
+            target=self._ack_loop, name="sqs-acker", daemon=True)
+        self.heartbeat = threading.Thread(
+            target=self._heartbeat_loop, name="sqs-heartbeat", daemon=True)
+
+    def start(self):
+        self.receiver.start()
+        self.acker.start()
+        self.heartbeat.start()
+        logger.info(
+            f"Started prefetching poller for {self.queue_url} (prefetch={self.batches.maxsize})")
+
+    def get_batch(self, timeout):
+        """Return the next received batch, or None if nothing arrived within timeout seconds."""
+        try:
+            return self.batches.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def acknowledge(self, messages):
+        """Queue messages for asynchronous deletion."""
+        if messages:
+            self._release(messages)
+            self.acks.put(("delete", list(messages)))
+
+    def retry(self, retries):
+        """Let (message, delay seconds) pairs be redelivered after their delay (sent asynchronously)."""
+        if retries:
+            self._release([msg for msg, _ in retries])
+            self.acks.put(("retry", list(retries)))
+
+    def stop_receiving(self):
+        """
+        Stop receiving and hand back batches that were received but not taken.
+
+        Unprocessed messages are made visible again at once, so they are not
+        stuck behind the visibility timeout after a shutdown. Returns how many
+        were released. Safe to call more than once.
+        """
+        self.stopping.set()
+        self.receiver.join(timeout=self.wait_time + 5)
+        unprocessed = []
+        while True:
+            try:
+                unprocessed.extend(self.batches.get_nowait())
+            except queue.Empty:
+                break
+        if unprocessed:
+            self.retry([(msg, 0) for msg in unprocessed])
+            logger.info(
+                f"Released {len(unprocessed)} unprocessed messages back to the queue")
+        return len(unprocessed)
+
+    def stop(self):
+        """Stop receiving, then send any outstanding acknowledgements and releases before returning."""
+        self.stop_receiving()
+        self.heartbeat.join(timeout=self.visibility_timeout)
+        self.acks.put(None)
+        self.acker.join(timeout=30)
+        logger.info("Prefetching poller stopped")
+
+    def _receive_loop(self):
+        while not self.stopping.is_set():
+            try:
+                start = time.perf_counter()
+                resp = self.sqs.receive_message(
+                    QueueUrl=self.queue_url,
+                    MaxNumberOfMessages=self.max_messages,
+                    WaitTimeSeconds=self.wait_time,  # long polling
+                    VisibilityTimeout=self.visibility_timeout,
+                    AttributeNames=["SentTimestamp", "ApproximateReceiveCount",
+                                    "MessageGroupId"]
+                )
+            except (BotoCoreError, ClientError) as e:
+                logger.error(f"SQS receive error: {e}")
+                self.stopping.wait(10)
+                continue
+            except Exception as e:
+                logger.exception(f"Unexpected receive error: {e}")
+                self.stopping.wait(10)
+                continue
+
+            messages = resp.get("Messages", [])
+            if self.metrics:
+                self._record_receive(start, messages)
+            if not messages:
+                # The long poll already waited; go straight back to polling
+                continue
+            now = time.time()
+            with self.in_flight_lock:
+                for msg in messages:
+                    self.in_flight[msg["ReceiptHandle"]] = (msg, now)
+
+            # Blocks while the processor is behind (backpressure). A batch not
+            # handed over before a stop is released back to the queue.
+            while not self.stopping.is_set():
+                try:
+                    self.batches.put(messages, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+            else:
+                self.retry([(msg, 0) for msg in messages])
+
+    def _record_receive(self, start, messages):
+        """Record receive time, message count and queue lag (time since SQS accepted each message)."""
+        self.metrics.observe("stage_duration_ms",
+                             (time.perf_counter() - start) * 1000, stage="receive")
+        self.metrics.increment("messages_received", len(messages))
+        now_ms = time.time() * 1000
+        for msg in messages:
+            sent_timestamp = msg.get("Attributes", {}).get("SentTimestamp")
+            if sent_timestamp:
+                self.metrics.observe(
+                    "queue_lag_ms", now_ms - int(sent_timestamp))
+
+    def _release(self, messages):
+        """Stop heartbeating messages."""
+        with self.in_flight_lock:
+            for msg in messages:
+                self.in_flight.pop(msg["ReceiptHandle"], None)
+
+    def _heartbeat_loop(self):
+        interval = max(self.visibility_timeout / 3, 1)
+        while not self.stopping.wait(interval):
+            now = time.time()
+            with self.in_flight_lock:
+                expired = [msg for msg, received in self.in_flight.values()
+                           if now - received >= self.max_extension]
+                messages = [msg for msg, received in self.in_flight.values()
+                            if now - received < self.max_extension]
+            if expired:
+                logger.warning(
+                    f"Stopped extending visibility of {len(expired)} messages held over {self.max_extension}s")
+                self._release(expired)
+            if messages:
+                start = time.perf_counter()
+                failed = self._change_visibility(
+                    [(msg, self.visibility_timeout) for msg in messages])
+                # A handle that can no longer be extended will not become extendable again
+                self._release(failed)
+                if self.metrics:
+                    self.metrics.observe("stage_duration_ms",
+                                         (time.perf_counter() - start) * 1000, stage="heartbeat")
+                    self.metrics.increment(
+                        "visibility_extensions", len(messages))
+
+    def _change_visibility(self, entries):
+        """Set the visibility timeout of (message, seconds) pairs. Returns the messages that failed."""
+        failed = []
+        for i in range(0, len(entries), SQS_BATCH_LIMIT):
+            chunk = entries[i:i + SQS_BATCH_LIMIT]
+            try:
+                resp = self.sqs.change_message_visibility_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[{"Id": str(n), "ReceiptHandle": msg["ReceiptHandle"],
+                              "VisibilityTimeout": int(timeout)}
+                             for n, (msg, timeout) in enumerate(chunk)]
+                )
+                for failure in resp.get("Failed", []):
+                    msg = chunk[int(failure["Id"])][0]
+                    failed.append(msg)
+                    logger.error(
+                        f"Failed to change visibility of message {msg.get('MessageId')}: {failure.get('Message')}")
+            except (BotoCoreError, ClientError) as e:
+                logger.error(f"SQS change visibility error: {e}")
+            except Exception as e:
+                logger.exception(f"Unexpected change visibility error: {e}")
+        return failed
+
+    def _ack_loop(self):
+        while True:
+            item = self.acks.get()
+            if item is None:
+                return
+            action, messages = item
+            if action == "retry":
+                self._change_visibility(messages)
+                continue
+            for i in range(0, len(messages), SQS_BATCH_LIMIT):
+                chunk = messages[i:i + SQS_BATCH_LIMIT]
+                try:
+                    start = time.perf_counter()
+                    resp = self.sqs.delete_message_batch(
+                        QueueUrl=self.queue_url,
+                        Entries=[{"Id": str(n), "ReceiptHandle": msg["ReceiptHandle"]}
+                                 for n, msg in enumerate(chunk)]
+                    )
+                    if self.metrics:
+                        self.metrics.observe("stage_duration_ms",
+                                             (time.perf_counter() - start) * 1000, stage="delete")
+                        self.metrics.increment(
+                            "messages_deleted", len(resp.get("Successful", [])))
+                    for failure in resp.get("Failed", []):
+                        logger.error(
+                            f"Failed to delete message {chunk[int(failure['Id'])].get('MessageId')}: {failure.get('Message')}")
+                except (BotoCoreError, ClientError) as e:
+                    logger.error(f"SQS delete error: {e}")
+                except Exception as e:
+                    logger.exception(f"Unexpected delete error: {e}")
@@ -0,0 +1,66 @@
+# /home/ec2-user/fullbor-pk/statuswriter.py
+
+import time
+import logging
+
+logger = logging.getLogger("StatusWriter")
+logger.setLevel(logging.INFO)
+
+
+class StatusWriter:
+    """Write-behind buffer for marking transactions PROCESSED (status 3).
+
+    Transaction ids are accumulated in memory and flushed as one set-based
+    UPDATE ... WHERE transaction_id IN (...) per chunk, instead of one UPDATE
+    and commit per transaction. The keeper flushes the buffer once per receive
+    batch, after the batch's position writes and in the same transaction, so
+    a flush never commits status updates ahead of the positions behind them.
+    """
+
+    def __init__(self, cache, user_id, ids_per_statement=1000):
+        self.cache = cache
+        self.user_id = user_id
+        self.ids_per_statement = ids_per_statement
+        self.pending = {}  # transaction_id -> None, an insertion-ordered set
+
+    def mark_processed(self, transaction_id):
+        """Buffer a status 3 update until the next flush."""
+        self.pending[transaction_id] = None
+
+    def flush(self, commit=True):
+        """
+        Update all buffered transactions. Returns the number of transactions updated.
+
+        With commit=False the updates are left in the open transaction for the
+        caller to commit (or roll back and discard()).
+        """
+        if not self.pending:
+            return 0
+        transaction_ids = list(self.pending)
+        start = time.time()
+        with self.cache.cursor() as cursor:
+            for i in range(0, len(transaction_ids), self.ids_per_statement):
+                chunk = transaction_ids[i:i + self.ids_per_statement]
+                cursor.execute(build_update_sql(len(chunk)),
+                               [self.user_id] + chunk)
+            if commit:
+                self.cache.conn.commit()
+        # Only drop the buffer once the updates are safely written
+        self.pending = {}
+        logger.info(
+            f"Marked {len(transaction_ids)} transactions as PROCESSED in {(time.time() - start) * 1000:.1f}ms")
+        return len(transaction_ids)
+
+    def discard(self):
+        """Drop buffered updates whose messages will be redelivered."""
+        self.pending = {}
+
+
+def build_update_sql(id_count):
+    """Build the set-based status 3 update for id_count transaction ids."""
+    placeholders = ", ".join(["%s"] * id_count)
+    return f"""
+        UPDATE transactions
+        SET transaction_status_id = 3, updated_user_id = %s, update_date = NOW()
+        WHERE transaction_id IN ({placeholders})
+    """
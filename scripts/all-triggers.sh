@@ -23,3 +23,6 @@
 ./generate-trigger.py transactions transaction_id portfolio_entity_id contra_entity_id instrument_entity_id transaction_status_id transaction_type_id trade_date settle_date deleted properties:json
 
 ./generate-trigger.py users user_id sub email primary_client_group_id deleted preferences:json
+
+# Triggers that keep user_entity_access in step with the two membership tables
+./generate-trigger.py --access
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+check-transaction-indexes.py
+
+EXPLAIN the transaction list queries that filter by date range and check that
+MySQL reads `transactions` through the (portfolio_entity_id, deleted, date)
+indexes from database/migrations/add_transaction_date_indexes.sql rather than
+scanning. The queries are built by TransactionsHandler itself, so a change to
+its filters is checked as well.
+
+Also compares the include_count=estimate figure with an exact COUNT for the
+user who can see the most portfolios, where the scope semi-join is most
+likely to drive the plan from user_entity_access.
+
+Uses the DB_HOST, DB_PORT, DATABASE, DB_USER and DB_PASS settings in scripts/.env.
+
+Usage:
+    python check-transaction-indexes.py
+
+Exits non-zero if any plan does not use the expected index, or the estimate
+is off by more than ESTIMATE_TOLERANCE times.
+"""
+
+import os
+import sys
+import pymysql
+from dotenv import load_dotenv
+
+# Load environment variables from .env in the same directory as this script
+script_dir = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(script_dir, '.env'))
+
+sys.path.insert(0, os.path.join(script_dir, '..', 'lambdas'))
+from TransactionsHandler import build_transaction_filters  # noqa: E402
+from pagination_helper import estimate_count  # noqa: E402
+
+# (description, filters other than the portfolio, index the plan must use)
+CASES = [
+    ("portfolio, trade date range",
+     {'trade_date_from': '2025-10-13', 'trade_date_to': '2025-10-17'},
+     'idx_transactions_portfolio_trade_date'),
+    ("portfolio, settle date range",
+     {'settle_date_from': '2025-10-13', 'settle_date_to': '2025-10-17'},
+     'idx_transactions_portfolio_settle_date'),
+    ("portfolio, trade date from only",
+     {'trade_date_from': '2025-10-13'},
+     'idx_transactions_portfolio_trade_date'),
+]
+
+# Largest factor by which the row estimate may differ from the exact count
+ESTIMATE_TOLERANCE = 10
+
+
+def get_connection():
+    """Connect with the settings in scripts/.env."""
+    missing = [name for name in ('DB_HOST', 'DATABASE', 'DB_USER', 'DB_PASS')
+               if not os.getenv(name)]
+    if missing:
+        print(f"❌ Missing required environment variables: {', '.join(missing)}")
+        print("Please ensure these are set in scripts/.env")
+        sys.exit(1)
+
+    return pymysql.connect(
+        host=os.getenv('DB_HOST'),
+        port=int(os.getenv('DB_PORT', '3306')),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASS'),
+        database=os.getenv('DATABASE'),
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+
+def get_busiest_portfolio(cursor):
+    """Get the portfolio with the most transactions and a user who can see it."""
+    cursor.execute("""
+        SELECT t.portfolio_entity_id, e.entity_name, COUNT(*) AS transaction_count
+        FROM transactions t
+        JOIN entities e ON e.entity_id = t.portfolio_entity_id
+        WHERE t.deleted = false
+        GROUP BY t.portfolio_entity_id, e.entity_name
+        ORDER BY transaction_count DESC
+        LIMIT 1
+    """)
+    portfolio = cursor.fetchone()
+    if not portfolio:
+        return None, None
+
+    cursor.execute(
+        "SELECT user_id FROM user_entity_access WHERE entity_id = %s LIMIT 1",
+        (portfolio['portfolio_entity_id'],))
+    user = cursor.fetchone()
+    return portfolio, user['user_id'] if user else None
+
+
+def get_widest_user(cursor):
+    """Get the user who can see transactions in the most portfolios."""
+    cursor.execute("""
+        SELECT uea.user_id, COUNT(DISTINCT uea.entity_id) AS portfolio_count
+        FROM user_entity_access uea
+        WHERE EXISTS (SELECT 1 FROM transactions t
+                      WHERE t.portfolio_entity_id = uea.entity_id AND t.deleted = false)
+        GROUP BY uea.user_id
+        ORDER BY portfolio_count DESC
+        LIMIT 1
+    """)
+    return cursor.fetchone()
+
+
+def check_count_estimate(connection):
+    """Compare the include_count=estimate figure with an exact count. Returns True if close enough."""
+    with connection.cursor() as cursor:
+        user = get_widest_user(cursor)
+        if not user or user['portfolio_count'] < 2:
+            print("⚠️  No user can see transactions in more than one portfolio; skipping the estimate check")
+            return True
+
+        base_query, params = build_transaction_filters({}, user['user_id'])
+        cursor.execute(f"SELECT COUNT(*) AS exact_count {base_query}", params)
+        exact = cursor.fetchone()['exact_count']
+
+    # estimate_count reads the EXPLAIN output positionally
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        estimate = estimate_count(cursor, base_query, params)
+
+    ratio = max(estimate, 1) / max(exact, 1)
+    description = (f"estimate for user_id {user['user_id']} "
+                   f"({user['portfolio_count']} portfolios): {estimate} vs exact {exact}")
+    if 1 / ESTIMATE_TOLERANCE <= ratio <= ESTIMATE_TOLERANCE:
+        print(f"✅ {description}")
+        return True
+    print(f"❌ {description}")
+    return False
+
+
+def main():
+    connection = get_connection()
+    failures = 0
+
+    with connection.cursor() as cursor:
+        portfolio, user_id = get_busiest_portfolio(cursor)
+        if not portfolio or not user_id:
+            print("❌ Need a portfolio with transactions and a user who can access it")
+            sys.exit(1)
+
+        print(f"📊 Portfolio '{portfolio['entity_name']}' "
+              f"({portfolio['transaction_count']} transactions), as user_id {user_id}")
+
+        for description, filters, expected_index in CASES:
+            query_parameters = dict(
+                filters, portfolio_entity_name=portfolio['entity_name'])
+            base_query, params = build_transaction_filters(
+                query_parameters, user_id)
+
+            cursor.execute(
+                f"EXPLAIN SELECT t.transaction_id {base_query}", params)
+            plan = [row for row in cursor.fetchall() if row['table'] == 't']
+
+            if plan and plan[0]['key'] == expected_index and plan[0]['type'] != 'ALL':
+                print(f"✅ {description}: {plan[0]['type']} on {plan[0]['key']} "
+                      f"(~{plan[0]['rows']} rows)")
+            else:
+                failures += 1
+                used = f"{plan[0]['type']} on {plan[0]['key']}" if plan else "no plan row for t"
+                print(f"❌ {description}: expected {expected_index}, got {used}")
+
+    estimate_ok = check_count_estimate(connection)
+    connection.close()
+
+    if failures:
+        print(f"\n{failures} of {len(CASES)} plans do not use the expected index")
+    if not estimate_ok:
+        print(f"\nThe row estimate is off by more than {ESTIMATE_TOLERANCE}x")
+    if failures or not estimate_ok:
+        sys.exit(1)
+    print(f"\nAll {len(CASES)} plans use the expected indexes and the row estimate is close")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ Example: python deploy-lambda.py ClientGroupsHandler.py
 import sys
 import os
 import json
+import glob
 import zipfile
 import tempfile
 import argparse
@@ -49,10 +50,34 @@ FUNCTION_SPECIFIC_LAYERS = {
         "arn:aws:lambda:us-east-2:316490106381:layer:PyMySql112Layer:2",  # Database access
         # Pandas for data processing
         "arn:aws:lambda:us-east-2:316490106381:layer:pandas-layer:1"
+    ],
+    'PositionKeeperBatchHandler': [
+        "arn:aws:lambda:us-east-2:316490106381:layer:PyMySql112Layer:2",  # Database access
+        # Pandas for the DataCache
+        "arn:aws:lambda:us-east-2:316490106381:layer:pandas-layer:1"
     ]
 }
 
+# Shared modules from the lambdas directory packaged with every function
+SHARED_MODULES = ['cors_helper.py', 'runtime_helper.py', 'pagination_helper.py', 'auth_helper.py',
+                  'cache_helper.py']
+
+# Extra source files packaged alongside a function's handler, as glob patterns
+# relative to the lambdas directory
+FUNCTION_EXTRA_FILES = {
+    # Runs the position keeper's own modules
+    'PositionKeeperBatchHandler': ['../position_keeper/*.py']
+}
+
 TIMEOUT = 30
+# Function-specific timeout overrides (seconds)
+FUNCTION_SPECIFIC_TIMEOUTS = {
+    # A cold start loads the reference data snapshot before processing
+    'PositionKeeperBatchHandler': 120,
+    # Runs transaction exports as asynchronous invocations of itself; API
+    # requests are still cut off by API Gateway after 29 seconds
+    'TransactionsHandler': 900
+}
 VPC_SUBNETS = [
     "subnet-0192ac9f05f3f701c",
     "subnet-057c823728ef78117",
@@ -140,21 +165,33 @@ class LambdaDeployer:
                 f"Using default layers for {function_name}: {len(DEFAULT_LAYERS)} layer(s)")
             return DEFAULT_LAYERS
 
+    def get_timeout_for_function(self, function_name: str) -> int:
+        """Get the Lambda timeout for a specific function."""
+        return FUNCTION_SPECIFIC_TIMEOUTS.get(function_name, TIMEOUT)
+
     def create_zip_package(self, lambda_file_path: str) -> bytes:
         """Create a zip package for the Lambda function."""
         lambda_path = Path(lambda_file_path)
         lambdas_dir = lambda_path.parent
-        cors_helper_path = lambdas_dir / 'cors_helper.py'
 
         with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as temp_zip:
             with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
                 # Add the main Lambda file
                 zip_file.write(lambda_file_path, lambda_path.name)
 
-                # Add CORS helper if it exists
-                if cors_helper_path.exists():
-                    zip_file.write(cors_helper_path, 'cors_helper.py')
-                    logger.info("  ✓ Added cors_helper.py to package")
+                # Add the shared helper modules every handler imports
+                for helper in SHARED_MODULES:
+                    helper_path = lambdas_dir / helper
+                    if helper_path.exists():
+                        zip_file.write(helper_path, helper)
+                        logger.info(f"  ✓ Added {helper} to package")
+
+                # Add any extra modules the function imports
+                for pattern in FUNCTION_EXTRA_FILES.get(lambda_path.stem, []):
+                    for extra_path in sorted(glob.glob(str(lambdas_dir / pattern))):
+                        zip_file.write(extra_path, Path(extra_path).name)
+                        logger.info(
+                            f"  ✓ Added {Path(extra_path).name} to package")
 
             # Read the zip file content
             with open(temp_zip.name, 'rb') as f:
@@ -187,7 +224,8 @@ class LambdaDeployer:
                 '/invitations/redeem/{code}'
             ],
             'PKManager': ['/position-keeper/start', '/position-keeper/stop', '/position-keeper/status'],
-            'TransactionsHandler': ['/transactions', '/transactions/{transaction_id}'],
+            'TransactionsHandler': ['/transactions', '/transactions/batch', '/transactions/export',
+                                    '/transactions/export/{export_id}', '/transactions/{transaction_id}'],
             'TransactionStatusesHandler': ['/transaction-statuses'],
             'TransactionTypesHandler': ['/transaction-types', '/transaction-types/{transaction_type_name}'],
             'UsersHandler': ['/users', '/users/{sub}']
@@ -233,7 +271,7 @@ class LambdaDeployer:
             try:
                 self.lambda_client.update_function_configuration(
                     FunctionName=function_name,
-                    Timeout=TIMEOUT,
+                    Timeout=self.get_timeout_for_function(function_name),
                     Environment={'Variables': ENV_VARS},
                     VpcConfig={
                         'SubnetIds': VPC_SUBNETS,
@@ -353,7 +391,7 @@ class LambdaDeployer:
                     Handler=f"{handler_file}.lambda_handler",
                     Code={'ZipFile': zip_bytes},
                     Description=f"Lambda function for {function_name}",
-                    Timeout=TIMEOUT,
+                    Timeout=self.get_timeout_for_function(function_name),
                     Environment={'Variables': ENV_VARS},
                     VpcConfig={
                         'SubnetIds': VPC_SUBNETS,
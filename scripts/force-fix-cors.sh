@@ -7,7 +7,7 @@ STAGE="test"
 
 ALLOWED_ORIGIN="'https://app.fullbor.ai'"
 ALLOWED_METHODS="'GET,POST,PUT,DELETE,OPTIONS'"
-ALLOWED_HEADERS="'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,X-Current-User-Id'"
+ALLOWED_HEADERS="'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,X-Current-User-Id,If-None-Match,If-Modified-Since'"
 
 echo "============================================================"
 echo "Force-fixing CORS for API Gateway: $API_ID"
@@ -6,8 +6,12 @@ Generate SQL for AFTER INSERT, UPDATE, and DELETE audit triggers
 for a given MySQL table. Captures changes to regular columns and
 first-level JSON fields.
 
+With --access, generate the triggers that keep the user_entity_access
+table in step with client_group_users and client_group_entities instead.
+
 Usage:
     python generate-trigger.py <table_name> <primary_key_column> <column1[:json]> <column2[:json]> ...
+    python generate-trigger.py --access
 
 Examples:
     # Track regular columns only
@@ -18,6 +22,9 @@ Examples:
     
     # Track only JSON columns
     python generate-trigger.py entities entity_id properties:json attributes:json
+
+    # Maintain user_entity_access
+    python generate-trigger.py --access
 """
 
 import sys
@@ -101,13 +108,86 @@ def generate_triggers(table: str, pk: str, columns: list[tuple[str, bool]]) -> s
     return textwrap.dedent(sql).strip()
 
 
+# Membership table -> (its member column, the other membership table, that table's member column)
+ACCESS_SOURCES = {
+    "client_group_users": ("user_id", "client_group_entities", "entity_id"),
+    "client_group_entities": ("entity_id", "client_group_users", "user_id"),
+}
+
+
+def generate_access_triggers() -> str:
+    """
+    Generate the triggers that maintain user_entity_access.
+
+    A user reaches an entity through each client group the two share, so a
+    membership row adds or removes one access row per member of the other
+    table in the same client group. These are second triggers on the same
+    events as the audit triggers and run after them.
+    """
+    access_table = "user_entity_access"
+    blocks = []
+
+    for table, (column, other_table, other_column) in ACCESS_SOURCES.items():
+        def insert_access(row: str, indent: str) -> str:
+            return f"\n{indent}".join([
+                f"INSERT IGNORE INTO `{access_table}` (`{column}`, `{other_column}`, client_group_id)",
+                f"SELECT {row}.`{column}`, o.`{other_column}`, {row}.client_group_id",
+                f"FROM `{other_table}` o",
+                f"WHERE o.client_group_id = {row}.client_group_id;",
+            ])
+
+        def delete_access(row: str, indent: str) -> str:
+            return f"\n{indent}".join([
+                f"DELETE FROM `{access_table}`",
+                f"WHERE client_group_id = {row}.client_group_id AND `{column}` = {row}.`{column}`;",
+            ])
+
+        blocks.append(f"""\
+-- Access triggers for table `{table}`
+
+DELIMITER $$
+
+CREATE TRIGGER `after_{table}_insert_access`
+AFTER INSERT ON `{table}`
+FOR EACH ROW FOLLOWS `after_{table}_insert`
+BEGIN
+    {insert_access("NEW", "    ")}
+END$$
+
+CREATE TRIGGER `after_{table}_update_access`
+AFTER UPDATE ON `{table}`
+FOR EACH ROW FOLLOWS `after_{table}_update`
+BEGIN
+    IF NOT (OLD.client_group_id <=> NEW.client_group_id AND OLD.`{column}` <=> NEW.`{column}`) THEN
+        {delete_access("OLD", "        ")}
+        {insert_access("NEW", "        ")}
+    END IF;
+END$$
+
+CREATE TRIGGER `after_{table}_delete_access`
+AFTER DELETE ON `{table}`
+FOR EACH ROW FOLLOWS `after_{table}_delete`
+BEGIN
+    {delete_access("OLD", "    ")}
+END$$
+
+DELIMITER ;""")
+
+    return "\n".join(blocks)
+
+
 def main():
+    if sys.argv[1:] == ["--access"]:
+        print(generate_access_triggers())
+        return
+
     if len(sys.argv) < 3:
         print(
             "Usage: python generate-trigger.py <table_name> <primary_key_column> [column1[:json] column2[:json] ...]")
         print("\nExamples:")
         print("  python generate-trigger.py entities entity_id name unitized properties:json attributes:json")
         print("  python generate-trigger.py transaction_types type_id name properties:json")
+        print("  python generate-trigger.py --access")
         sys.exit(1)
 
     table = sys.argv[1]
@@ -32,18 +32,35 @@ entity_permutations = [
     [24, 635], [641, 635], [642, 632], [641, 637]
 ]
 
+# Rows per multi-row INSERT; one statement per row makes the
+# uq_sandbox_lookup index maintenance dominate at rebuild scale
+ROWS_PER_STATEMENT = 1000
+ROW_SEPARATOR = ",\n  "
+
+rows = []
 for position_date in position_dates:
     for entity_permutation in entity_permutations:
         portfolio_entity_id = entity_permutation[0]
         instrument_entity_id = entity_permutation[1]
         for position_type_id in position_type_ids:
-            print(f"""
-insert position_sandbox(
+            rows.append(
+                f"('{position_date}', {position_type_id}, {portfolio_entity_id}, "
+                f"{instrument_entity_id}, 0, 0, {position_keeper_id})")
+
+# Emit buffered multi-row upserts inside a single transaction
+print("START TRANSACTION;")
+for i in range(0, len(rows), ROWS_PER_STATEMENT):
+    chunk = rows[i:i + ROWS_PER_STATEMENT]
+    print(f"""
+INSERT INTO position_sandbox (
   position_date, position_type_id, portfolio_entity_id,
   instrument_entity_id, share_amount,
   market_value, position_keeper_id
-) VALUES (
-  {position_date}, {position_type_id}, {portfolio_entity_id},
-  {instrument_entity_id}, 0,
-  0, {position_keeper_id}
-)""")
+) VALUES
+  {ROW_SEPARATOR.join(chunk)}
+AS new
+ON DUPLICATE KEY UPDATE
+  share_amount = new.share_amount,
+  market_value = new.market_value,
+  position_keeper_id = new.position_keeper_id;""")
+print("COMMIT;")
@@ -317,3 +317,77 @@ BEGIN
 END$$
 
 DELIMITER ;
+-- Access triggers for table `client_group_users`
+
+DELIMITER $$
+
+CREATE TRIGGER `after_client_group_users_insert_access`
+AFTER INSERT ON `client_group_users`
+FOR EACH ROW FOLLOWS `after_client_group_users_insert`
+BEGIN
+    INSERT IGNORE INTO `user_entity_access` (`user_id`, `entity_id`, client_group_id)
+    SELECT NEW.`user_id`, o.`entity_id`, NEW.client_group_id
+    FROM `client_group_entities` o
+    WHERE o.client_group_id = NEW.client_group_id;
+END$$
+
+CREATE TRIGGER `after_client_group_users_update_access`
+AFTER UPDATE ON `client_group_users`
+FOR EACH ROW FOLLOWS `after_client_group_users_update`
+BEGIN
+    IF NOT (OLD.client_group_id <=> NEW.client_group_id AND OLD.`user_id` <=> NEW.`user_id`) THEN
+        DELETE FROM `user_entity_access`
+        WHERE client_group_id = OLD.client_group_id AND `user_id` = OLD.`user_id`;
+        INSERT IGNORE INTO `user_entity_access` (`user_id`, `entity_id`, client_group_id)
+        SELECT NEW.`user_id`, o.`entity_id`, NEW.client_group_id
+        FROM `client_group_entities` o
+        WHERE o.client_group_id = NEW.client_group_id;
+    END IF;
+END$$
+
+CREATE TRIGGER `after_client_group_users_delete_access`
+AFTER DELETE ON `client_group_users`
+FOR EACH ROW FOLLOWS `after_client_group_users_delete`
+BEGIN
+    DELETE FROM `user_entity_access`
+    WHERE client_group_id = OLD.client_group_id AND `user_id` = OLD.`user_id`;
+END$$
+
+DELIMITER ;
+-- Access triggers for table `client_group_entities`
+
+DELIMITER $$
+
+CREATE TRIGGER `after_client_group_entities_insert_access`
+AFTER INSERT ON `client_group_entities`
+FOR EACH ROW FOLLOWS `after_client_group_entities_insert`
+BEGIN
+    INSERT IGNORE INTO `user_entity_access` (`entity_id`, `user_id`, client_group_id)
+    SELECT NEW.`entity_id`, o.`user_id`, NEW.client_group_id
+    FROM `client_group_users` o
+    WHERE o.client_group_id = NEW.client_group_id;
+END$$
+
+CREATE TRIGGER `after_client_group_entities_update_access`
+AFTER UPDATE ON `client_group_entities`
+FOR EACH ROW FOLLOWS `after_client_group_entities_update`
+BEGIN
+    IF NOT (OLD.client_group_id <=> NEW.client_group_id AND OLD.`entity_id` <=> NEW.`entity_id`) THEN
+        DELETE FROM `user_entity_access`
+        WHERE client_group_id = OLD.client_group_id AND `entity_id` = OLD.`entity_id`;
+        INSERT IGNORE INTO `user_entity_access` (`entity_id`, `user_id`, client_group_id)
+        SELECT NEW.`entity_id`, o.`user_id`, NEW.client_group_id
+        FROM `client_group_users` o
+        WHERE o.client_group_id = NEW.client_group_id;
+    END IF;
+END$$
+
+CREATE TRIGGER `after_client_group_entities_delete_access`
+AFTER DELETE ON `client_group_entities`
+FOR EACH ROW FOLLOWS `after_client_group_entities_delete`
+BEGIN
+    DELETE FROM `user_entity_access`
+    WHERE client_group_id = OLD.client_group_id AND `entity_id` = OLD.`entity_id`;
+END$$
+
+DELIMITER ;
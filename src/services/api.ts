@@ -195,6 +195,20 @@ export interface QueryEntitiesRequest {
 // Always returns an array of entities, or a count object if count=true
 export type QueryEntitiesResponse = Entity[] | { count: number };
 
+// Keyset pagination: pass a page's next_cursor as `after` to get the next page
+export interface PageRequest {
+  limit?: number;
+  after?: string;
+  // "estimate" returns an approximate count from index statistics
+  include_count?: boolean | "estimate";
+}
+
+export interface Page<T> {
+  data: T[];
+  next_cursor: string | null;
+  count?: number;
+}
+
 // Entity Types API functions - Updated for FullBor API
 export interface QueryEntityTypesRequest {
   entity_category?: string;
@@ -248,6 +262,15 @@ export const queryEntities = async (
   });
 };
 
+export const queryEntitiesPage = async (
+  data: QueryEntitiesRequest & PageRequest = {}
+): Promise<Page<Entity>> => {
+  return apiCall<Page<Entity>>("/entities", {
+    method: "GET",
+    searchParams: data as Record<string, string>,
+  });
+};
+
 export const createEntity = async (
   data: CreateEntityRequest
 ): Promise<void> => {
@@ -893,12 +916,30 @@ export interface UpdateTransactionRequest extends CreateTransactionRequest {
   transaction_id?: number;
 }
 
+export interface TransactionBatchResult {
+  index: number;
+  transaction_id?: number;
+  queued?: boolean;
+  error?: string;
+}
+
+export interface CreateTransactionsBatchResponse {
+  message: string;
+  created: number;
+  failed: number;
+  results: TransactionBatchResult[];
+}
+
 export interface QueryTransactionsRequest {
   portfolio_entity_name?: string;
   contra_entity_name?: string;
   instrument_entity_name?: string;
   transaction_status_name?: string;
   transaction_type_name?: string;
+  trade_date_from?: string;
+  trade_date_to?: string;
+  settle_date_from?: string;
+  settle_date_to?: string;
   count?: boolean;
 }
 
@@ -982,6 +1023,15 @@ export const createTransaction = async (
   });
 };
 
+export const createTransactionsBatch = async (
+  transactions: CreateTransactionRequest[]
+): Promise<CreateTransactionsBatchResponse> => {
+  return apiCall<CreateTransactionsBatchResponse>("/transactions/batch", {
+    method: "POST",
+    data: { transactions },
+  });
+};
+
 export const queryTransactions = async (
   data: QueryTransactionsRequest = {}
 ): Promise<QueryTransactionsResponse> => {
@@ -991,6 +1041,52 @@ export const queryTransactions = async (
   });
 };
 
+export const queryTransactionsPage = async (
+  data: QueryTransactionsRequest & PageRequest = {}
+): Promise<Page<Transaction>> => {
+  return apiCall<Page<Transaction>>("/transactions", {
+    method: "GET",
+    searchParams: data as Record<string, string>,
+  });
+};
+
+export interface ExportTransactionsRequest extends QueryTransactionsRequest {
+  format?: "ndjson" | "csv";
+}
+
+export interface ExportTransactionsResponse {
+  export_id: string;
+  status: "pending";
+  format: string;
+}
+
+export interface TransactionExportStatus {
+  export_id: string;
+  status: "pending" | "complete" | "failed";
+  url?: string;
+  format?: string;
+  size?: number;
+  expires_in?: number;
+  error?: string;
+}
+
+export const exportTransactions = async (
+  data: ExportTransactionsRequest = {}
+): Promise<ExportTransactionsResponse> => {
+  return apiCall<ExportTransactionsResponse>("/transactions/export", {
+    method: "GET",
+    searchParams: data as Record<string, string>,
+  });
+};
+
+export const getTransactionExport = async (
+  exportId: string
+): Promise<TransactionExportStatus> => {
+  return apiCall<TransactionExportStatus>(`/transactions/export/${exportId}`, {
+    method: "GET",
+  });
+};
+
 export const updateTransaction = async (
   transactionId: number,
   data: UpdateTransactionRequest
@@ -1065,6 +1161,7 @@ export const apiService = {
   // Entities
   createEntity,
   queryEntities,
+  queryEntitiesPage,
   updateEntity,
   deleteEntity,
 
@@ -1100,7 +1197,11 @@ export const apiService = {
 
   // Transactions
   createTransaction,
+  createTransactionsBatch,
   queryTransactions,
+  queryTransactionsPage,
+  exportTransactions,
+  getTransactionExport,
   updateTransaction,
   deleteTransaction,
 
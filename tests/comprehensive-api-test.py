@@ -3,8 +3,10 @@
 #
 # Enhanced Features:
 # - YAML test plan: multiple tests with method/url/params/json/headers
-# - Variables & templating: {{var}} anywhere (url, headers, body, params)
+# - Variables & templating: {{var}} anywhere (url, headers, body, params,
+#   expected headers)
 # - Extract values from responses via JMESPath -> variables for later tests
+#   (extract_headers copies response headers, e.g. ETag, into variables)
 # - Assertions: status, headers (subset), JSON via JMESPath:
 #     equals / contains / matches (regex) / not_equals / length / exists
 # - Optional JSON Schema validation
@@ -389,6 +391,7 @@ class TestCase:
     expect_json: Optional[List[Dict[str, Any]]] = None
     expect_schema: Optional[Dict[str, Any]] = None
     extract: Optional[Dict[str, str]] = None  # var_name -> jmespath
+    extract_headers: Optional[Dict[str, str]] = None  # var_name -> header name
     timeout: Optional[float] = None
     # Maximum response time in seconds
     expect_max_response_time: Optional[float] = None
@@ -484,7 +487,8 @@ def run_test(client: httpx.Client, tc: TestCase, vars: T_VAR, verbose_level: int
 
         # Headers validation
         if tc.expect_headers:
-            _assert_headers_subset(resp.headers, tc.expect_headers)
+            _assert_headers_subset(
+                resp.headers, _deep_format(tc.expect_headers, vars))
 
         # JSON assertions / schema / extract
         body = None
@@ -507,6 +511,13 @@ def run_test(client: httpx.Client, tc: TestCase, vars: T_VAR, verbose_level: int
                     raise AssertionError(
                         f"Failed to extract '{var_name}' with JMESPath '{jexpr}': {e}")
 
+        if tc.extract_headers:
+            for var_name, header in tc.extract_headers.items():
+                if resp.headers.get(header) is None:
+                    raise AssertionError(
+                        f"Failed to extract '{var_name}': header {header!r} missing")
+                vars[var_name] = resp.headers[header]
+
         total_duration = time.time() - start_time
         return TestResult(
             name=tc.name,
@@ -826,6 +837,7 @@ def run_tests_with_args(args, timestamp):
             expect_json=(t.get("expect") or {}).get("json"),
             expect_schema=(t.get("expect") or {}).get("schema"),
             extract=t.get("extract"),
+            extract_headers=t.get("extract_headers"),
             timeout=t.get("timeout", default_timeout),
             expect_max_response_time=(
                 t.get("expect") or {}).get("max_response_time"),